@@ -11,32 +11,34 @@
 # the Free Software Foundation; either version 2 of the License, or
 # (at your option) any later version.
 
-from numpy import *
-import string
+#numpy's power is imported as pow on purpose: it rounds a little
+#differently from the builtin one and the splines shouldn't change
+from numpy import zeros, sqrt, power as pow, asarray, clip, searchsorted, where
 
 KEV=0.5123143
+HC=12398.5471 #conversion between eV and lambda (A)
 
-def getClosestIndex(val, arr):
-    """Find index of closest value in array to val.
-    Works with both lists and numpy arrays.
-    Always returns a Python int, not a numpy scalar."""
-    if not arr or len(arr) == 0:
-        return 0
+def getClosestIndices(vals, arr):
+    """Indices of the points of the sorted grid arr closest to vals.
+
+    Works with both lists and numpy arrays. A value halfway between two
+    points goes to the lower one, one on repeated energies to the first of
+    them and values outside the grid to its ends.
+    """
+    arr = asarray(arr, float)
+    vals = asarray(vals, float)
+    if len(arr) < 2:
+        return zeros(vals.shape, int)
     
-    # Find closest value by linear search
-    if val <= arr[0]:
-        return 0
-    elif val >= arr[len(arr) - 1]:
-        return int(len(arr) - 1)
+    hi = clip(searchsorted(arr, vals), 1, len(arr) - 1)
+    lo = hi - 1
     
-    min_diff = float('inf')
-    best_idx = 0
-    for i in range(len(arr)):
-        diff = abs(arr[i] - val)
-        if diff < min_diff:
-            min_diff = diff
-            best_idx = i
-    return int(best_idx)  # Ensure we return Python int, not numpy scalar
+    return searchsorted(arr, arr[where(vals - arr[lo] <= arr[hi] - vals, lo, hi)])
+
+def getClosestIndex(val, arr):
+    """Find index of closest value in array to val, see getClosestIndices.
+    Always returns a Python int, not a numpy scalar."""
+    return int(getClosestIndices([val], arr)[0])
 
 def bounds(xdata,ydata,segments,e0):
 
@@ -12,49 +12,45 @@
 # (at your option) any later version.
 
 from math import pi, pow
-from numpy import array, reshape, arange, conjugate, sqrt as np_sqrt
-from .bounds import bounds, toKSpace, KEV, getClosestIndex
+from numpy import (array, reshape, arange, conjugate, sqrt as np_sqrt, asarray, zeros,
+                   ones, clip, power, dot, cumsum, searchsorted, absolute,
+                   concatenate, column_stack, atleast_2d, exp, ascontiguousarray)
+from .bounds import bounds, toKSpace, KEV, HC, getClosestIndex, getClosestIndices
 from .poly import Polynomial
 import numpy.linalg as LinearAlgebra
 import numpy.fft as FFT
 
 DR=0.05 #step size of R
 FFTPOINTS=512 #number of FFT points; works best if equal to 2^n
+VICTOREEN=-1 #background order used for the Victoreen form y=C*lambda^3-D*lambda^4
     
-def getClosest(val, arr):  # replace by bisecting sort later?
+def column(data):
+    """Read-only float array for one column of a scan.
+
+    The energy, raw and I0 columns are held once as such arrays and every
+    window and pipeline stage references them, or views of them, instead
+    of keeping its own list. A column that already is one is returned as
+    it is; a writable array is wrapped in a read-only view, not copied.
+    """
+    arr = ascontiguousarray(data, dtype=float)
+    if arr.flags.writeable:
+        if arr is data:
+            arr = arr.view()
+        arr.flags.writeable = False
+    return arr
+
+def getClosest(val, arr):
     # Robust against empty or None arrays
     if arr is None or len(arr) == 0:
         return val
 
-    xmin = 0
-    xmax = 0
-
-    if val <= arr[0]:
-        return arr[0]
-    elif val >= arr[-1]:
-        return arr[-1]
-    
-    size = len(arr)
-    
-    for i in range(size - 1):
-        if arr[i] <= val and val <= arr[i + 1]:
-            xmin = arr[i]
-            xmax = arr[i + 1]
-            
-    if xmin == 0 and xmax == 0:
-        if (val - arr[size - 1] < val - arr[0]):
-            return arr[size - 1]
-        else:
-            return arr[0]
-
-    if (val - xmin < xmax - val):
-        return xmin
-    else:
-        return xmax
+    return arr[getClosestIndex(val, arr)]
     
 def calcBackground(xdata,ydata,lindex,hindex,order,E0):
     
-    yfit=[]
+    # the sums below run faster on floats than on array elements
+    xfit = asarray(xdata[lindex:hindex + 1], float).tolist()
+    yfit = asarray(ydata[lindex:hindex + 1], float).tolist()
     
     # build matrix used for least-squares
     # only half needs to be built since it's symmetric
@@ -70,15 +66,15 @@ def calcBackground(xdata,ydata,lindex,hindex,order,E0):
         for row in range(order):
             for col in range(row, order):
                 tempx = 0
-                for i in range(lindex, hindex + 1):
-                    tempx += pow(xdata[i], row + col)
+                for x in xfit:
+                    tempx += pow(x, row + col)
 
                 matrix[row][col] = tempx
                 matrix[col][row] = tempx
 
             tempy = 0
-            for i in range(lindex, hindex + 1):
-                tempy += ydata[i] * pow(xdata[i], row)
+            for x, y in zip(xfit, yfit):
+                tempy += y * pow(x, row)
             vector[row] = tempy
 
     elif order == 0:  # ie, is for line of form y=a/x+b
@@ -90,43 +86,44 @@ def calcBackground(xdata,ydata,lindex,hindex,order,E0):
         y0 = 0
         y1 = 0
 
-        for i in range(lindex, hindex + 1):
+        for x, y in zip(xfit, yfit):
             pos00 += 1
-            pos01 += (1 / xdata[i])
-            pos11 += pow(xdata[i], -2)
-            y0 += ydata[i]
-            y1 += (ydata[i] / xdata[i])
+            pos01 += (1 / x)
+            pos11 += pow(x, -2)
+            y0 += y
+            y1 += (y / x)
 
         matrix = array([[pos00, pos01], [pos01, pos11]])
         vector = array([y0, y1])
 
+    elif order == VICTOREEN:  # y=C*lambda^3-D*lambda^4, linear in C and D
+
+        basis = victoreenBasis(xfit)
+        matrix = dot(basis.T, basis)
+        vector = dot(basis.T, asarray(yfit, float))
+
     else:
         print("Not implemented yet! Probably won't be either!")
         
     # Modern NumPy uses solve() instead of solve_linear_equations()
     coeffs = LinearAlgebra.solve(matrix, vector)
     
-    background = []
-    for x in xdata:
-    
-        tempx=0
-        
-        if(order>0):
-            for i in range(order):
-                tempx=tempx+coeffs[i]*pow(x,i)
-        elif(order==0): #actually of form y=a/x+b
-            tempx=coeffs[0]+coeffs[1]/x
-        else:
-            "Not implemented"
-            
-            
-        background.append(tempx)
+    # evaluated over the whole grid at once, term by term as before
+    x = asarray(xdata, float)
+    ydata = asarray(ydata, float)
+    background = zeros(len(x))
+    if(order>0):
+        for i in range(order):
+            background = background + coeffs[i] * power(x, i)
+    elif(order==0): #actually of form y=a/x+b
+        background = coeffs[0] + coeffs[1] / x
+    elif(order==VICTOREEN): #y=C*lambda^3-D*lambda^4
+        lam = HC / x
+        background = coeffs[0] * power(lam, 3) - coeffs[1] * power(lam, 4)
 
     #if fit is above edge, adjust background
-    if (xdata[hindex] > E0):
-        value=min(ydata)
-        index=ydata.index(value)
-        minpoint=0
+    if (x[hindex] > E0):
+        index = int(ydata.argmin())
         
         #average value around min point in case there is noise
         #5 pts: index-2 index-1 index index+1 index+2
@@ -134,20 +131,20 @@ def calcBackground(xdata,ydata,lindex,hindex,order,E0):
         #if that min point is too close to the beginning of data, forget lower part
         #else, do the 5pts
         if (index < 2):
-            for val in ydata[0:index+3]:
-                minpoint += val
-            delta = background[index] - minpoint / len(ydata[0:index+3])
-            
+            minpoint = ydata[0:index+3]
         else:
-            for val in ydata[index-2:index+3]:
-                minpoint+=val
-            delta=background[index]-minpoint/len(ydata[index-2:index+3])
+            minpoint = ydata[index-2:index+3]
+        delta = background[index] - minpoint.sum() / len(minpoint)
             
-        for i in range(len(background)):
-            background[i] = background[i] - delta
+        background = background - delta
             
     return background
 
+def victoreenBasis(xdata):
+    #columns lambda^3 and -lambda^4, so the coefficients are C and D
+    lam = HC / asarray(xdata, float)
+    return column_stack((power(lam, 3), -power(lam, 4)))
+
 def calcSpline(xdata, ydata, E0, segs):
     # Guard against empty or degenerate segments
     if not segs:
@@ -176,7 +173,7 @@ def calcSpline(xdata, ydata, E0, segs):
         print("The spline matrix is singular. Using single line as polynomial estimate")
         
         # Guard against empty data in fallback
-        if not xdata or not ydata or len(xdata) == 0 or len(ydata) == 0:
+        if len(xdata) == 0 or len(ydata) == 0:
             return [0.0] * max(1, len(xdata)), 1.0
         
         #Get first and last marker position and corresponding indexes of the xdata
@@ -215,34 +212,14 @@ def calcSpline(xdata, ydata, E0, segs):
         
         offset=offset+order+2
         
-    #generate individual spline data for pre-1st segment
-    for i in range(0, xdata.index(lowx)): # interate through each point of pre-segment except last
-        temp=polys[0].eval(xdata[i])
-        data.append(temp)
-    
-    offset=0
-    
-    for i in range(len(segs)): # for each of the segments
-        lowx=segs[i][1]
-        highx=segs[i][2]
-        lowindex=xdata.index(lowx)
-        highindex=xdata.index(highx)
-        
-        #iterate through xdata bound by seg ranges
-        for j in range(lowindex,highindex): #iterate through each point of segment except last one
-        #for i in [0,1]:
-            temp=polys[i].eval(xdata[j])
-            data.append(temp)
-            
-        
-        
-    highx=segs[-1][2]
-    order=segs[-1][0]
-    
-    for i in range(xdata.index(highx),len(xdata)):
-        temp=polys[-1].eval(xdata[i])
-        data.append(temp)    
-        #data.append(1)
+    #each segment covers its points except the last one; the first
+    #also covers the points below it and the last one those above
+    x = asarray(xdata, float)
+    data = zeros(len(x))
+    for i in range(len(segs)):
+        lowindex = 0 if i == 0 else getClosestIndex(segs[i][1], x)
+        highindex = len(x) if i == len(segs) - 1 else getClosestIndex(segs[i][2], x)
+        data[lowindex:highindex] = polys[i].eval(x[lowindex:highindex])
      
     sp_E0 = polys[0].eval(E0)
     
@@ -337,6 +314,13 @@ def simpleInterpolate(self, x, xdata, ydata):
     
     return ydata[lindex]+dy
 
+def gauss(x,mean,stdev):
+    
+    #works elementwise on arrays (math.pow doesn't)
+    norm=1/(stdev*np_sqrt(2*pi))
+    temp=-1*(x-mean)**2/(2*stdev*stdev)
+    return norm*exp(temp)
+    
 def toKSpace(x,e0):
 
     #temp=2.0*H_bar/Me*(x-e0)
@@ -353,3 +337,184 @@ def fromKSpace(k,e0):
     else:
         return pow(k/KEV,2)+e0
     
+
+# Batch versions of the calc functions. Each takes a stack of spectra
+# (one per row, all on the same energy grid) and reproduces the result of
+# the scalar function above for every row. The linear systems only depend
+# on the grid and the parameters, so they are built and factorized once
+# and then solved for all rows at the same time.
+
+def kWeights(xdata, E0):
+    #k^3 weights used by bounds(); zero below the edge
+    xdata = asarray(xdata, float)
+    return power(KEV * np_sqrt(clip(xdata - E0, 0, None)), 3)
+
+def calcBackgroundBatch(xdata, ystack, lindex, hindex, order, E0):
+    
+    x = asarray(xdata, float)
+    ystack = atleast_2d(asarray(ystack, float))
+    xfit = x[lindex:hindex + 1]
+    
+    if order > 0:
+        basis = lambda xs: power.outer(xs, arange(order))
+    elif order == 0: #ie, is for line of form y=a/x+b
+        basis = lambda xs: column_stack((ones(len(xs)), 1.0 / xs))
+    elif order == VICTOREEN:
+        basis = victoreenBasis
+    else:
+        print("Not implemented yet! Probably won't be either!")
+        return zeros(ystack.shape)
+    
+    #same normal equations as calcBackground, solved for every row at once
+    vfit = basis(xfit)
+    matrix = dot(vfit.T, vfit)
+    vector = dot(vfit.T, ystack[:, lindex:hindex + 1].T)
+    coeffs = LinearAlgebra.solve(matrix, vector)
+    
+    background = dot(basis(x), coeffs).T
+    
+    #if fit is above edge, adjust background by the 5pt average around the minimum
+    if x[hindex] > E0:
+        rows = arange(ystack.shape[0])
+        index = ystack.argmin(axis=1)
+        low = clip(index - 2, 0, None)
+        high = clip(index + 3, None, ystack.shape[1])
+        
+        csum = column_stack((zeros(ystack.shape[0]), cumsum(ystack, axis=1)))
+        minpoint = (csum[rows, high] - csum[rows, low]) / (high - low)
+        
+        background -= (background[rows, index] - minpoint)[:, None]
+        
+    return background
+
+def splineSystem(xdata, E0, segs):
+    """Build the constrained least-squares system used by calcSpline.
+
+    Returns the same matrix as bounds() together with a list of
+    (lindex, hindex, offset, order) tuples describing where each segment
+    lives in the grid and in the solution vector. The matrix does not
+    depend on the y data, so one factorization serves any number of
+    spectra sharing the grid, E0 and segments.
+    """
+    x = asarray(xdata, float)
+    weights = kWeights(x, E0)
+    
+    size = 0
+    for seg in segs:
+        size += seg[0]
+    n = size + 2 * len(segs) - 2
+    
+    matrix = zeros((n, n), float)
+    blocks = []
+    
+    cur_pos = 0
+    last = len(segs) - 1
+    for i, seg in enumerate(segs):
+        order = seg[0]
+        lindex, hindex = [int(j) for j in getClosestIndices([seg[1], seg[2]], x)]
+        
+        xs = x[lindex:hindex + 1]
+        vander = power.outer(xs, arange(order))
+        matrix[cur_pos:cur_pos + order, cur_pos:cur_pos + order] = dot(vander.T * weights[lindex:hindex + 1], vander)
+        blocks.append((lindex, hindex, cur_pos, order))
+        
+        if last > 0:
+            rows = arange(order)
+            xl = x[lindex]
+            xh = x[hindex]
+            
+            #lagrange multiplier columns and the continuity conditions
+            #(0th and 1st derivative) at the low and high knots
+            if i > 0:
+                matrix[cur_pos:cur_pos + order, cur_pos - 2] = -0.5 * rows * _powers(xl, rows - 1)
+                matrix[cur_pos:cur_pos + order, cur_pos - 1] = -0.5 * _powers(xl, rows)
+                matrix[cur_pos - 2, cur_pos:cur_pos + order] = _powers(xl, rows)
+                matrix[cur_pos - 1, cur_pos:cur_pos + order] = rows * _powers(xl, rows - 1)
+            if i < last:
+                matrix[cur_pos:cur_pos + order, cur_pos + order] = 0.5 * rows * _powers(xh, rows - 1)
+                matrix[cur_pos:cur_pos + order, cur_pos + order + 1] = 0.5 * _powers(xh, rows)
+                matrix[cur_pos + order, cur_pos:cur_pos + order] = -1.0 * _powers(xh, rows)
+                matrix[cur_pos + order + 1, cur_pos:cur_pos + order] = -1.0 * rows * _powers(xh, rows - 1)
+                
+        cur_pos += order + 2 #2 for the cond spots
+        
+    return matrix, blocks
+
+def _powers(x, exps):
+    #x**exps that tolerates the negative exponent multiplied away by the 0th row
+    return array([pow(x, e) if e >= 0 else 0.0 for e in exps])
+
+def splineRHS(xdata, ystack, E0, blocks, size):
+    #right hand side of the spline system for each row of ystack (one column each)
+    x = asarray(xdata, float)
+    weights = kWeights(x, E0)
+    
+    vec = zeros((size, ystack.shape[0]), float)
+    for lindex, hindex, offset, order in blocks:
+        vander = power.outer(x[lindex:hindex + 1], arange(order)) * weights[lindex:hindex + 1, None]
+        vec[offset:offset + order] = dot(vander.T, ystack[:, lindex:hindex + 1].T)
+        
+    return vec
+
+def evalSpline(xdata, soln, blocks):
+    #evaluate the segment polynomials (one solution per column) over the grid
+    x = asarray(xdata, float)
+    data = zeros((soln.shape[1], len(x)), float)
+    
+    for i, (lindex, hindex, offset, order) in enumerate(blocks):
+        #first segment also covers the pre-segment, last one the post-segment
+        start = 0 if i == 0 else lindex
+        stop = len(x) if i == len(blocks) - 1 else hindex
+        
+        vander = power.outer(x[start:stop], arange(order))
+        data[:, start:stop] = dot(vander, soln[offset:offset + order]).T
+        
+    return data
+
+def calcSplineBatch(xdata, ystack, E0, segs):
+    """Batch version of calcSpline; returns (splines, sp_E0) as arrays."""
+    ystack = atleast_2d(asarray(ystack, float))
+    
+    matrix, blocks = splineSystem(xdata, E0, segs)
+    vec = splineRHS(xdata, ystack, E0, blocks, len(matrix))
+    
+    #one LU factorization shared by every right hand side
+    soln = LinearAlgebra.solve(matrix, vec)
+    
+    order = blocks[0][3]
+    sp_E0 = dot(power.outer(array([E0], float), arange(order)), soln[:order])[0]
+    
+    return evalSpline(xdata, soln, blocks), sp_E0
+
+def calcXAFSBatch(normstack, splinestack, kdata):
+    #expect only ranges > E0 are given
+    kdata = asarray(kdata, float)
+    return (asarray(normstack) - asarray(splinestack)) * power(kdata, 3)
+
+def calcFFTBatch(kdata, k3xafsstack, kmin, kmax):
+    """Batch version of calcFFT; rebins every row the same way and runs all
+    FFTs in one call. Returns (fftstack, DR)."""
+    kdata = asarray(kdata, float)
+    k3xafsstack = atleast_2d(asarray(k3xafsstack, float))
+    if len(kdata) == 0:
+        return zeros((k3xafsstack.shape[0], 0)), DR
+    
+    dk = pi / (FFTPOINTS * DR)
+    edges = arange(dk, kdata[-1], dk)
+    
+    #window the data, then sum everything below each bin edge
+    windowed = k3xafsstack * ((kdata >= kmin) & (kdata <= kmax))
+    csum = column_stack((zeros(k3xafsstack.shape[0]), cumsum(windowed, axis=1)))
+    
+    #same bin bookkeeping as calcFFT: the first point above the bin edge
+    #is counted in the denominator and starts the next bin
+    stop = searchsorted(kdata, edges, side='left')
+    start = concatenate(([0], stop[:-1]))[:len(stop)]
+    denom = clip(stop - start + 1, 1, None)
+    bindata = (csum[:, stop] - csum[:, start]) / denom
+    
+    fftdata = absolute(FFT.fft(bindata, FFTPOINTS, axis=1))
+    half = FFTPOINTS // 2
+    mirror = concatenate(([0], arange(FFTPOINTS - 1, FFTPOINTS - half, -1)))
+    
+    return (fftdata[:, :half] + fftdata[:, mirror]) * dk * dk / 2.0, DR
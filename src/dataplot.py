@@ -12,18 +12,64 @@
 # (at your option) any later version.
 
 import sys
+from time import time
+from contextlib import contextmanager
+from numpy import asarray
 from .qt_compat import QWidget, QMainWindow, QDialog, QApplication, QPrinter, QPainter, QPixmap, QColor, QFontMetrics, QFont, QRect, QFileDialog, QMessageBox, QAction, QToolBar, QMenuBar, QMenu, QTextEdit, QPushButton, QSpacerItem, QSizePolicy, QString, SIGNAL, PYSIGNAL, qApp, translate
 from .qwt_compat import QwtPlot, QwtMarker, QwtCurve, QwtPlotItem, QwtPlotGrid
-from PyQt5.QtCore import pyqtSignal
+from PyQt5.QtCore import pyqtSignal, QTimer, Qt
 
 from .knot import Knot
+from .knotset import KnotSet
 from . import calc
+from .envelope import CurveEnvelope
+
+FRAME_MS=16 #drag updates are limited to one per display frame (~60 Hz)
+ZOOM_STEP=0.8 #range kept per wheel notch when zooming in
+ZOOM_LIMIT=1e4 #largest magnification of the x axis
+
+_batch={'depth': 0, 'pending': []} #see replotBatch()
+
+@contextmanager
+def replotBatch():
+    """Hold back DataPlot.replot() calls until the outermost batch ends.
+
+    Every plot that asked for a replot in the meantime is replotted once
+    at the end, so one pass through the pipeline repaints each window once
+    no matter how many of its curves and markers changed.
+    """
+    _batch['depth']+=1
+    try:
+        yield
+    finally:
+        _batch['depth']-=1
+        if _batch['depth']==0:
+            pending=_batch['pending']
+            _batch['pending']=[]
+            for plot in pending:
+                plot.replot()
+
+@contextmanager
+def blockedUpdates(*objects):
+    """Change plots and their controls as one step.
+
+    Signals of objects are blocked and replots held back until the end,
+    so whoever changes them sends the one update that covers it all.
+    """
+    blocked=[obj.blockSignals(True) for obj in objects]
+    try:
+        with replotBatch():
+            yield
+    finally:
+        for obj, old in zip(objects, blocked):
+            obj.blockSignals(old)
 
 class DataPlot(QwtPlot):
     # Define custom signals
     signalUpdate = pyqtSignal()
     signalChangedPlot = pyqtSignal()
     positionMessage = pyqtSignal(str)
+    knotHovered = pyqtSignal(int) # index of the knot under the cursor, -1 for none
 
     def __init__(self, color, *args):
         # Filter out old-style string name parameters for PyQt5 compatibility
@@ -37,74 +83,52 @@ class DataPlot(QwtPlot):
         
         self.mode='NONE'
         
+        # the knots live in knotset; knots holds one marker per entry
+        self.knotset=KnotSet()
         self.knots=[]
         self.color=color
-        self.excepts=[]
         self.data=[]
         
+        # drag updates are coalesced: moves only record the knot positions,
+        # the timer replots and emits signalUpdate once per frame
+        self.updateTimer=QTimer(self)
+        self.updateTimer.setSingleShot(True)
+        self.updateTimer.timeout.connect(self.flushUpdate)
+        self.lastUpdate=0.0
+        
+        # curves that are drawn through a per-pixel min/max envelope
+        self.envelopes=[]
+        
+        # x range set by the program while zoomed in, None when not zoomed
+        self.zoomBase=None
+        
+        # knot the cursor is over, see setHoveredKnot()
+        self.hovered=-1
+        
         # Connect mouse events
         self.canvas().setMouseTracking(True)
         self.canvas().mousePressEvent = self.slotMousePressed
         self.canvas().mouseMoveEvent = self.slotMouseMoved
         self.canvas().mouseReleaseEvent = self.slotMouseReleased
+        self.canvas().wheelEvent = self.slotWheel
+        self.canvas().mouseDoubleClickEvent = self.slotMouseDoubleClicked
+        self.canvas().leaveEvent = self.slotMouseLeft
     
     def addKnot(self, pos, lock=False):
-        
-        # Get axis bounds - use axisInterval for PythonQwt compatibility
-        try:
-            # PythonQwt uses axisInterval()
-            interval = self.axisInterval(QwtPlot.xBottom)
-            dmin = interval.minValue()
-            dmax = interval.maxValue()
-        except Exception:
-            # Fallback: try legacy canvasMap with s1/s2
-            try:
-                scale_map = self.canvasMap(QwtPlot.xBottom)
-                dmin = scale_map.s1()
-                dmax = scale_map.s2()
-            except Exception:
-                # Last resort: use plot axis scale
-                dmin = self.axisScaleDiv(QwtPlot.xBottom).lowerBound()
-                dmax = self.axisScaleDiv(QwtPlot.xBottom).upperBound()
-        
-        # if no other knots, just add and set boundary to be max and min
-        if len(self.knots) == 0:
-            knot = Knot(pos, self.color, self)
-            knot.setBoundary(dmin, dmax)
-            
-            # insertMarker doesn't exist in PythonQwt, knot is already attached via Knot.__init__
-            try:
-                self.insertMarker(knot)
-            except Exception:
-                pass  # Already attached in Knot.__init__
-                
-            self.knots.append(knot)
-            knot.setLock(lock)
-            return
-            
-        # make sure new position is reasonable
-        last = self.knots[-1]
-        lastpos = last.getPosition()
-        
-        if pos < lastpos:
+        # the first knot may go anywhere, the others are clamped to the axis
+        if not self.knotset.add(pos, lock, self.getAxisRange()):
             print("New knot position is lower than previous knots")
             return
+        self.addMarker()
+        if len(self.knots) > 1:
+            self.signalChangedPlot.emit()
+            self.replot()
+            
+    def addMarker(self):
+        # marker for the last knot of the set
+        knot = Knot(self.knotset, len(self.knots), self.color, self)
         
-        xmax = dmax
-        if pos > xmax:
-            pos = xmax
-        
-        xmin = dmin
-        if pos < xmin:
-            pos = xmin
-        
-        # create and add knot, adding boundary of previous knot
-        knot = Knot(pos, self.color, self)
-        knot.setLock(lock)
-        # Set wide boundaries: previous knot position to axis max
-        # Allow ~1 eV minimum separation for stability
-        knot.setBoundary(lastpos + 1.0, xmax)
-        
+        # insertMarker doesn't exist in PythonQwt, knot is already attached via Knot.__init__
         try:
             self.insertMarker(knot)
         except Exception:
@@ -112,81 +136,93 @@ class DataPlot(QwtPlot):
             
         self.knots.append(knot)
         
-        # Update previous knot boundary: axis min to new knot position
-        # This allows knots to move freely within the data range
-        bndy = last.getBoundary()
-        bndy[1] = pos - 1.0
-        last.setBoundary(bndy[0], bndy[1])
-        
-        self.fixKnotsBounds()
-        self.signalChangedPlot.emit()
-        self.replot()
+    def detachMarker(self, knot):
+        try:
+            # Try PythonQwt method
+            knot.detach()
+        except Exception:
+            # Fallback for legacy Qwt
+            try:
+                self.removeMarker(knot)
+            except Exception:
+                pass
     
     def removeKnot(self):
         if self.knots:
-            # Remove the last knot's marker from the plot
-            last_knot = self.knots[-1]
-            try:
-                # Try to detach the marker (PythonQwt method)
-                last_knot.detach()
-            except Exception:
-                # Fallback: try legacy removeMarker if available
-                try:
-                    keys = self.markerKeys()
-                    if keys:
-                        self.removeMarker(keys[-1])
-                except Exception:
-                    pass
-            
-            self.knots.pop()
+            self.detachMarker(self.knots.pop())
+            self.knotset.pop()
             self.fixKnotsBounds()
             self.signalChangedPlot.emit()
             self.replot()
     
     def resetPlot(self):
         """Clear all knots and markers from the plot."""
-        # Remove all knot markers
         for knot in self.knots:
-            try:
-                # Try PythonQwt method
-                knot.detach()
-            except Exception:
-                # Fallback for legacy Qwt
-                try:
-                    self.removeMarker(knot)
-                except Exception:
-                    pass
+            self.detachMarker(knot)
         self.knots = []
+        self.knotset.clear()
+        self.setHoveredKnot(None)
+        self.replot()
+        
+    def setKnotSet(self, knotset):
+        """Show knotset, e.g. one that was built or optimized without a plot."""
+        for knot in self.knots:
+            self.detachMarker(knot)
+        self.knots = []
+        self.knotset = knotset
+        self.syncKnots()
+        
+    def syncKnots(self):
+        # one marker per knot of the set, at its current position
+        while len(self.knots) > len(self.knotset):
+            self.detachMarker(self.knots.pop())
+        while len(self.knots) < len(self.knotset):
+            self.addMarker()
+        for knot in self.knots:
+            knot.setXValue(knot.getPosition())
+        self.setHoveredKnot(None)
         self.replot()
             
-    def addBoundsExceptions(self,knot,bnd,value):
-        bounds=self.knots[knot].getBoundary()
-        bounds[bnd]=value
-        self.knots[knot].setBoundary(bounds[0],bounds[1])
+    def getAxisRange(self):
+        # the full range even when zoomed in; it bounds the end knots
+        if self.zoomBase is not None:
+            return self.zoomBase
+        return self.getViewRange()
         
-        self.excepts.append((knot,bnd,value))
+    def getViewRange(self):
+        # Get axis bounds - use axisInterval for PythonQwt compatibility
+        try:
+            # PythonQwt uses axisInterval()
+            interval = self.axisInterval(QwtPlot.xBottom)
+            return interval.minValue(), interval.maxValue()
+        except Exception:
+            # Fallback: try legacy canvasMap with s1/s2
+            try:
+                scale_map = self.canvasMap(QwtPlot.xBottom)
+                return scale_map.s1(), scale_map.s2()
+            except Exception:
+                # Last resort: use plot axis scale
+                return (self.axisScaleDiv(QwtPlot.xBottom).lowerBound(),
+                        self.axisScaleDiv(QwtPlot.xBottom).upperBound())
+    
+    def getKnotLimits(self):
+        # absolute (min, max) for each knot, ignoring its neighbours:
+        # the axis range for the end knots, overridden by bounds exceptions
+        axis_min, axis_max = self.getAxisRange()
+        return self.knotset.getLimits(axis_min, axis_max)
+        
+    def addBoundsExceptions(self,knot,bnd,value):
+        self.knotset.addBoundsException(knot,bnd,value)
         
     def slotMousePressed(self,event):
+        if event.button() in (Qt.RightButton, Qt.MidButton):
+            # pan the zoomed range
+            self.mode='PANNING'
+            self.panStart=(event.x(), self.getViewRange())
+            return
         self.oldx = self.invTransform(QwtPlot.xBottom, event.x())
         self.oldy = self.invTransform(QwtPlot.yLeft, event.y())
-        # Find nearest knot to the mouse in pixel space
-        self.movingMarker = None
-        if self.knots:
-            px = event.x()
-            py = event.y()
-            best_knot = None
-            best_dist = 1e9
-            for k in self.knots:
-                kx = self.transform(QwtPlot.xBottom, k.xValue())
-                ky = self.transform(QwtPlot.yLeft, k.yValue()) if hasattr(k, 'yValue') else self.transform(QwtPlot.yLeft, 0.0)
-                # Use distance in x-direction only for vertical markers
-                d = abs(kx - px)
-                if d < best_dist:
-                    best_dist = d
-                    best_knot = k
-            # Use a generous threshold (30 pixels) but only select the single closest knot
-            if best_dist < 30:
-                self.movingMarker = best_knot
+        self.movingMarker = self.closestKnot(event.x())
         
         #does it exist?
         if(self.movingMarker==None):
@@ -204,13 +240,45 @@ class DataPlot(QwtPlot):
             status="Trying to move an unmovable marker"
             self.positionMessage.emit(status)
         
+    def closestKnot(self,px):
+        # the single knot closest to canvas x position px, if it's within
+        # a generous 30 pixels; markers are vertical so only x counts
+        best_knot = None
+        best_dist = 1e9
+        for k in self.knots:
+            d = abs(self.transform(QwtPlot.xBottom, k.xValue()) - px)
+            if d < best_dist:
+                best_dist = d
+                best_knot = k
+        if best_dist < 30:
+            return best_knot
+        return None
+        
+    def setHoveredKnot(self,knot):
+        index = -1
+        if knot is not None:
+            index = self.knots.index(knot)
+        if index != self.hovered:
+            self.hovered = index
+            self.knotHovered.emit(index)
+        
+    def slotMouseLeft(self,event):
+        self.setHoveredKnot(None)
+        
     def slotMouseMoved(self,event):
         #print "enter slotMouseMoved",self.mode
         
         self.newx=self.invTransform(QwtPlot.xBottom,event.x())
         self.newy=self.invTransform(QwtPlot.yLeft,event.y())
         
+        if(self.mode=='PANNING'):
+            x0, (xmin, xmax) = self.panStart
+            shift=(x0-event.x())*(xmax-xmin)/max(1,self.canvas().width())
+            self.setViewRange(xmin+shift, xmax+shift)
+            return
+            
         if(self.mode=='NONE'):
+            self.setHoveredKnot(self.closestKnot(event.x()))
             xpos=self.invTransform(QwtPlot.xBottom,event.x())
             temp="x: %.3f" % self.newx+", y: %.3f" %self.newy 
             
@@ -261,38 +329,126 @@ class DataPlot(QwtPlot):
             
             self.fixKnotsBounds()
             
-            self.replot()
-
-            self.signalUpdate.emit()
+            self.scheduleUpdate()
             
             status = temp
             
             self.positionMessage.emit(status)
             
+    def scheduleUpdate(self):
+        #intermediate positions are dropped; the flush uses whatever the
+        #knots hold by then
+        if self.updateTimer.isActive():
+            return
+        wait=FRAME_MS-(time()-self.lastUpdate)*1000
+        self.updateTimer.start(max(0,int(wait)))
+        
+    def flushUpdate(self):
+        self.lastUpdate=time()
+        with replotBatch():
+            self.replot()
+            self.signalUpdate.emit()
+        
     def slotMouseReleased(self,event):
+        if(self.mode=='PANNING'):
+            self.mode='NONE'
+            return
         self.mode='NONE'
+        # the exact update below supersedes any pending drag update
+        self.updateTimer.stop()
         xpos=self.invTransform(QwtPlot.xBottom,event.x())
         temp="x: %.3f" % self.newx+", y: %.3f" %self.newy 
             
         if(len(self.knots)>0):
-            temp+="; [ "
-            for knot in self.knots[:-1]:
-                #tempnum=knot.getPosition()
-                tempnum=calc.getClosest(knot.getPosition(),self.data)
-                knot.setPosition(tempnum)
-                temp+="%.3f, "%(tempnum,)
-                    
-            #temp+=str(self.knots[-1].getPosition())
-            tempnum=calc.getClosest(self.knots[-1].getPosition(),self.data)
-            self.knots[-1].setPosition(tempnum)
-            temp+="%.3f ]"%(tempnum,)
+            #every knot snaps to its closest data point
+            if len(self.data)>0:
+                self.knotset.positions=asarray(self.data,float)[self.knotset.getIndices(self.data)]
+                for knot in self.knots:
+                    knot.setXValue(knot.getPosition())
+            temp+="; [ "+", ".join(["%.3f"%(pos,) for pos in self.knotset.positions])+" ]"
                 
         self.positionMessage.emit(temp)
-        self.signalUpdate.emit()
+        with replotBatch():
+            self.signalUpdate.emit()
+            self.replot()
+        
+    def slotWheel(self,event):
+        steps=event.angleDelta().y()/120.0
+        if steps==0 or self.mode!='NONE':
+            return
+        # zoom around the energy under the mouse
+        center=self.invTransform(QwtPlot.xBottom,event.pos().x())
+        xmin, xmax = self.getViewRange()
+        scale=ZOOM_STEP**steps
+        self.setViewRange(center-(center-xmin)*scale, center+(xmax-center)*scale)
+        
+    def slotMouseDoubleClicked(self,event):
+        self.resetZoom()
+        
+    def setViewRange(self, xmin, xmax):
+        """Show xmin..xmax of the full range, keeping inside of it."""
+        base=self.getAxisRange()
+        span=min(xmax-xmin, base[1]-base[0])
+        span=max(span, (base[1]-base[0])/ZOOM_LIMIT)
+        xmin=min(max(xmin, base[0]), base[1]-span)
+        if span >= base[1]-base[0]:
+            self.resetZoom()
+            return
+        self.zoomBase=base
+        QwtPlot.setAxisScale(self, QwtPlot.xBottom, xmin, xmin+span)
         self.replot()
         
+    def resetZoom(self):
+        if self.zoomBase is None:
+            return
+        base=self.zoomBase
+        self.zoomBase=None
+        QwtPlot.setAxisScale(self, QwtPlot.xBottom, base[0], base[1])
+        self.replot()
+        
+    def setAxisScale(self, axis, *args):
+        # a new full range keeps the zoom as long as the view lies inside it
+        if axis==QwtPlot.xBottom and self.zoomBase is not None:
+            xmin, xmax = self.getViewRange()
+            if args[0] <= xmin and xmax <= args[1]:
+                self.zoomBase=(args[0], args[1])
+                return
+            self.zoomBase=None
+        QwtPlot.setAxisScale(self, axis, *args)
+        # new knots are clamped to the x range, which Qwt would only take
+        # over on the next replot; that may be held back by replotBatch()
+        if axis==QwtPlot.xBottom:
+            self.updateAxes()
+        
     def setData(self, data):
         self.data = data
+        
+    def addEnvelope(self, curve):
+        #the curve's data then has to be set through the returned envelope
+        env=CurveEnvelope(curve)
+        self.envelopes.append(env)
+        return env
+        
+    def updateEnvelopes(self):
+        # the axis range only takes effect in updateAxes
+        self.updateAxes()
+        xmin, xmax = self.getViewRange()
+        width = self.canvas().width()
+        for env in self.envelopes:
+            env.update(xmin, xmax, width)
+            
+    def replot(self):
+        if _batch['depth']>0:
+            if self not in _batch['pending']:
+                _batch['pending'].append(self)
+            return
+        self.updateEnvelopes()
+        QwtPlot.replot(self)
+        
+    def resizeEvent(self, event):
+        QwtPlot.resizeEvent(self, event)
+        # a wider canvas has room for more detail
+        self.updateEnvelopes()
 
     # The following methods are now obsolete and replaced by direct QwtCurve usage in RawPlot.
     # They are kept for compatibility but do nothing.
@@ -304,38 +460,8 @@ class DataPlot(QwtPlot):
         pass
     
     def fixKnotsBounds(self):
-        
-        if len(self.knots) == 0 or len(self.knots) == 1:
-            return
-        
-        # Get axis bounds using PythonQwt compatible method
-        try:
-            interval = self.axisInterval(QwtPlot.xBottom)
-            axis_min = interval.minValue()
-            axis_max = interval.maxValue()
-        except Exception:
-            try:
-                scale_map = self.canvasMap(QwtPlot.xBottom)
-                axis_min = scale_map.s1()
-                axis_max = scale_map.s2()
-            except Exception:
-                axis_min = self.axisScaleDiv(QwtPlot.xBottom).lowerBound()
-                axis_max = self.axisScaleDiv(QwtPlot.xBottom).upperBound()
-        
-        max_bound = self.knots[1].xValue() - 0.01
-        self.knots[0].setBoundary(axis_min, max_bound)
-        
-        for i in range(1, len(self.knots) - 1):
-            self.knots[i].setBoundary(self.knots[i - 1].xValue() + 0.01,
-                                      self.knots[i + 1].xValue() - 0.01)
-    
-        min_bound = self.knots[-2].xValue() + 0.01
-        self.knots[-1].setBoundary(min_bound, axis_max)
-        
-        for ex in self.excepts:
-            bnd = self.knots[ex[0]].getBoundary()
-            bnd[ex[1]] = ex[2]
-            self.knots[ex[0]].setBoundary(bnd[0], bnd[1])
+        axis_min, axis_max = self.getAxisRange()
+        self.knotset.fixBounds(axis_min, axis_max)
     
     def getClosest(self,val): #replace by bisecting sort later?
         
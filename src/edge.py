@@ -22,18 +22,38 @@ from .qt_compat import (
 )
 import sys
 
-haveFile=True
+#used when there is no edges.dat
+DEFAULT_EDGES={
+    'Chlorine': {'K':2840.0},
+    'Chromium': {'K':6005.0},
+    'Cobalt': {'K': 7725.0},
+    'Copper': {'K': 9000.0},
+    'Iron': {'K': 7130.0},
+    'Manganese': {'K': 6555.0},
+    'Molybdenum': {'K':20025.0, 'L3':2530.0, 'L2':2640.0},
+    'Sulfur': {'K':2490.0},
+    'Titanium': {'K': 4985.0},
+    'Zinc': {'K': 9680.0}
+}
+
+_edges=None
+
+def getEdges():
+    """Edge energies by element and edge, read from edges.dat on first use."""
+    global _edges
+    if _edges is not None:
+        return _edges
+
+    #check to see if we have it
+    try:
+        file=open("edges.dat")
+    except IOError:
+        _edges=DEFAULT_EDGES
+        return _edges
 
-#check to see if we have it
-try:
-    file=open("edges.dat")
-except IOError:
-    haveFile=False
-    
-if haveFile:
     #skip header
     line=file.readline()
-    
+
     data={}
     #each line contains one element and it's edges:energies
     line=file.readline()
@@ -46,20 +66,9 @@ if haveFile:
         data[arr[0]]=edges
         line=file.readline()
     file.close()
-    
-else:
-    data={
-    'Chlorine': {'K':2840.0},
-    'Chromium': {'K':6005.0},
-    'Cobalt': {'K': 7725.0},
-    'Copper': {'K': 9000.0},
-    'Iron': {'K': 7130.0},
-    'Manganese': {'K': 6555.0},
-    'Molybdenum': {'K':20025.0, 'L3':2530.0, 'L2':2640.0},
-    'Sulfur': {'K':2490.0},
-    'Titanium': {'K': 4985.0},
-    'Zinc': {'K': 9680.0}
-    }
+
+    _edges=data
+    return _edges
 
 class EdgeDialog(QDialog):
     def __init__(self, parent=None, name=None, modal=1, fl=0):
@@ -129,6 +138,7 @@ class EdgeDialog(QDialog):
 
         self.resize(QSize(300, 283).expandedTo(self.minimumSizeHint()))
 
+        self.data = getEdges()
         self.initData()
 
         # PyQt5: use new-style signals
@@ -153,16 +163,16 @@ class EdgeDialog(QDialog):
         self.cancelButton.setText(self.__tr("&Cancel"))
 
     def initData(self):
-        for element in sorted(data.keys()):
+        for element in sorted(self.data.keys()):
             self.elementBox.addItem(element)
         # Initialize with first element
-        first_element = sorted(data.keys())[0]
+        first_element = sorted(self.data.keys())[0]
         self.elementChanged(first_element)
 
     def edgeChanged(self, edge):
         # PyQt5: edge is already a string
         element = str(self.elementBox.currentText())
-        edges = data[element]
+        edges = self.data[element]
         text = edges[str(edge)]
         self.lineEdit1.setText(str(text))
 
@@ -170,7 +180,7 @@ class EdgeDialog(QDialog):
         self.edgeBox.clear()
         # PyQt5: element is already a string
         element_str = str(element)
-        edges = data[element_str]
+        edges = self.data[element_str]
         for edge in sorted(edges.keys()):
             self.edgeBox.addItem(edge)
         # Set first edge
@@ -182,7 +192,7 @@ class EdgeDialog(QDialog):
         self.elementChanged(element)
         if not checked:
             edge = str(self.edgeBox.currentText())
-            edges = data[element]
+            edges = self.data[element]
             text = edges[edge]
             self.lineEdit1.setText(str(text))
         self.lineEdit1.setEnabled(checked)
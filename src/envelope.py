@@ -0,0 +1,122 @@
+# envelope.py -- reduces a curve to what can be seen at the current axis
+#                range: one first/min/max/last group of points per pixel
+#                column instead of every data point. Peaks and glitches
+#                narrower than a pixel stay visible since each column keeps
+#                its extremes. For zooming, every data set also gets a
+#                pyramid of coarser levels, so any range is reduced from a
+#                level with only a few blocks per pixel. The plot windows
+#                and overlay.py draw the points it returns.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+
+from numpy import (asarray, searchsorted, flatnonzero, concatenate, minimum,
+                   maximum, column_stack, clip, empty, arange)
+
+POINTS_PER_PIXEL = 4 #below this many points per column the data is drawn as is
+LEVEL_FACTOR = 4 #blocks of one pyramid level merged into one of the next
+LEVEL_MIN = 256 #no coarser levels are made below this many blocks
+
+def makeLevel(xdata, ydata):
+    #(x, xend, first, last, low, high) per point; every point is its own block
+    x = asarray(xdata, float)
+    y = asarray(ydata, float)
+    return (x, x, y, y, y, y)
+
+def coarsen(level, factor=LEVEL_FACTOR):
+    #next pyramid level: every factor blocks merged into one
+    x, xend, first, last, low, high = level
+    starts = arange(0, len(x), factor)
+    ends = minimum(starts + factor, len(x)) - 1
+    return (x[starts], xend[ends], first[starts], last[ends],
+            minimum.reduceat(low, starts), maximum.reduceat(high, starts))
+
+def makePyramid(xdata, ydata):
+    """Levels of makeLevel(xdata, ydata) coarsened by LEVEL_FACTOR each.
+
+    Building it is O(n) and takes a third more memory than the data.
+    """
+    levels = [makeLevel(xdata, ydata)]
+    while len(levels[-1][0]) > LEVEL_MIN:
+        levels.append(coarsen(levels[-1]))
+    return levels
+
+def chooseLevel(levels, xmin, xmax, pixels):
+    #coarsest level that still has POINTS_PER_PIXEL blocks per column
+    for level in reversed(levels):
+        x = level[0]
+        count = searchsorted(x, xmax, side='right') - searchsorted(x, xmin, side='left')
+        if count >= POINTS_PER_PIXEL * pixels:
+            return level
+    return levels[0]
+
+def envelope(level, xmin, xmax, pixels):
+    """Points to draw for the blocks of level between xmin and xmax.
+
+    level is a tuple of arrays as made by makeLevel(): the start and end
+    energy of each block, its first and last value and its extremes. Every
+    pixel column gets its first and last point at their own energies and
+    its minimum and maximum in between, which draws the same line as all
+    of the points would. One block beyond each end of the range is kept so
+    the line runs off the edges of the plot. Returns (xdata, ydata).
+    """
+    x, xend, first, last, low, high = level
+    single = low is high
+    start = searchsorted(x, xmin, side='right') - 1
+    stop = searchsorted(xend, xmax, side='left') + 1
+    start = clip(start, 0, len(x))
+    stop = clip(stop, start, len(x))
+
+    x, xend, first, last, low, high = [a[start:stop] for a in level]
+    if len(x) <= POINTS_PER_PIXEL * pixels:
+        if single:
+            return x, low
+        starts = arange(len(x))
+    else:
+        #blocks are sorted, so each column is a contiguous run of them
+        col = clip(((x - xmin) * (pixels / float(xmax - xmin))).astype(int), -1, pixels)
+        starts = flatnonzero(concatenate(([True], col[1:] != col[:-1])))
+    ends = concatenate((starts[1:], [len(x)])) - 1
+
+    mid = 0.5 * (x[starts] + xend[ends])
+    xout = column_stack((x[starts], mid, mid, xend[ends])).ravel()
+    yout = column_stack((first[starts], minimum.reduceat(low, starts),
+                         maximum.reduceat(high, starts), last[ends])).ravel()
+    return xout, yout
+
+class CurveEnvelope:
+    """Full resolution data of a plot curve, drawn through envelope().
+
+    setData() keeps the data with its pyramid and update() hands the
+    curve the points for an axis range and canvas width, reduced from the
+    level chosen for that range. The reduction is only redone when the
+    data, the range or the width changed since the last update().
+    """
+    def __init__(self, curve):
+        self.curve = curve
+        self.levels = [makeLevel(empty(0), empty(0))]
+        self.shown = None
+
+    def setData(self, xdata, ydata):
+        self.levels = makePyramid(xdata, ydata)
+        self.shown = None
+
+    def getData(self):
+        return self.levels[0][0], self.levels[0][2]
+
+    def update(self, xmin, xmax, pixels):
+        #returns True if the curve was given new points
+        key = (xmin, xmax, pixels)
+        if key == self.shown:
+            return False
+        self.shown = key
+
+        if len(self.levels[0][0]) == 0 or pixels <= 0 or not xmax > xmin:
+            xdata, ydata = self.getData()
+        else:
+            level = chooseLevel(self.levels, xmin, xmax, pixels)
+            xdata, ydata = envelope(level, xmin, xmax, pixels)
+        self.curve.setData(xdata, ydata)
+        return True
@@ -19,6 +19,7 @@ from PyQt5.QtCore import pyqtSignal
 from .qwt_compat import QwtPlot, QwtMarker, QwtCurve, QwtPlotItem, QwtPlotGrid, QwtWheel
 
 from .dataplot import DataPlot
+from .overlay import OverlayItem
 
 class FFTPlot(QWidget):
     # Signal emitted when window is closed
@@ -50,6 +51,19 @@ class FFTPlot(QWidget):
         self.fftcurve.setPen(QPen(QColor(Qt.black), 2))
         self.fftcurve.attach(self.plot)
         
+        # other scans drawn behind this one, see setOverlay()
+        self.overlay = OverlayItem()
+        self.overlay.attach(self.plot)
+        
+        # uncertainty bands, only filled in on request
+        self.bandCurves = []
+        for title in ("lower band", "upper band"):
+            curve = QwtCurve()
+            curve.setTitle(title)
+            curve.setPen(QPen(QColor(Qt.gray), 1, Qt.DashLine))
+            curve.attach(self.plot)
+            self.bandCurves.append(curve)
+        
         layout.addWidget(self.plot)
         layout.addItem(spacer)
         
@@ -137,9 +151,26 @@ class FFTPlot(QWidget):
                 self.plot.setCurveData(self.fftcurve, rdata, fftdata)
             except Exception:
                 pass
+        
+        #bands belong to the parameters they were calculated with
+        self.clearBands()
                 
         self.plot.replot()
         
+    def setBands(self,rdata,lower,upper):
+        self.bandCurves[0].setData(rdata, lower)
+        self.bandCurves[1].setData(rdata, upper)
+        self.plot.replot()
+        
+    def clearBands(self):
+        for curve in self.bandCurves:
+            curve.setData([], [])
+        
+    def setOverlay(self, curves):
+        #curves are (key, xdata, ydata, color), see OverlayItem.setCurves()
+        self.overlay.setCurves(curves)
+        self.plot.replot()
+        
 if(__name__=='__main__'):
     import sys
     app = QApplication(sys.argv)
@@ -0,0 +1,109 @@
+# gcv.py -- generalized cross-validation scores for spline configurations
+#           (number of knots and segment orders). The residual comes
+#           from one solve of the small constrained system and the trace
+#           of the hat matrix from its shape, so no candidate is ever
+#           refitted point by point or with points left out.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+
+from numpy import inf, isfinite
+import numpy.linalg as LinearAlgebra
+
+from . import calc
+from .knotopt import KnotSystem, MAXCOEFFS, maxFreeParameters
+
+def distributeKnots(xdata, E0, first, last, num):
+    #knots evenly spaced in k between first and last, as NormPlot.updateKnots does
+    kmin = calc.toKSpace(first, E0)
+    kmax = calc.toKSpace(last, E0)
+    div = (kmax - kmin) / float(num - 1)
+
+    positions = [first]
+    for i in range(1, num - 1):
+        positions.append(calc.fromKSpace(kmin + i * div, E0))
+    positions.append(last)
+
+    return [int(i) for i in calc.getClosestIndices(positions, xdata)]
+
+def scoreGCV(system, indices, coeffs):
+    """GCV score of one configuration of a KnotSystem.
+
+    Returns (gcv, rss, trace, n) where rss is the k^3 weighted residual
+    sum of squares over the fitted points, trace the trace of the hat
+    matrix and n the number of fitted points (points on a knot count once
+    per segment, as in the fit itself). A segment with fewer weighted
+    points than coefficients leaves the fit undetermined and scores inf.
+    """
+    matrix, vec, offsets = system.assemble([indices], coeffs)
+
+    try:
+        soln = LinearAlgebra.solve(matrix[0], vec[0])
+    except LinearAlgebra.LinAlgError:
+        return inf, inf, 0.0, 0
+
+    #residuals are summed on the grid; going through the moments instead
+    #cancels badly when the spline follows the data closely
+    rss = 0.0
+    n = 0
+    determined = True
+    for s in range(len(coeffs)):
+        lindex = indices[s]
+        hindex = indices[s + 1]
+        off = offsets[s]
+        order = coeffs[s]
+        fit = system.upow[lindex:hindex + 1, :order].dot(soln[off:off + order])
+        resid = system.y[lindex:hindex + 1] - fit
+        rss += (system.weights[lindex:hindex + 1] * resid * resid).sum()
+        points = system.count[hindex + 1] - system.count[lindex]
+        n += points
+        determined = determined and points >= order
+
+    #with every segment determined by its own points the hat matrix is a
+    #projection onto the splines that meet the continuity conditions, so
+    #its trace is the coefficients less two conditions per inner knot.
+    #Working it out from the inverse loses all digits once short segments
+    #have high orders.
+    trace = float(sum(coeffs) - 2 * (len(coeffs) - 1))
+
+    if not determined or n - trace <= 0 or not isfinite(rss):
+        return inf, rss, trace, n
+
+    return n * rss / (n - trace) ** 2, rss, trace, n
+
+def rankSplines(xdata, ydata, E0, first, last, knots=(2, 10), orders=(1, 5),
+                kmin=None, kmax=None):
+    """Score spline configurations between the knot positions first and last.
+
+    Every number of knots in the knots range (evenly spaced in k) is tried
+    with every uniform segment order in the orders range (spin box values,
+    i.e. polynomial order). Given the FFT window kmin to kmax,
+    configurations with more free parameters than it supports
+    (maxFreeParameters, as in optimizeKnots) are skipped. Returns a list
+    of (gcv, numKnots, orders) tuples, best first, with orders ready for
+    NormPlot.setOrders.
+    """
+    system = KnotSystem(xdata, ydata, E0, 0.0, 0.0)
+    maxFree = None
+    if kmin is not None and kmax is not None:
+        maxFree = maxFreeParameters(kmin, kmax)
+
+    results = []
+    for num in range(knots[0], knots[1] + 1):
+        indices = distributeKnots(system.x, E0, first, last, num)
+        if len(set(indices)) != num:
+            continue
+        for order in range(orders[0], orders[1] + 1):
+            coeffs = [order + 1] * (num - 1)
+            if order + 1 > MAXCOEFFS:
+                continue
+            if maxFree is not None and sum(coeffs) - 2 * (num - 2) > maxFree:
+                continue
+            score = scoreGCV(system, indices, coeffs)[0]
+            if isfinite(score):
+                results.append((float(score), num, [order] * (num - 1)))
+
+    results.sort(key=lambda r: r[0])
+    return results
@@ -0,0 +1,260 @@
+# heatmapplot.py -- the HeatmapPlot window showing a time series of scans as
+#                   an image: a row per scan against energy, k or R (see
+#                   stack.py). The image is drawn from the level of detail
+#                   with about one row per pixel, so panning and zooming
+#                   through thousands of scans only draws what fits. A cursor
+#                   picks the scan shown in the other windows.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+
+from os.path import basename
+from math import floor, ceil
+
+from numpy import ascontiguousarray, searchsorted
+from PyQt5.QtCore import pyqtSignal, Qt, QRectF, QPointF
+from PyQt5.QtGui import QImage, QPainter, QPen, QColor, qRgb
+from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QComboBox, QLabel,
+                             QStatusBar)
+
+from .qwt_compat import QwtPlot, QwtPlotItem, QwtPlotMarker
+from .stack import AXES, COLORS
+
+AXIS_TITLES = {'energy': "Energy (eV)", 'k': "k (1/A)", 'r': "R (A)"}
+AXIS_NAMES = {'energy': "Normalized data", 'k': "EXAFS", 'r': "Fourier transform"}
+ZOOM_STEP = 0.8 #range kept per wheel notch when zooming in
+MIN_ROWS = 4 #fewest scans a zoomed view shows
+
+#viridis, from dark blue to yellow; index COLORS is a row not computed yet
+_ANCHORS = ((68, 1, 84), (59, 82, 139), (33, 145, 140), (94, 201, 98), (253, 231, 37))
+
+def _colorTable():
+    table = []
+    for i in range(COLORS):
+        pos = i * (len(_ANCHORS) - 1) / float(COLORS - 1)
+        j = min(int(pos), len(_ANCHORS) - 2)
+        f = pos - j
+        table.append(qRgb(*[int(round(a + (b - a) * f)) for a, b in zip(_ANCHORS[j], _ANCHORS[j + 1])]))
+    table.append(qRgb(224, 224, 224))
+    return table
+
+COLOR_TABLE = _colorTable()
+
+class HeatmapItem(QwtPlotItem):
+    """A StackImage drawn as one plot item.
+
+    x is the image's grid and y the scan index; scan i covers i to i+1.
+    """
+    def __init__(self):
+        QwtPlotItem.__init__(self)
+        self.setTitle("heatmap")
+        self.setZ(10)
+        self.image = None
+
+    def setImage(self, image):
+        self.image = image
+        self.itemChanged()
+
+    def getExtent(self, first, last):
+        #x range drawn for grid points first to last, each centered on its own
+        grid = self.image.grid
+        step = (grid[-1] - grid[0]) / max(len(grid) - 1, 1)
+        return grid[first] - step / 2, grid[last - 1] + step / 2
+
+    def draw(self, painter, xMap, yMap, canvasRect):
+        image = self.image
+        if image is None or len(image.levels[0]) == 0 or len(image.grid) == 0:
+            return
+        count = len(image.levels[0])
+        ymin, ymax = sorted((yMap.s1(), yMap.s2()))
+        first, last = max(0, int(floor(ymin))), min(count, int(ceil(ymax)))
+        xmin, xmax = sorted((xMap.s1(), xMap.s2()))
+        left = max(0, int(searchsorted(image.grid, xmin)) - 1)
+        right = min(len(image.grid), int(searchsorted(image.grid, xmax, side='right')) + 1)
+        if last <= first or right <= left:
+            return
+
+        level = image.chooseLevel(last - first, max(1, int(canvasRect.height())))
+        scale = 1 << level
+        top = min(len(image.levels[level]), -(-last // scale))
+        bottom = first // scale
+        # rows go up the plot but down the image
+        data = ascontiguousarray(image.getIndices(level)[bottom:top, left:right][::-1])
+        qimage = QImage(data.data, right - left, top - bottom, data.strides[0], QImage.Format_Indexed8)
+        qimage.setColorTable(COLOR_TABLE)
+
+        x0, x1 = self.getExtent(left, right)
+        target = QRectF(QPointF(xMap.transform(x0), yMap.transform(min(top * scale, count))),
+                        QPointF(xMap.transform(x1), yMap.transform(bottom * scale)))
+        painter.setRenderHint(QPainter.SmoothPixmapTransform, False)
+        painter.drawImage(target.normalized(), qimage)
+
+class HeatmapPlot(QWidget):
+    # Signal emitted when window is closed
+    closed = pyqtSignal()
+    # the cursor was put on a scan, by its index
+    selected = pyqtSignal(int)
+
+    def __init__(self, parent=None):
+        QWidget.__init__(self, parent)
+        self.setObjectName("Time Series")
+        self.stack = None
+        self.axis = AXES[0]
+        self.current = -1
+        self.mode = 'NONE'
+
+        self.axisBox = QComboBox(self)
+        for axis in AXES:
+            self.axisBox.addItem(AXIS_NAMES[axis])
+        self.axisBox.currentIndexChanged.connect(lambda index: self.setAxis(AXES[index]))
+
+        self.plot = QwtPlot(self)
+        self.plot.setAxisTitle(QwtPlot.yLeft, "Scan")
+        self.item = HeatmapItem()
+        self.item.attach(self.plot)
+        self.marker = QwtPlotMarker()
+        self.marker.setLineStyle(QwtPlotMarker.HLine)
+        self.marker.setLinePen(QPen(QColor(Qt.red), 1))
+        self.marker.setZ(20)
+        self.marker.setVisible(False)
+        self.marker.attach(self.plot)
+
+        canvas = self.plot.canvas()
+        canvas.setMouseTracking(True)
+        canvas.mousePressEvent = self.slotMousePressed
+        canvas.mouseMoveEvent = self.slotMouseMoved
+        canvas.mouseReleaseEvent = self.slotMouseReleased
+        canvas.wheelEvent = self.slotWheel
+        canvas.mouseDoubleClickEvent = self.slotMouseDoubleClicked
+
+        top = QHBoxLayout()
+        top.addWidget(QLabel("Show", self))
+        top.addWidget(self.axisBox)
+        top.addStretch()
+        self.status = QStatusBar(self)
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(6, 6, 6, 0)
+        layout.addLayout(top)
+        layout.addWidget(self.plot)
+        layout.addWidget(self.status)
+
+        self.setFocusPolicy(Qt.StrongFocus)
+        self.setWindowTitle("Time Series")
+
+    def setStack(self, stack):
+        self.stack = stack
+        self.setCurrentScan(-1)
+        self.setAxis(self.axis)
+        self.resetZoom()
+
+    def setAxis(self, axis):
+        self.axis = axis
+        if self.stack is None:
+            return
+        image = self.stack.images[axis]
+        self.item.setImage(image)
+        if len(image.grid):
+            self.plot.setAxisScale(QwtPlot.xBottom, *self.item.getExtent(0, len(image.grid)))
+        self.plot.setAxisTitle(QwtPlot.xBottom, AXIS_TITLES[axis])
+        self.plot.replot()
+
+    def showRows(self, rows):
+        #new results for rows; only the image needs drawing again
+        self.plot.replot()
+
+    def setCurrentScan(self, row):
+        """Put the cursor on scan row, without selecting it."""
+        self.current = row
+        self.marker.setVisible(row >= 0)
+        self.marker.setYValue(row + 0.5)
+        self.plot.replot()
+
+    def getRow(self, y):
+        #scan under canvas position y
+        row = int(floor(self.plot.invTransform(QwtPlot.yLeft, y)))
+        return min(max(row, 0), len(self.stack) - 1)
+
+    def getRowRange(self):
+        interval = self.plot.axisInterval(QwtPlot.yLeft)
+        return interval.minValue(), interval.maxValue()
+
+    def setRowRange(self, ymin, ymax):
+        #show scans ymin to ymax, keeping inside the stack
+        count = max(len(self.stack), 1)
+        span = min(max(ymax - ymin, min(MIN_ROWS, count)), count)
+        ymin = min(max(ymin, 0), count - span)
+        self.plot.setAxisScale(QwtPlot.yLeft, ymin, ymin + span)
+        self.plot.replot()
+
+    def resetZoom(self):
+        if self.stack is not None:
+            self.setRowRange(0, len(self.stack))
+
+    def select(self, row):
+        if self.stack is None or not len(self.stack):
+            return
+        row = min(max(row, 0), len(self.stack) - 1)
+        self.setCurrentScan(row)
+        self.selected.emit(row)
+
+    def showPosition(self, event):
+        if self.stack is None or not len(self.stack):
+            return
+        row = self.getRow(event.y())
+        x = self.plot.invTransform(QwtPlot.xBottom, event.x())
+        self.status.showMessage("Scan %i: %s, x: %.3f" % (row + 1, basename(self.stack.paths[row]), x))
+
+    def slotMousePressed(self, event):
+        if self.stack is None or not len(self.stack):
+            return
+        if event.button() in (Qt.RightButton, Qt.MidButton):
+            self.mode = 'PANNING'
+            self.panStart = (event.y(), self.getRowRange())
+            return
+        self.mode = 'MOVING_CURSOR'
+        self.setCurrentScan(self.getRow(event.y()))
+
+    def slotMouseMoved(self, event):
+        if self.mode == 'PANNING':
+            y0, (ymin, ymax) = self.panStart
+            shift = (event.y() - y0) * (ymax - ymin) / max(1, self.plot.canvas().height())
+            self.setRowRange(ymin + shift, ymax + shift)
+        elif self.mode == 'MOVING_CURSOR':
+            # the scan is only loaded once the cursor is let go
+            self.setCurrentScan(self.getRow(event.y()))
+        self.showPosition(event)
+
+    def slotMouseReleased(self, event):
+        mode, self.mode = self.mode, 'NONE'
+        if mode == 'MOVING_CURSOR':
+            self.select(self.getRow(event.y()))
+
+    def slotWheel(self, event):
+        steps = event.angleDelta().y() / 120.0
+        if steps == 0 or self.stack is None or self.mode != 'NONE':
+            return
+        center = self.plot.invTransform(QwtPlot.yLeft, event.pos().y())
+        ymin, ymax = self.getRowRange()
+        scale = ZOOM_STEP ** steps
+        self.setRowRange(center - (center - ymin) * scale, center + (ymax - center) * scale)
+
+    def slotMouseDoubleClicked(self, event):
+        self.resetZoom()
+
+    def keyPressEvent(self, event):
+        if event.key() in (Qt.Key_Up, Qt.Key_Down) and self.current >= 0:
+            self.select(self.current + (1 if event.key() == Qt.Key_Up else -1))
+            return
+        QWidget.keyPressEvent(self, event)
+
+    def closeEvent(self, e):
+        self.hide()
+        self.closed.emit()
+
+    def setShown(self, bool):
+        if bool:
+            self.show()
+        else:
+            self.hide()
@@ -20,6 +20,7 @@ from PyQt5.QtCore import pyqtSignal
 from .qwt_compat import QwtPlot, QwtMarker, QwtCurve, QwtPlotItem, QwtPlotGrid
 
 from .dataplot import DataPlot
+from . import calc
 
 class I0Plot(QWidget):
     # Signal emitted when the window is closed
@@ -69,23 +70,20 @@ class I0Plot(QWidget):
         self.curve.setTitle("i0data")
         self.curve.attach(self.plot)
         self.curve.setPen(QPen(QColor(Qt.black), 2))
+        self.envelope = self.plot.addEnvelope(self.curve)
         
         self.setWindowTitle("I0 Data")
 
     def setI0Data(self,xdata,ydata):
+        # shared with the other windows, not copied
+        xdata=calc.column(xdata)
+        ydata=calc.column(ydata)
         self.xdata=xdata
         self.ydata=ydata
         
-        try:
-            self.curve.setData(xdata, ydata)
-        except Exception:
-            try:
-                # Fallback to plot helper method if needed
-                self.plot.setCurveData(self.curve, xdata, ydata)
-            except Exception:
-                pass
+        self.envelope.setData(xdata, ydata)
                 
-        self.plot.setAxisScale(QwtPlot.xBottom,min(xdata),max(xdata))
+        self.plot.setAxisScale(QwtPlot.xBottom,xdata.min(),xdata.max())
         self.plot.replot()
         
     def closeEvent(self,e):
@@ -1,5 +1,5 @@
-# knot.py -- a subclass of QwtPlotMarker that allows it to have 
-#             boundaries and other useful attributes while dragging
+# knot.py -- a subclass of QwtPlotMarker that draws one knot of a KnotSet;
+#             its position, boundaries and lock live in the set
 #
 # Copyright (c) Adam Tenderholt, Stanford University, 2004-2006
 #                               a-tenderholt@stanford.edu
@@ -13,42 +13,41 @@ from .qt_compat import QWidget, QMainWindow, QDialog, QApplication, QPrinter, QP
 from .qwt_compat import QwtPlot, QwtMarker, QwtCurve, QwtPlotItem, QwtPlotGrid, QwtPlotMarker
 
 class Knot(QwtPlotMarker):
-    def __init__(self, pos, color, parent=None):
+    def __init__(self, knotset, index, color, parent=None):
         # PyQt5/PythonQwt: QwtPlotMarker() takes no positional args for parent
         # Parent plot should be attached via attach() method after creation
         QwtPlotMarker.__init__(self)
+        self.knotset = knotset
+        self.index = index
         self.setLineStyle(QwtPlotMarker.VLine)
         # Make markers thicker (3 pixels) for easier visibility and selection
         self.setLinePen(QPen(QColor(color), 3))
-        self.setXValue(pos)
+        self.setXValue(knotset.positions[index])
         self.setYValue(1.0)
         
         # Attach to parent plot if provided
         if parent is not None:
             self.attach(parent)
-        
-        self.range = [pos - 1, pos + 1]
-        self.lock = False
 
     def setColor(self,color):
         self.setLinePen(QPen(QColor(color),2))
         
     def setPosition(self,pos):
+        self.knotset.positions[self.index]=pos
         self.setXValue(pos)
         
     def getPosition(self):
-        return self.xValue()
+        return float(self.knotset.positions[self.index])
         
     def setBoundary(self,min,max):
-        self.range[0]=min
-        self.range[1]=max
+        self.knotset.bounds[self.index]=(min,max)
     
     def getBoundary(self):
-        return self.range
+        # a copy; KnotSet.add() replaces the arrays
+        return tuple(self.knotset.bounds[self.index])
     
     def setLock(self,state):
-        self.lock=state
+        self.knotset.locked[self.index]=state
         
     def isLocked(self):
-        return self.lock
-        
+        return bool(self.knotset.locked[self.index])
@@ -0,0 +1,255 @@
+# knotopt.py -- automatic placement of the spline knots (and optionally the
+#               segment orders) by minimizing the low-R part of the Fourier
+#               transform, in the spirit of AUTOBK. KnotSystem keeps the
+#               spline system of one scan so trial knots are cheap to fit.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+
+from math import pi
+from numpy import (asarray, arange, zeros, power, cumsum, add, searchsorted,
+                   clip, unique, array, full, inf, isfinite, argmin, sqrt as np_sqrt,
+                   concatenate, vstack)
+import numpy.linalg as LinearAlgebra
+
+from . import calc
+
+MAXCOEFFS = 11 #order spin boxes go up to 10, i.e. 11 coefficients
+RMAX = 1.0 #upper end of the R range that should be free of background
+
+class KnotSystem:
+    """Spline system for one scan that is cheap to rebuild for new knots.
+
+    The weighted power moments of every point are stored as prefix sums,
+    so the normal equations of any segment are a difference of two rows
+    no matter how many points it holds. Polynomials are expressed in a
+    centred and scaled energy so high orders stay well conditioned; the
+    fitted spline is the same function as the one from calcSpline.
+    """
+    def __init__(self, xdata, ydata, E0, kmin, kmax, rmax=RMAX):
+        self.x = asarray(xdata, float)
+        self.y = asarray(ydata, float)
+        self.E0 = E0
+        self.kmin = kmin
+        self.kmax = kmax
+        self.rmax = rmax
+
+        self.center = 0.5 * (self.x[0] + self.x[-1])
+        self.scale = 0.5 * (self.x[-1] - self.x[0]) or 1.0
+        self.u = (self.x - self.center) / self.scale
+
+        weights = calc.kWeights(self.x, E0)
+        upow = power.outer(self.u, arange(2 * MAXCOEFFS - 1))
+        self.gram = vstack((zeros(upow.shape[1]), cumsum(upow * weights[:, None], axis=0)))
+        wy = (weights * self.y)[:, None]
+        self.moment = vstack((zeros(MAXCOEFFS), cumsum(upow[:, :MAXCOEFFS] * wy, axis=0)))
+        self.weights = weights
+        self.count = concatenate(([0], cumsum(weights > 0)))
+
+        #only the part above E0 goes into the FFT
+        self.k0index = int(searchsorted(self.x, E0, side='left'))
+        self.kdata = calc.KEV * np_sqrt(self.x[self.k0index:] - E0)
+        self.upow = upow[:, :MAXCOEFFS]
+        self.kpow = self.upow[self.k0index:]
+        self.k3y = self.y[self.k0index:] * power(self.kdata, 3)
+        self.uE0 = (E0 - self.center) / self.scale
+        self.nr = int(rmax / calc.DR) + 1
+
+    def assemble(self, indices, coeffs):
+        """Constrained least-squares systems for a stack of knot configurations.
+
+        indices is an (M x knots) array of grid indices, coeffs the number
+        of polynomial coefficients per segment. Returns (matrix, vec,
+        offsets) with one system per configuration and the position of each
+        segment's coefficients in the solution.
+        """
+        indices = asarray(indices, int)
+        nconf = indices.shape[0]
+        nseg = len(coeffs)
+        offsets = concatenate(([0], cumsum(array(coeffs) + 2)))
+        size = offsets[-1] - 2
+
+        matrix = zeros((nconf, size, size))
+        vec = zeros((nconf, size))
+        for s in range(nseg):
+            order = coeffs[s]
+            off = offsets[s]
+            lindex = indices[:, s]
+            hindex = indices[:, s + 1]
+            rows = arange(order)
+
+            #normal equations from the prefix sums
+            sums = self.gram[hindex + 1] - self.gram[lindex]
+            matrix[:, off:off + order, off:off + order] = sums[:, add.outer(rows, rows)]
+            vec[:, off:off + order] = (self.moment[hindex + 1] - self.moment[lindex])[:, :order]
+
+            if s < nseg - 1:
+                #continuity of value and slope at the high knot
+                uh = self.u[hindex]
+                value = power.outer(uh, rows)
+                slope = rows * power.outer(uh, clip(rows - 1, 0, None))
+                nxt = offsets[s + 1]
+                nrows = arange(coeffs[s + 1])
+                value2 = power.outer(uh, nrows)
+                slope2 = nrows * power.outer(uh, clip(nrows - 1, 0, None))
+                for c, (a, b) in enumerate(((value, value2), (slope, slope2))):
+                    pos = off + order + c
+                    matrix[:, pos, off:off + order] = -a
+                    matrix[:, pos, nxt:nxt + coeffs[s + 1]] = b
+                    matrix[:, off:off + order, pos] = -a
+                    matrix[:, nxt:nxt + coeffs[s + 1], pos] = b
+
+        return matrix, vec, offsets
+
+    def evaluate(self, indices, coeffs):
+        """Objective for a stack of knot configurations sharing coeffs.
+
+        Takes the same arguments as assemble() and returns M values of the
+        summed |FT|^2 below rmax; unsolvable configurations give inf.
+        """
+        indices = asarray(indices, int)
+        nconf = indices.shape[0]
+        nseg = len(coeffs)
+        matrix, vec, offsets = self.assemble(indices, coeffs)
+        soln = self.solve(matrix, vec)
+
+        #spline above E0; each point belongs to the segment whose range holds it
+        #(first segment also covers below, last one above the knots)
+        kpos = arange(self.k0index, len(self.x))
+        spline = zeros((nconf, len(kpos)))
+        for s in range(nseg):
+            order = coeffs[s]
+            values = soln[:, offsets[s]:offsets[s] + order].dot(self.kpow[:, :order].T)
+            inseg = full((nconf, len(kpos)), True)
+            if s > 0:
+                inseg &= kpos[None, :] >= indices[:, s][:, None]
+            if s < nseg - 1:
+                inseg &= kpos[None, :] < indices[:, s + 1][:, None]
+            spline[inseg] = values[inseg]
+
+        sp_E0 = soln[:, :coeffs[0]].dot(power(self.uE0, arange(coeffs[0])))
+        good = isfinite(sp_E0) & (abs(sp_E0) > 1e-12)
+        sp_E0[~good] = 1.0
+
+        xafs = (self.k3y[None, :] - spline * power(self.kdata, 3)) / sp_E0[:, None]
+        fftdata, DR = calc.calcFFTBatch(self.kdata, xafs, self.kmin, self.kmax)
+
+        result = (fftdata[:, :self.nr] ** 2).sum(axis=1)
+        result[~good | ~isfinite(result)] = inf
+        return result
+
+    def solve(self, matrix, vec):
+        try:
+            return LinearAlgebra.solve(matrix, vec[:, :, None])[:, :, 0]
+        except LinearAlgebra.LinAlgError:
+            #one singular configuration shouldn't sink the rest
+            soln = full(vec.shape, inf)
+            for i in range(len(matrix)):
+                try:
+                    soln[i] = LinearAlgebra.solve(matrix[i], vec[i])
+                except LinearAlgebra.LinAlgError:
+                    pass
+            return soln
+
+def maxFreeParameters(kmin, kmax, rmax=RMAX):
+    #number of independent points available to the background (AUTOBK)
+    return int(2.0 * (kmax - kmin) * rmax / pi) + 1
+
+def optimizeKnots(xdata, ydata, E0, segs, kmin, kmax, rmax=RMAX, limits=None,
+                  locked=None, orders=False, minCoeffs=2, maxCoeffs=MAXCOEFFS,
+                  spread=4, sweeps=6):
+    """Move the spline knots to minimize the |FT| of chi(k) below rmax.
+
+    ydata is the background-subtracted data given to calcSpline and segs
+    the starting segments in the same format. limits is an optional list
+    of absolute (low, high) energies per knot like the ones DataPlot gets
+    from its axis and bounds exceptions; knots always stay in order with
+    enough points in every segment to fit it. The first and last knots are
+    locked unless locked says otherwise. With orders=True the number of
+    coefficients per segment is also chosen, within the number of free
+    parameters the k and R ranges can support.
+
+    Returns (segs, objective) with segs in the calcSpline format.
+    """
+    system = KnotSystem(xdata, ydata, E0, kmin, kmax, rmax)
+    x = system.x
+
+    positions = [seg[1] for seg in segs] + [segs[-1][2]]
+    indices = [int(i) for i in calc.getClosestIndices(positions, x)]
+    coeffs = [seg[0] for seg in segs]
+    nknots = len(indices)
+
+    if locked is None:
+        locked = [i == 0 or i == nknots - 1 for i in range(nknots)]
+    if limits is None:
+        limits = [(-inf, inf)] * nknots
+    limits = [(int(searchsorted(x, low, side='left')), int(searchsorted(x, high, side='right')) - 1)
+              for low, high in limits]
+
+    def allowed(j, indices, coeffs):
+        #neighbours bound each knot, like DataPlot.fixKnotsBounds
+        lo = limits[j][0]
+        hi = limits[j][1]
+        if j > 0:
+            lo = max(lo, indices[j - 1] + minPoints(j - 1, indices, coeffs))
+        if j < nknots - 1:
+            hi = min(hi, indices[j + 1] - minPoints(j, indices, coeffs))
+        return lo, hi
+
+    def minPoints(s, indices, coeffs):
+        #points a segment needs above E0 to be fitted
+        return coeffs[s] + max(0, system.k0index - indices[s])
+
+    def sweep(indices, coeffs, best, step):
+        moved = False
+        for j in range(nknots):
+            if locked[j]:
+                continue
+            lo, hi = allowed(j, indices, coeffs)
+            if lo > hi:
+                continue
+            cands = unique(clip(indices[j] + step * arange(-spread, spread + 1), lo, hi))
+            trial = array([indices] * len(cands))
+            trial[:, j] = cands
+            values = system.evaluate(trial, coeffs)
+            i = argmin(values)
+            if values[i] < best * (1 - 1e-9):
+                best = values[i]
+                indices = trial[i].tolist()
+                moved = True
+        return indices, best, moved
+
+    def descend(indices, coeffs):
+        best = system.evaluate([indices], coeffs)[0]
+        step = max(1, (indices[-1] - indices[0]) // (4 * spread * max(1, nknots - 1)))
+        while True:
+            for i in range(sweeps):
+                indices, best, moved = sweep(indices, coeffs, best, step)
+                if not moved:
+                    break
+            if step == 1:
+                return indices, best
+            step = max(1, step // 2)
+
+    indices, best = descend(indices, coeffs)
+
+    if orders:
+        budget = maxFreeParameters(kmin, kmax, rmax)
+        for s in range(len(coeffs)):
+            for n in range(minCoeffs, maxCoeffs + 1):
+                trial = list(coeffs)
+                trial[s] = n
+                if n == coeffs[s] or sum(trial) - 2 * (len(trial) - 1) > budget:
+                    continue
+                if indices[s + 1] - indices[s] < minPoints(s, indices, trial):
+                    continue
+                value = system.evaluate([indices], trial)[0]
+                if value < best:
+                    best = value
+                    coeffs = trial
+        indices, best = descend(indices, coeffs)
+
+    segs = [(coeffs[i], float(x[indices[i]]), float(x[indices[i + 1]])) for i in range(len(coeffs))]
+    return segs, float(best)
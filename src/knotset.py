@@ -0,0 +1,121 @@
+# knotset.py -- the knots of a plot as arrays: a position, a (low, high)
+#               boundary and a lock flag per knot, plus the boundary
+#               exceptions that override what the neighbours allow. DataPlot
+#               draws a KnotSet with one Knot marker per entry, but the model
+#               doesn't need it, so batch runs can place knots and build
+#               spline segments without any window.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+
+from numpy import empty, zeros, append, asarray
+
+from . import calc
+
+GAP = 0.01 #closest two neighbouring knots get
+ADD_GAP = 1.0 #room kept to the previous knot by add() until fixBounds()
+
+class KnotSet:
+    """Positions, boundaries and locks of an ordered set of knots.
+
+    positions is a float array, bounds an (n, 2) array of (low, high)
+    and locked a bool array. excepts maps (knot, side) to a boundary that
+    overrides the one the neighbours give, side 0 being the low end and
+    1 the high end; a later exception for the same end replaces the
+    earlier one. Exceptions outlive clear(), so a set that is rebuilt
+    keeps them.
+    """
+    __slots__ = ('positions', 'bounds', 'locked', 'excepts')
+
+    def __init__(self):
+        self.positions = empty(0)
+        self.bounds = empty((0, 2))
+        self.locked = zeros(0, bool)
+        self.excepts = {}
+
+    def __len__(self):
+        return len(self.positions)
+
+    def add(self, pos, lock=False, limits=(float('-inf'), float('inf'))):
+        """Append a knot at pos, clamped to limits; False if pos is below the last knot."""
+        low, high = limits
+        if len(self.positions) == 0:
+            bounds = (low, high)
+        else:
+            last = self.positions[-1]
+            if pos < last:
+                return False
+            pos = min(max(pos, low), high)
+            bounds = (last + ADD_GAP, high)
+            self.bounds[-1, 1] = pos - ADD_GAP
+
+        self.positions = append(self.positions, pos)
+        self.bounds = append(self.bounds, [bounds], axis=0)
+        self.locked = append(self.locked, bool(lock))
+        if len(self.positions) > 1:
+            self.fixBounds(low, high)
+        return True
+
+    def pop(self):
+        self.positions = self.positions[:-1].copy()
+        self.bounds = self.bounds[:-1].copy()
+        self.locked = self.locked[:-1].copy()
+
+    def clear(self):
+        self.positions = empty(0)
+        self.bounds = empty((0, 2))
+        self.locked = zeros(0, bool)
+
+    def fixBounds(self, low, high):
+        """Let every knot move between its neighbours, the end knots out to
+        low and high, then apply the exceptions."""
+        n = len(self.positions)
+        if n < 2:
+            return
+        self.bounds[0, 0] = low
+        self.bounds[1:, 0] = self.positions[:-1] + GAP
+        self.bounds[:-1, 1] = self.positions[1:] - GAP
+        self.bounds[-1, 1] = high
+        self.applyExceptions(self.bounds)
+
+    def applyExceptions(self, bounds):
+        keys = [key for key in self.excepts if key[0] < len(bounds)]
+        if keys:
+            rows, sides = zip(*keys)
+            bounds[list(rows), list(sides)] = [self.excepts[key] for key in keys]
+
+    def addBoundsException(self, index, side, value):
+        self.bounds[index, side] = value
+        self.excepts[(index, side)] = value
+
+    def getLimits(self, low, high):
+        """Absolute (min, max) of every knot, ignoring its neighbours.
+
+        low and high for the end knots, overridden by the exceptions.
+        """
+        n = len(self.positions)
+        limits = empty((n, 2))
+        limits[:, 0] = float('-inf')
+        limits[:, 1] = float('inf')
+        if n:
+            limits[0, 0] = low
+            limits[-1, 1] = high
+        self.applyExceptions(limits)
+        return [tuple(lim) for lim in limits.tolist()]
+
+    def getIndices(self, grid):
+        #index of the grid point closest to every knot
+        return calc.getClosestIndices(self.positions, grid)
+
+    def getSegs(self, orders, grid):
+        """Spline segments between neighbouring knots, snapped to grid.
+
+        orders has one number of coefficients per segment; the result is
+        a list of (order, xlow, xhigh) as calcSpline() takes them.
+        """
+        if len(self.positions) < 2 or len(grid) == 0:
+            return []
+        x = asarray(grid)[self.getIndices(grid)]
+        return list(zip(orders, x[:-1], x[1:]))
@@ -18,9 +18,10 @@ from .qt_compat import (QWidget, QMainWindow, QDialog, QApplication, QPrinter,
     Qt, QToolTip, QStatusBar, QHBoxLayout, QVBoxLayout, QLabel, QPen,
     QGridLayout)
 from PyQt5.QtCore import pyqtSignal
-from .qwt_compat import QwtPlot, QwtMarker, QwtCurve, QwtPlotItem, QwtPlotGrid
+from .qwt_compat import QwtPlot, QwtMarker, QwtCurve, QwtPlotItem, QwtPlotGrid, QwtPlotMarker
 
 from .dataplot import DataPlot
+from .overlay import OverlayItem
 
 class KPlot(QWidget):
     # Signal emitted when window is closed
@@ -37,7 +38,8 @@ class KPlot(QWidget):
     
         self.kdata=[]
         self.xafsdata=[]
-        self.fixedknots=[]
+        self.fixedknots=[] # marker pool, the first numFixed are shown
+        self.numFixed=0
         
         #spacer-plot-spacer
         layout=QHBoxLayout()
@@ -55,6 +57,20 @@ class KPlot(QWidget):
         self.xafsCurve.setTitle("exafs")
         self.xafsCurve.setPen(QPen(QColor(Qt.black), 2))
         self.xafsCurve.attach(self.plot)
+        self.xafsEnvelope = self.plot.addEnvelope(self.xafsCurve)
+        
+        # other scans drawn behind this one, see setOverlay()
+        self.overlay = OverlayItem()
+        self.overlay.attach(self.plot)
+        
+        # uncertainty bands, only filled in on request
+        self.bandCurves = []
+        for title in ("lower band", "upper band"):
+            curve = QwtCurve()
+            curve.setTitle(title)
+            curve.setPen(QPen(QColor(Qt.gray), 1, Qt.DashLine))
+            curve.attach(self.plot)
+            self.bandCurves.append(curve)
         
         layout.addWidget(self.plot)
         
@@ -82,51 +98,61 @@ class KPlot(QWidget):
     def setXAFSData(self,kdata,xafsdata):
         self.plot.setAxisScale(QwtPlot.xBottom,0,kdata[-1])
         
-        try:
-            self.xafsCurve.setData(kdata, xafsdata)
-        except Exception:
-            try:
-                # Fallback to plot helper
-                self.plot.setCurveData(self.xafsCurve, kdata, xafsdata)
-            except Exception:
-                pass
+        self.xafsEnvelope.setData(kdata, xafsdata)
                 
         self.kdata=kdata
         self.xafsdata=xafsdata
         DataPlot.setData(self.plot,kdata)
         
+        #bands belong to the parameters they were calculated with
+        self.clearBands()
+        
+        self.plot.replot()
+        
+    def setBands(self,kdata,lower,upper):
+        self.bandCurves[0].setData(kdata, lower)
+        self.bandCurves[1].setData(kdata, upper)
+        self.plot.replot()
+        
+    def clearBands(self):
+        for curve in self.bandCurves:
+            curve.setData([], [])
+        
+    def setOverlay(self, curves):
+        #curves are (key, xdata, ydata, color), see OverlayItem.setCurves()
+        self.overlay.setCurves(curves)
         self.plot.replot()
         
     def clearFixedKnots(self):
-        # Detach any previously attached fixed markers
-        for marker in self.fixedknots:
-            try:
-                marker.detach()
-            except Exception:
-                try:
-                    # Legacy fallback
-                    self.plot.removeMarker(marker)
-                except Exception:
-                    pass
-        self.fixedknots = []
+        # pooled markers are only hidden, setFixedKnots() reuses them
+        self.setFixedKnots([])
         
     def addFixedKnot(self, pos):
-        # Create a vertical green marker at the given k-space position
-        # Use the same QwtPlotMarker pattern as Knot class
-        try:
-            from .qwt_compat import QwtPlotMarker
+        # a vertical green marker at the given k-space position
+        self.setFixedKnots(self.getFixedKnots() + [pos])
+        
+    def getFixedKnots(self):
+        return [marker.xValue() for marker in self.fixedknots[:self.numFixed]]
+        
+    def setFixedKnots(self, positions):
+        """Show the fixed knots at positions, moving the pooled markers."""
+        if positions == self.getFixedKnots():
+            return
+        while len(self.fixedknots) < len(positions):
+            # Use the same QwtPlotMarker pattern as Knot class
             marker = QwtPlotMarker()
             marker.setLineStyle(QwtPlotMarker.VLine)
             marker.setLinePen(QPen(QColor(Qt.darkGreen), 2))
-            marker.setXValue(pos)
             marker.setYValue(0.0)
             marker.attach(self.plot)
             self.fixedknots.append(marker)
-            self.plot.replot()
-        except Exception as e:
-            # If marker creation fails, silently continue
-            print(f"Could not add fixed knot at {pos}: {e}")
-            pass
+        for marker, pos in zip(self.fixedknots, positions):
+            marker.setXValue(pos)
+            marker.setVisible(True)
+        for marker in self.fixedknots[len(positions):]:
+            marker.setVisible(False)
+        self.numFixed = len(positions)
+        self.plot.replot()
     
     def closeEvent(self,e):
         self.hide()
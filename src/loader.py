@@ -0,0 +1,324 @@
+# loader.py -- reading and parsing of the files PySpline opens: its own .d
+#              files, SSRL EXAFS Data Collector files and plain columns of
+#              energy and absorption. Parsing reports its progress through
+#              a callback, which can stop it by raising LoadCancelled, so it
+#              can run on a worker thread (see runner.FileLoader) or in a
+#              worker process.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+
+import io
+from os.path import getsize, basename
+
+from numpy import array, transpose, gradient, diff
+
+from . import calc
+
+CHUNK = 1024 * 1024 #bytes read at a time; network mounts are slow
+READ_SHARE = 0.5 #part of the progress taken by reading, the rest is parsing
+PROGRESS_LINES = 5000 #lines parsed between progress reports
+HEAD_LINES = 25 #lines looked at to tell the formats apart
+
+FORMATS = ('spline', 'ssrl', 'columns')
+
+class LoadError(ValueError):
+    #the file could be read but not understood
+    pass
+
+class LoadCancelled(Exception):
+    pass
+
+class ScanFile:
+    """Everything read from one file.
+
+    xdata, ydata and i0data are read-only columns (calc.column). E0 is
+    the file's edge energy, or for SSRL files an estimate from the
+    steepest rise of I1/I0; it is None for plain columns. background is
+    (lowx, highx, order) and markers, orders and kwindow the spline knots,
+    segment orders and k window, all None unless the file is a .d file.
+    warnings are problems that didn't stop the file from loading.
+    E0, background, markers, orders and kwindow together are the settings
+    one scan can pass on to another.
+    """
+    __slots__ = ('path', 'format', 'xdata', 'ydata', 'i0data', 'E0', 'title',
+                 'comments', 'background', 'markers', 'orders', 'kwindow',
+                 'warnings')
+
+    def __init__(self, path, format):
+        self.path = path
+        self.format = format
+        self.xdata = self.ydata = self.i0data = None
+        self.E0 = None
+        self.title = ""
+        self.comments = []
+        self.background = None
+        self.markers = None
+        self.orders = None
+        self.kwindow = None
+        self.warnings = []
+
+    def getSettings(self):
+        """(E0, background, markers, orders, kwindow), comparable and hashable."""
+        return (self.E0, self.background, tuple(self.markers), tuple(self.orders), self.kwindow)
+
+    def setSettings(self, settings):
+        #process the data with the parameters of another scan
+        self.E0, self.background, markers, orders, self.kwindow = settings
+        self.markers = list(markers)
+        self.orders = list(orders)
+
+def _report(progress, fraction):
+    if progress is not None:
+        progress(fraction)
+
+def readLines(path, progress=None):
+    """Lines of the file at path, newlines translated.
+
+    Reading counts for the first READ_SHARE of the progress.
+    """
+    size = max(getsize(path), 1)
+    chunks = []
+    done = 0
+    with open(path, 'rb') as file:
+        while True:
+            chunk = file.read(CHUNK)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            done += len(chunk)
+            _report(progress, READ_SHARE * min(done / float(size), 1.0))
+    text = b''.join(chunks).decode('utf-8', errors='replace')
+    return io.StringIO(text, newline=None).readlines()
+
+def _parsed(lines, start, progress):
+    #(index, line) from start on, reporting the parsing progress
+    total = max(len(lines) - start, 1)
+    for i in range(start, len(lines)):
+        if (i - start) % PROGRESS_LINES == 0:
+            _report(progress, READ_SHARE + (1.0 - READ_SHARE) * (i - start) / total)
+        yield i, lines[i]
+    _report(progress, 1.0)
+
+def detectFormat(lines):
+    """'ssrl', 'spline' (a .d file) or 'columns', from the first lines."""
+    head = ''.join(lines[:HEAD_LINES])
+    if ('SSRL' in head and 'EXAFS Data Collector' in head) or ('Data:' in head and 'Requested Energy' in head):
+        return 'ssrl'
+    if 'E0' in head and 'BACKGROUND' in head and 'SPLINE' in head:
+        return 'spline'
+    return 'columns'
+
+def loadFile(path, format=None, progress=None):
+    """Read and parse the file at path into a ScanFile.
+
+    format is one of FORMATS, or None to tell from the file. Raises
+    LoadError if the file can't be understood and whatever progress
+    raises, LoadCancelled to stop.
+    """
+    lines = readLines(path, progress)
+    if format is None:
+        format = detectFormat(lines)
+    scan = ScanFile(path, format)
+    if format == 'ssrl':
+        parseSSRL(scan, lines, progress)
+    elif format == 'spline':
+        parseSpline(scan, lines, progress)
+    else:
+        parseColumns(scan, lines, progress)
+    return scan
+
+def _numbers(line):
+    #the values of a comma or whitespace separated line, None if it isn't numeric
+    if ',' in line:
+        tokens = [t.strip() for t in line.strip().split(',') if t.strip() != '']
+    else:
+        tokens = line.split()
+    try:
+        return [float(t) for t in tokens]
+    except ValueError:
+        return None
+
+def parseSSRL(scan, lines, progress=None):
+    """SSRL EXAFS Data Collector file (.001).
+
+    Energy is 'Achieved Energy', I0 'I0' and the raw data the
+    transmission 'I1'.
+    """
+    # Find the start of numeric data after the 'Data:' section
+    start = None
+    inNames = False
+    for idx, line in enumerate(lines):
+        if line.strip().startswith('Data:'):
+            inNames = True
+            continue
+        if inNames:
+            # Column names block ends when we encounter a blank line followed by numeric row
+            if line.strip() == '':
+                start = idx + 1
+                break
+    if start is None:
+        # Fallback: find first line that looks numeric with many columns
+        for idx, line in enumerate(lines):
+            parts = line.strip().split()
+            if len(parts) >= 10:
+                try:
+                    [float(p) for p in parts[:10]]
+                    start = idx
+                    break
+                except ValueError:
+                    continue
+    if start is None:
+        raise LoadError("Couldn't locate numeric data block in SSRL file.")
+
+    energies = []
+    i0s = []
+    its = []
+    for idx, line in _parsed(lines, start, progress):
+        parts = line.strip().split()
+        if len(parts) < 8:
+            continue
+        try:
+            vals = [float(p) for p in parts]
+        except ValueError:
+            continue
+        # Indices: 0 RTC, 1 Sum_RTC, 2 Requested, 3 Achieved, 4 I0, 5 I1, 6 I2, 7 I3
+        energies.append(vals[3])
+        i0s.append(vals[4])
+        its.append(vals[5])
+
+    if len(energies) < 10:
+        raise LoadError("Not enough numeric rows to load SSRL file.")
+
+    scan.xdata = calc.column(energies)
+    scan.i0data = calc.column(i0s)
+    scan.ydata = calc.column(its)
+    scan.E0 = estimateE0(scan.xdata, scan.ydata, scan.i0data)
+    scan.title = basename(scan.path).split('.')[0]
+    scan.comments = ["Imported from SSRL .001"]
+
+def estimateE0(xdata, ydata, i0data):
+    #energy of the steepest rise of the transmission ratio
+    t = array(ydata, float) / (array(i0data, float) + 1e-12)
+    x = array(xdata, float)
+    try:
+        dt = abs(gradient(t, x))
+    except Exception:
+        # Fallback: simple finite difference on uniform assumption
+        dt = abs(diff(t))
+        x = x[:-1]
+    return float(x[int(dt.argmax())])
+
+def _findLine(lines, i, keyword):
+    #index of the first line from i on that starts with keyword
+    while i < len(lines) and not lines[i].lstrip().upper().startswith(keyword):
+        i += 1
+    if i == len(lines):
+        raise LoadError("No %s line found in file." % keyword)
+    return i
+
+def parseSpline(scan, lines, progress=None):
+    """PySpline .d file: header lines, then EV K IO RAW ... columns."""
+    i = 0
+    #check to see if it has a title
+    if lines and lines[0][:5] == 'TITLE':
+        scan.title = lines[0][6:-1]
+        i = 1
+
+    #check to see if line is a comment
+    while i < len(lines) and lines[i][:1] == '#':
+        scan.comments.append(lines[i][2:-1])
+        i += 1
+
+    # read E0: find a line starting with E0 and parse the numeric value
+    i = _findLine(lines, i, 'E0')
+    parts = lines[i].split()
+    for tok in parts[1:]:
+        try:
+            scan.E0 = float(tok.replace('eV', '').replace('EV', ''))
+            break
+        except ValueError:
+            continue
+    if scan.E0 is None:
+        raise LoadError("Couldn't parse E0 from line: " + ' '.join(parts))
+
+    # read background bounds and order: BACKGROUND lowx (order) highx
+    i = _findLine(lines, i + 1, 'BACKGROUND')
+    parts = lines[i].split()
+    try:
+        scan.background = (float(parts[1]), float(parts[3]), int(parts[2].strip('()')))
+    except (ValueError, IndexError):
+        raise LoadError("Couldn't parse BACKGROUND line: " + ' '.join(parts))
+
+    # read spline info into markers and orders lists: SPLINE m0 (o0) m1 (o1) ... mN
+    i = _findLine(lines, i + 1, 'SPLINE')
+    scan.markers = []
+    scan.orders = []
+    for tok in lines[i].split()[1:]:
+        try:
+            if tok.startswith('(') and tok.endswith(')'):
+                scan.orders.append(int(tok.strip('()')))
+            else:
+                scan.markers.append(float(tok))
+        except ValueError:
+            pass
+    if len(scan.markers) != len(scan.orders) + 1:
+        scan.warnings.append("Unexpected SPLINE format; results may be incorrect.")
+
+    # check to see if k-window is specified; if not, it's the whole k range
+    i += 1
+    if i < len(lines):
+        parts = lines[i].split()
+        if parts and parts[0].upper() == 'KWIN':
+            i += 1
+            try:
+                scan.kwindow = (float(parts[1]), float(parts[2]))
+            except (ValueError, IndexError):
+                pass
+
+    # the rest is data, robust to headers and comma/space
+    rows = []
+    for idx, line in _parsed(lines, i, progress):
+        if not line.strip():
+            continue
+        row = _numbers(line)
+        if row is not None:
+            rows.append(row)
+    if not rows:
+        raise LoadError("No valid data found in file.")
+
+    # transpose to get columns in useful format
+    data = transpose(array(rows))
+    scan.xdata = calc.column(data[0])
+    scan.i0data = calc.column(data[2])
+    scan.ydata = calc.column(data[3])
+    if scan.kwindow is None:
+        scan.kwindow = (0.0, calc.toKSpace(scan.xdata[-1], scan.E0))
+
+def parseColumns(scan, lines, progress=None):
+    """Plain data: ev k i0 raw (4 columns) or ev absorption (2 or more)."""
+    xdata = []
+    ydata = []
+    i0data = []
+    for idx, line in _parsed(lines, 0, progress):
+        row = _numbers(line)
+        # Skip header/comment lines
+        if not row or len(row) < 2:
+            continue
+        if len(row) == 4:
+            xdata.append(row[0])
+            i0data.append(row[2])
+            ydata.append(row[3])
+        else:
+            xdata.append(row[0])
+            ydata.append(row[1])
+            i0data.append(1.0)
+
+    if not xdata:
+        raise LoadError("No valid data found in file.")
+
+    scan.xdata = calc.column(xdata)
+    scan.ydata = calc.column(ydata)
+    scan.i0data = calc.column(i0data)
@@ -0,0 +1,185 @@
+# montecarlo.py -- batched Monte-Carlo/bootstrap estimate of the uncertainty
+#                  of chi(k) and |FT| for one scan. A stack of perturbed copies
+#                  of the scan is pushed through the batch versions of the calc
+#                  functions, so every realization sharing a set of parameters
+#                  shares one factorization of the spline system.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+
+from numpy import (asarray, arange, diff, median, absolute, sqrt as np_sqrt,
+                   clip, sort, percentile, searchsorted, vstack)
+from numpy.linalg import LinAlgError
+from numpy.random import default_rng
+
+from . import calc
+
+CHUNK = 256 #realizations pushed through the pipeline at a time
+
+def estimateNoise(ydata):
+    #robust point-to-point noise from second differences; for white noise
+    #the second difference has a variance of 6*sigma^2
+    d2 = diff(asarray(ydata, float), 2)
+    return 1.4826 * median(absolute(d2 - median(d2))) / np_sqrt(6.0)
+
+def perturb(ydata, n, sigma=None, method='noise', rng=None):
+    """Return an (n x points) stack of noisy copies of ydata.
+
+    method='noise' adds gaussian noise of width sigma (estimated from the
+    data when not given); method='bootstrap' resamples the scaled second
+    differences of the scan, so non-gaussian noise is preserved.
+    """
+    y = asarray(ydata, float)
+    if rng is None:
+        rng = default_rng()
+
+    if method == 'bootstrap':
+        resid = diff(y, 2) / np_sqrt(6.0)
+        resid = resid - resid.mean()
+        noise = rng.choice(resid, size=(n, len(y)))
+    else:
+        if sigma is None:
+            sigma = estimateNoise(y)
+        noise = rng.normal(0.0, sigma, size=(n, len(y)))
+
+    return y + noise
+
+def separate(index, size, gaps):
+    """Sorted grid indices within 0..size-1 with index[i + 1] at least
+    gaps[i] past index[i].
+
+    An index that lands too close to its predecessor is pushed up to the
+    gap, and any pushed beyond the end are pushed back down from there, so
+    knots that collide stay next to each other instead of merging.
+    """
+    index = sort(asarray(index, int))
+    for i in range(1, len(index)):
+        index[i] = max(index[i], index[i - 1] + gaps[i - 1])
+    index[-1] = min(index[-1], size - 1)
+    for i in range(len(index) - 2, -1, -1):
+        index[i] = min(index[i], index[i + 1] - gaps[i])
+    return index
+
+def jitterSegs(xdata, segs, jitter, rng):
+    """segs with each knot moved by up to +-jitter data points.
+
+    The knots stay in order and every segment keeps at least as many
+    points past its low knot as its order, so its fit stays determined.
+    None if the grid is too short for that.
+    """
+    x = asarray(xdata, float)
+    knots = [seg[1] for seg in segs] + [segs[-1][2]]
+    gaps = [seg[0] for seg in segs]
+    if sum(gaps) >= len(x):
+        return None
+    index = calc.getClosestIndices(knots, x) + rng.integers(-jitter, jitter + 1, len(knots))
+    index = separate(clip(index, 0, len(x) - 1), len(x), gaps)
+
+    return [(segs[i][0], x[index[i]], x[index[i + 1]]) for i in range(len(segs))]
+
+def processStack(xdata, ystack, E0, lindex, hindex, order, segs, kmin, kmax):
+    """Run a stack of spectra through background, spline, XAFS and FFT.
+
+    Returns (kdata, xafsstack, fftstack) for the part of the grid above E0.
+    """
+    x = asarray(xdata, float)
+
+    background = calc.calcBackgroundBatch(x, ystack, lindex, hindex, order, E0)
+    normstack = ystack - background
+
+    splinestack, sp_E0 = calc.calcSplineBatch(x, normstack, E0, segs)
+    normstack /= sp_E0[:, None]
+    splinestack /= sp_E0[:, None]
+
+    k0index = searchsorted(x, E0, side='left')
+    kdata = calc.KEV * np_sqrt(x[k0index:] - E0)
+
+    xafsstack = calc.calcXAFSBatch(normstack[:, k0index:], splinestack[:, k0index:], kdata)
+    fftstack, DR = calc.calcFFTBatch(kdata, xafsstack, kmin, kmax)
+
+    return kdata, xafsstack, fftstack
+
+def processGroup(xdata, ystack, E0, lindex, hindex, order, segs, kmin, kmax):
+    #processStack in chunks of at most CHUNK spectra, stacked back together
+    kdata = None
+    xafs = []
+    fft = []
+    for start in range(0, len(ystack), CHUNK):
+        kdata, chunkxafs, chunkfft = processStack(xdata, ystack[start:start + CHUNK], E0,
+                                                  lindex, hindex, order, segs, kmin, kmax)
+        xafs.append(chunkxafs)
+        fft.append(chunkfft)
+    return kdata, vstack(xafs), vstack(fft)
+
+def interpStack(knew, kdata, stack):
+    #linear interpolation of every row onto knew; the weights are shared
+    index = clip(searchsorted(kdata, knew) - 1, 0, len(kdata) - 2)
+    frac = clip((knew - kdata[index]) / (kdata[index + 1] - kdata[index]), 0.0, 1.0)
+    return stack[:, index] * (1.0 - frac) + stack[:, index + 1] * frac
+
+def calcBands(xdata, ydata, E0, lindex, hindex, order, segs, kmin, kmax,
+              n=1000, sigma=None, method='noise', knotJitter=0, e0Jitter=0.0,
+              groups=1, percentiles=(2.5, 50.0, 97.5), seed=None):
+    """Percentile bands of chi(k) and |FT| from n perturbed realizations.
+
+    lindex, hindex and order are the background parameters as passed to
+    calcBackground, segs and E0 as passed to calcSpline and kmin, kmax is
+    the FFT window. Noise is always applied to every realization. With
+    knotJitter (in data points) or e0Jitter (in eV) the realizations are
+    also split into groups, each with its own randomly moved knots and E0;
+    the first group always uses the nominal parameters.
+
+    Returns (kdata, kbands, rdata, rbands, fallbacks) where the bands have
+    one row per requested percentile and fallbacks is the number of groups
+    that kept the nominal knots because the moved ones could not be fitted.
+    """
+    x = asarray(xdata, float)
+    rng = default_rng(seed)
+    ystack = perturb(ydata, n, sigma, method, rng)
+
+    if knotJitter <= 0 and e0Jitter <= 0:
+        groups = 1
+    groups = max(1, min(groups, n))
+    bounds = (arange(groups + 1) * n) // groups
+
+    kdata = None
+    xafs = []
+    fft = []
+    fallbacks = 0
+    for g in range(groups):
+        gsegs = segs
+        gE0 = E0
+        if g > 0:
+            if knotJitter > 0:
+                gsegs = jitterSegs(x, segs, knotJitter, rng)
+            if e0Jitter > 0:
+                gE0 = E0 + rng.normal(0.0, e0Jitter)
+
+        rows = ystack[bounds[g]:bounds[g + 1]]
+        if gsegs is not None:
+            try:
+                gk, gxafs, gfft = processGroup(x, rows, gE0, lindex, hindex, order, gsegs, kmin, kmax)
+            except LinAlgError:
+                gsegs = None
+        if gsegs is None:
+            #no room to move the knots, or a segment left without points above E0
+            gk, gxafs, gfft = processGroup(x, rows, gE0, lindex, hindex, order, segs, kmin, kmax)
+            fallbacks += 1
+
+        #chi(k) of every group is reported on the nominal k grid
+        if kdata is None:
+            kdata = gk
+        elif len(gk) != len(kdata) or gE0 != E0:
+            gxafs = interpStack(kdata, gk, gxafs)
+
+        xafs.append(gxafs)
+        fft.append(gfft)
+
+    xafs = vstack(xafs)
+    fft = vstack(fft)
+    rdata = arange(fft.shape[1]) * calc.DR
+
+    return (kdata, percentile(xafs, percentiles, axis=0),
+            rdata, percentile(fft, percentiles, axis=0), fallbacks)
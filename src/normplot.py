@@ -18,8 +18,9 @@ from PyQt5.QtGui import QColor, QPen
 from PyQt5.QtCore import Qt, pyqtSignal, QSize
 from .qwt_compat import QwtPlot, QwtCurve
 
-from .dataplot import DataPlot
+from .dataplot import DataPlot, blockedUpdates
 from . import calc
+from . import pipeline
 
 class NormSpin(QWidget):
     # Signal definitions
@@ -97,23 +98,26 @@ class NormSpin(QWidget):
         return self.orders
 
     def setNumKnots(self, value):
-        while len(self.orders) > 0:
-            spinBox = self.orders.pop()
-            spinBox.hide()
-            spinBox.deleteLater()
-            self.num_knots_update.emit()
-
-        for i in range(value - 1):
-            spinBox = QSpinBox(self)
-            spinBox.setMaximumSize(QSize(50, 25))
-            spinBox.setMaximum(10)
-            spinBox.setValue(2)
-            self.layout.addWidget(spinBox)
-            spinBox.show()
-            self.orders.append(spinBox)
-            spinBox.valueChanged.connect(self.slotKnotUpdate)
+        # the knots are redistributed once, when everything is in place
+        with blockedUpdates(self):
+            while len(self.orders) > 0:
+                spinBox = self.orders.pop()
+                spinBox.hide()
+                spinBox.deleteLater()
+
+            for i in range(value - 1):
+                spinBox = QSpinBox(self)
+                spinBox.setMaximumSize(QSize(50, 25))
+                spinBox.setMaximum(10)
+                spinBox.setValue(2)
+                self.layout.addWidget(spinBox)
+                spinBox.show()
+                self.orders.append(spinBox)
+                spinBox.valueChanged.connect(self.slotKnotUpdate)
+
+            self.spinBox1.setValue(value)
 
-        self.spinBox1.setValue(value)
+        self.num_knots_update.emit()
 
     def setOrders(self, orders):
         for i in range(len(self.orders)):
@@ -131,9 +135,12 @@ class NormPlot(QWidget):
 
     Exposes methods:
       setNormData(xdata, ydata, E0)
+      setGrid(xdata, E0)
+      setPipeline(pipeline)
       setE0(E0)
       setNumKnots(n)
       getOrders()
+      getNudges(index, points)
 
     Signals:
       plot_changed() - emitted after plot is updated
@@ -149,7 +156,9 @@ class NormPlot(QWidget):
         self.ydata = []
         self.spline = []
         self.E0 = None
-        self._loading_from_file = False  # Flag to skip knot redistribution during file load
+        self.pipeline = pipeline.xafsPipeline()
+        self.shownVersion = 0
+        self.deferred = False  # True when someone else evaluates the pipeline
 
         # main layout
         main_layout = QVBoxLayout(self)
@@ -186,6 +195,10 @@ class NormPlot(QWidget):
         self.splineCurve.setPen(QPen(QColor(Qt.darkGreen), 2))
         self.splineCurve.attach(self.plot)
 
+        # long scans are drawn as one min/max envelope per pixel
+        self.normEnvelope = self.plot.addEnvelope(self.normCurve)
+        self.splineEnvelope = self.plot.addEnvelope(self.splineCurve)
+
         # status bar
         self.status = QStatusBar(self)
         main_layout.addWidget(self.status)
@@ -213,8 +226,14 @@ class NormPlot(QWidget):
     def setOrders(self, orders):
         self.spinBoxes.setOrders(orders)
 
+    def setPipeline(self, pipeline):
+        """Share the processing graph with the other windows."""
+        self.pipeline = pipeline
+        self.shownVersion = 0
+
     def setE0(self, E0):
         self.E0 = E0
+        self.pipeline.setParam('E0', E0)
 
     def setNumKnots(self, value):
         self.spinBoxes.setNumKnots(value)
@@ -224,24 +243,24 @@ class NormPlot(QWidget):
 
     def setNormData(self, xdata, ydata, E0):
         """Provide raw data to the plot and initialize curves."""
-        self.xdata = list(xdata)
-        self.ydata = list(ydata)
+        self.setGrid(xdata, E0)
+        self.ydata = calc.column(ydata)
+        self.pipeline.setValue('normalized', self.ydata)
+
+        # set data on norm curve (normalized later in updatePlot)
+        self.normEnvelope.setData(self.xdata, self.ydata)
+
+    def setGrid(self, xdata, E0):
+        """Set the energy grid knots snap to before any data is known."""
+        self.xdata = calc.column(xdata)
         self.E0 = E0
+        self.pipeline.setParams(xdata=self.xdata, E0=E0)
         # Ensure DataPlot has the x-axis data for snapping knots
         try:
             self.plot.setData(self.xdata)
         except Exception:
             pass
 
-        # set data on norm curve (normalized later in updatePlot)
-        try:
-            self.normCurve.setData(self.xdata, self.ydata)
-        except Exception:
-            try:
-                self.plot.setCurveData(self.normCurve, self.xdata, self.ydata)
-            except Exception:
-                pass
-
         # set axis range
         try:
             self.plot.setAxisScale(QwtPlot.xBottom, self.xdata[0], self.xdata[-1])
@@ -250,15 +269,11 @@ class NormPlot(QWidget):
 
     def updateKnots(self):
         """Recompute knot positions based on current number of knots."""
-        # Skip redistribution if we're loading from a file
-        if getattr(self, '_loading_from_file', False):
-            return
-            
         if not getattr(self.plot, 'knots', None):
             return
         
         # Guard: Don't try to update if we don't have data yet
-        if not self.xdata or len(self.xdata) == 0:
+        if len(self.xdata) == 0:
             return
 
         minpos = self.plot.knots[0].getPosition()
@@ -267,7 +282,6 @@ class NormPlot(QWidget):
         kmin = calc.toKSpace(minpos, self.E0)
         kmax = calc.toKSpace(maxpos, self.E0)
 
-        self.plot.resetPlot()
         size = self.spinBoxes.spinBox1.value()
 
         if size < 2:
@@ -275,15 +289,18 @@ class NormPlot(QWidget):
 
         div = (kmax - kmin) / float(size - 1)
 
-        self.plot.addKnot(minpos)
-        self.plot.addBoundsExceptions(0, 0, self.E0)
+        # the plot redraws once the knots are all in place
+        with blockedUpdates(self.plot):
+            self.plot.resetPlot()
+            self.plot.addKnot(minpos)
+            self.plot.addBoundsExceptions(0, 0, self.E0)
 
-        for i in range(1, size - 1):
-            temp = calc.fromKSpace(kmin + i * div, self.E0)
-            temp2 = calc.getClosest(temp, self.xdata)
-            self.plot.addKnot(temp2)
+            for i in range(1, size - 1):
+                temp = calc.fromKSpace(kmin + i * div, self.E0)
+                temp2 = calc.getClosest(temp, self.xdata)
+                self.plot.addKnot(temp2)
 
-        self.plot.addKnot(maxpos)
+            self.plot.addKnot(maxpos)
 
         try:
             self.normCurve.setPen(QPen(QColor(Qt.black), 2))
@@ -295,7 +312,9 @@ class NormPlot(QWidget):
 
     def updatePlot(self, *args):
         # Guard: Don't try to update if we don't have data yet
-        if not self.xdata or not self.ydata or len(self.xdata) == 0 or len(self.ydata) == 0:
+        if len(self.xdata) == 0:
+            return
+        if not self.deferred and len(self.ydata) == 0:
             return
             
         segs = self.getSegs()
@@ -303,57 +322,71 @@ class NormPlot(QWidget):
         if not segs:
             return
 
-        tempspline, sp_E0 = calc.calcSpline(self.xdata, self.ydata, self.E0, segs)
+        # a tuple, so the stage caches key on its value
+        self.pipeline.setParam('segs', tuple(segs))
+        if not self.deferred:
+            self.showSpline()
 
-        self.normdata = [y / sp_E0 for y in self.ydata]
-        self.splinedata = [s / sp_E0 for s in tempspline]
+        self.plot_changed.emit()
 
-        # set data on curves
-        try:
-            self.normCurve.setData(self.xdata, self.normdata)
-        except Exception:
-            try:
-                self.plot.setCurveData(self.normCurve, self.xdata, self.normdata)
-            except Exception:
-                pass
+    def showSpline(self):
+        self.normdata, self.splinedata = self.pipeline.get('spline')
 
-        try:
-            self.splineCurve.setData(self.xdata, self.splinedata)
-        except Exception:
-            try:
-                self.plot.setCurveData(self.splineCurve, self.xdata, self.splinedata)
-            except Exception:
-                pass
+        # nothing to redraw if the spline didn't change
+        if self.pipeline.getVersion('spline') == self.shownVersion:
+            return
+        self.shownVersion = self.pipeline.getVersion('spline')
+
+        # set data on curves; previews while dragging are on a coarser grid
+        grid = self.pipeline.get('grid')
+        self.normEnvelope.setData(grid, self.normdata)
+        self.splineEnvelope.setData(grid, self.splinedata)
 
         try:
             self.plot.replot()
         except Exception:
             pass
 
-        self.plot_changed.emit()
-
     def getSegs(self):
-        knots = getattr(self.plot, 'knots', [])
-        segs = []
         orders = self.spinBoxes.getOrders()
+        knotset = self.plot.knotset
 
         # Guard: need at least 2 knots and matching orders
-        if len(knots) < 2 or len(orders) < 1:
-            return segs
+        if len(knotset) < 2 or len(orders) < 1:
+            return []
 
-        for i in range(len(knots) - 1):
-            temp = knots[i].getPosition()
-            xlow = calc.getClosest(temp, self.xdata)
+        # a missing order spinbox counts as order 2
+        orders = [orders[i].value() + 1 if i < len(orders) else 3 for i in range(len(knotset) - 1)]
+        return knotset.getSegs(orders, self.xdata)
 
-            temp = knots[i + 1].getPosition()
-            xhigh = calc.getClosest(temp, self.xdata)
+    def getNudges(self, index, points):
+        """segs for knot index moved by up to points data points either way.
 
-            # Ensure we have a corresponding order spinbox
-            order_val = orders[i].value() if i < len(orders) else 2
-            seg = (order_val + 1, xlow, xhigh)
-            segs.append(seg)
-
-        return segs
+        Nearest positions come first; positions outside the knot's boundary
+        and locked knots are left out. Used to precompute the spline for the
+        positions a small drag of the knot would end up at.
+        """
+        knots = getattr(self.plot, 'knots', [])
+        segs = self.getSegs()
+        if not segs or not 0 <= index < len(knots) or knots[index].isLocked():
+            return []
+
+        low, high = knots[index].getBoundary()
+        center = calc.getClosestIndex(knots[index].getPosition(), self.xdata)
+        nudges = []
+        for step in range(1, points + 1):
+            for i in (center - step, center + step):
+                if i < 0 or i >= len(self.xdata) or not low <= self.xdata[i] <= high:
+                    continue
+                moved = list(segs)
+                if index > 0:
+                    order, xlow, xhigh = segs[index - 1]
+                    moved[index - 1] = (order, xlow, self.xdata[i])
+                if index < len(segs):
+                    order, xlow, xhigh = segs[index]
+                    moved[index] = (order, self.xdata[i], xhigh)
+                nudges.append(tuple(moved))
+        return nudges
 
     def closeEvent(self, e):
         e.accept()
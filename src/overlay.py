@@ -0,0 +1,131 @@
+# overlay.py -- the OverlayItem drawing many curves behind the one a window
+#               shows, e.g. the chi(k) or |FT| of every scan of the
+#               workspace. All of them are one plot item, so they are drawn
+#               in one pass of one replot. Each curve keeps its min/max
+#               pyramid (see envelope.py) and the polyline it was last drawn
+#               as; the pyramid is only rebuilt when its data changes and the
+#               polyline only when the axes or the canvas do.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+
+from numpy import asarray
+from PyQt5.QtCore import QRectF, QPointF
+from PyQt5.QtGui import QPen, QColor, QPolygonF
+
+from .qwt_compat import QwtPlotItem
+from .envelope import makePyramid, chooseLevel, envelope
+
+try:
+    from qwt.plot_curve import array2d_to_qpolygonf
+except ImportError:
+    def array2d_to_qpolygonf(xdata, ydata):
+        return QPolygonF([QPointF(x, y) for x, y in zip(xdata, ydata)])
+
+OVERLAY_Z = 15 #below the curves of the window, which Qwt puts at 20
+HUE_STEP = 137 #degrees between the hues of consecutive curves
+
+def overlayColor(index):
+    #a color for curve index that stands apart from its neighbours
+    return QColor.fromHsv((index * HUE_STEP) % 360, 160, 200)
+
+class OverlayCurve:
+    """One curve of an OverlayItem.
+
+    xdata and ydata are the arrays it was given; a curve given the same
+    arrays again keeps its levels. shown is the (xmin, xmax, pixels) the
+    points were reduced for and drawn the axis mapping the polyline was
+    made with.
+    """
+    __slots__ = ('xdata', 'ydata', 'levels', 'rect', 'pen', 'shown', 'points',
+                 'drawn', 'polyline')
+
+    def __init__(self, xdata, ydata, pen):
+        self.xdata = xdata
+        self.ydata = ydata
+        self.levels = makePyramid(xdata, ydata)
+        top = self.levels[-1]
+        if len(top[0]):
+            self.rect = QRectF(QPointF(top[0][0], top[4].min()), QPointF(top[1][-1], top[5].max()))
+        else:
+            self.rect = QRectF(1.0, 1.0, -2.0, -2.0)
+        self.pen = pen
+        self.shown = None
+        self.points = None
+        self.drawn = None
+        self.polyline = None
+
+    def getPolyline(self, xMap, yMap, pixels):
+        xmin, xmax = sorted((xMap.s1(), xMap.s2()))
+        shown = (xmin, xmax, pixels)
+        if shown != self.shown:
+            self.shown = shown
+            self.points = envelope(chooseLevel(self.levels, xmin, xmax, pixels), xmin, xmax, pixels)
+            self.drawn = None
+        drawn = (xMap.s1(), xMap.s2(), xMap.p1(), xMap.p2(), yMap.s1(), yMap.s2(), yMap.p1(), yMap.p2())
+        if drawn != self.drawn:
+            self.drawn = drawn
+            xdata, ydata = self.points
+            self.polyline = array2d_to_qpolygonf(asarray(xMap.transform(xdata), float),
+                                                 asarray(yMap.transform(ydata), float))
+        return self.polyline
+
+class OverlayItem(QwtPlotItem):
+    """Many curves drawn as one plot item.
+
+    setCurves() takes all of them at once, by key; the window replots
+    once afterwards. Curves are drawn thin and in their own colors.
+    """
+    def __init__(self, title="overlay"):
+        QwtPlotItem.__init__(self)
+        self.setTitle(title)
+        self.setZ(OVERLAY_Z)
+        self.setItemAttribute(QwtPlotItem.AutoScale, True)
+        self.curves = {} # key -> OverlayCurve
+        self.order = [] # keys in drawing order
+
+    def setCurves(self, curves):
+        """Show curves, a list of (key, xdata, ydata, color).
+
+        Curves whose key was shown with the same arrays before are only
+        recolored. Returns the number of curves that had to be rebuilt.
+        """
+        old = self.curves
+        self.curves = {}
+        self.order = []
+        rebuilt = 0
+        for key, xdata, ydata, color in curves:
+            pen = QPen(color, 1)
+            curve = old.get(key)
+            if curve is not None and curve.xdata is xdata and curve.ydata is ydata:
+                curve.pen = pen
+            else:
+                curve = OverlayCurve(xdata, ydata, pen)
+                rebuilt += 1
+            self.curves[key] = curve
+            self.order.append(key)
+        self.itemChanged()
+        return rebuilt
+
+    def clear(self):
+        self.setCurves([])
+
+    def boundingRect(self):
+        rect = QRectF(1.0, 1.0, -2.0, -2.0)
+        for curve in self.curves.values():
+            if curve.rect.isValid():
+                rect = curve.rect if not rect.isValid() else rect.united(curve.rect)
+        return rect
+
+    def draw(self, painter, xMap, yMap, canvasRect):
+        pixels = int(canvasRect.width())
+        if pixels <= 0:
+            return
+        for key in self.order:
+            curve = self.curves[key]
+            if len(curve.levels[0][0]) == 0:
+                continue
+            painter.setPen(curve.pen)
+            painter.drawPolyline(curve.getPolyline(xMap, yMap, pixels))
@@ -0,0 +1,346 @@
+# pipeline.py -- the processing chain raw -> background -> normalized ->
+#                spline -> chi(k) -> FFT as an explicit graph. Parameters
+#                are set on the graph, which marks everything downstream of
+#                them dirty; a stage is only recomputed when it is asked for
+#                and one of its inputs has changed. Stage results are also
+#                kept in small LRU caches keyed on their inputs, so going
+#                back to earlier parameters is free.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+
+from collections import OrderedDict
+from sys import getsizeof
+from threading import Lock
+from numpy import ndarray, array_equal, asarray, concatenate, searchsorted, arange, sqrt as np_sqrt
+
+from . import calc
+
+CACHE_ENTRIES = 16 #results kept per stage
+CACHE_BYTES = 64 * 1024 * 1024 #rough memory limit per stage
+STAGES = ('grid', 'background', 'normalized', 'spline', 'chi', 'fft') #in processing order
+
+def _same(a, b):
+    #parameters are compared by value so re-sending an unchanged one is free
+    if a is b:
+        return True
+    if isinstance(a, ndarray) or isinstance(b, ndarray):
+        return array_equal(a, b)
+    try:
+        return bool(a == b)
+    except ValueError:
+        return False
+
+def _nbytes(value):
+    #rough size of a stage result; lists of floats are what the GUI passes around
+    if isinstance(value, ndarray):
+        return value.nbytes
+    if isinstance(value, (list, tuple)):
+        if value and isinstance(value[0], float):
+            return getsizeof(value) + len(value) * getsizeof(0.0)
+        return getsizeof(value) + sum([_nbytes(v) for v in value])
+    return getsizeof(value)
+
+class StageCache:
+    """Bounded LRU memoization of a stage function.
+
+    Hashable arguments (orders, indices, segs, the k window) are part of
+    the key by value; data arguments (lists and arrays) by identity. Each
+    entry keeps its data arguments alive so their ids can't be reused.
+    The oldest entries are dropped once there are more than maxEntries or
+    the results take more than maxBytes. Lookups are locked so a worker
+    thread can share the cache with the GUI.
+    """
+    def __init__(self, func, maxEntries=CACHE_ENTRIES, maxBytes=CACHE_BYTES):
+        self.func = func
+        self.lock = Lock()
+        self.maxEntries = maxEntries
+        self.maxBytes = maxBytes
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, args):
+        key = []
+        for arg in args:
+            try:
+                hash(arg)
+                key.append(arg)
+            except TypeError:
+                key.append(('id', id(arg)))
+        return tuple(key)
+
+    def __call__(self, *args):
+        key = self.key(args)
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key][0]
+            self.misses += 1
+
+        value = self.func(*args)
+        size = _nbytes(value)
+        with self.lock:
+            if key not in self.entries:
+                self.nbytes += size
+            self.entries[key] = (value, size, args)
+            self.trim()
+        return value
+
+    def trim(self):
+        while self.entries and (len(self.entries) > self.maxEntries or self.nbytes > self.maxBytes):
+            key, (value, size, args) = self.entries.popitem(last=False)
+            self.nbytes -= size
+
+    def setLimits(self, maxEntries=None, maxBytes=None):
+        with self.lock:
+            if maxEntries is not None:
+                self.maxEntries = maxEntries
+            if maxBytes is not None:
+                self.maxBytes = maxBytes
+            self.trim()
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.nbytes = 0
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses,
+                'entries': len(self.entries), 'bytes': self.nbytes}
+
+class Pipeline:
+    """Lazily evaluated graph of named parameters and stages.
+
+    Every stage is a function of the parameters and stages it depends on.
+    setParam() and setValue() mark the dependents of a name dirty; get()
+    recomputes only the dirty stages on the way to the one asked for.
+    getVersion() changes whenever a stage gets a new value, so views can
+    tell whether they are showing the current result. Stages added with
+    cache=True keep their recent results in a StageCache.
+
+    A Pipeline itself is not thread safe; a worker evaluates a snapshot()
+    and the GUI adopt()s it afterwards, unless a parameter changed in the
+    meantime and made the results stale.
+    """
+    def __init__(self):
+        self.params = {}
+        self.stages = {}
+        self.dependents = {}
+        self.values = {}
+        self.versions = {}
+        self.dirty = set()
+        self.generation = 0
+
+    def addStage(self, name, func, deps, cache=False):
+        if cache:
+            func = StageCache(func)
+        self.stages[name] = (func, list(deps))
+        self.dependents.setdefault(name, [])
+        for dep in deps:
+            self.dependents.setdefault(dep, []).append(name)
+        self.dirty.add(name)
+
+    def setParam(self, name, value):
+        #returns True if the value was different and something was invalidated
+        if name in self.params and _same(self.params[name], value):
+            return False
+        self.params[name] = value
+        self.dependents.setdefault(name, [])
+        self.generation += 1
+        self.invalidate(name)
+        return True
+
+    def setParams(self, **kwargs):
+        changed = False
+        for name, value in kwargs.items():
+            changed = self.setParam(name, value) or changed
+        return changed
+
+    def setValue(self, name, value):
+        #use value as the result of a stage until its own inputs change
+        if name not in self.dirty and name in self.values and _same(self.values[name], value):
+            return False
+        self.values[name] = value
+        self.versions[name] = self.versions.get(name, 0) + 1
+        self.dirty.discard(name)
+        self.generation += 1
+        self.invalidate(name)
+        return True
+
+    def invalidate(self, name):
+        for dep in self.dependents.get(name, []):
+            if dep not in self.dirty:
+                self.dirty.add(dep)
+                self.invalidate(dep)
+
+    def isDirty(self, name):
+        return name in self.dirty
+
+    def hasParams(self, *names):
+        return all(name in self.params for name in names)
+
+    def isReady(self, name):
+        #True if every parameter the stage needs has been set
+        if name in self.params or (name in self.values and name not in self.dirty):
+            return True
+        if name not in self.stages:
+            return False
+        return all([self.isReady(dep) for dep in self.stages[name][1]])
+
+    def getVersion(self, name):
+        return self.versions.get(name, 0)
+
+    def get(self, name):
+        if name in self.params:
+            return self.params[name]
+        if name in self.dirty or name not in self.values:
+            func, deps = self.stages[name]
+            value = func(*[self.get(dep) for dep in deps])
+            if value is not self.values.get(name):
+                self.values[name] = value
+                self.versions[name] = self.versions.get(name, 0) + 1
+            self.dirty.discard(name)
+        return self.values[name]
+
+    def snapshot(self):
+        """Copy of the current state that can be evaluated in another thread.
+
+        The stage functions, and so their caches, are shared.
+        """
+        copy = Pipeline()
+        copy.params = dict(self.params)
+        copy.stages = self.stages
+        copy.dependents = self.dependents
+        copy.values = dict(self.values)
+        copy.versions = dict(self.versions)
+        copy.dirty = set(self.dirty)
+        copy.generation = self.generation
+        return copy
+
+    def adopt(self, snapshot):
+        #take over the results of an evaluated snapshot; False if they are stale
+        if snapshot.generation != self.generation:
+            return False
+        self.values = snapshot.values
+        self.versions = snapshot.versions
+        self.dirty = snapshot.dirty
+        return True
+
+    def take(self, other):
+        """Use the results of another pipeline built with the same stages.
+
+        Only if every parameter has the same value in both; the stages
+        other has evaluated then get its values as new versions. Returns
+        False, and changes nothing, if any parameter differs.
+        """
+        if set(self.params) != set(other.params):
+            return False
+        if not all([_same(value, other.params[name]) for name, value in self.params.items()]):
+            return False
+        for name in self.stages:
+            if name in other.values and name not in other.dirty:
+                self.values[name] = other.values[name]
+                self.versions[name] = self.versions.get(name, 0) + 1
+                self.dirty.discard(name)
+        self.generation += 1
+        return True
+
+    def nbytes(self):
+        #rough memory held by the parameters and stage values; a stage
+        #passing an input on as it is counts once
+        values = dict([(id(value), value) for value in
+                       list(self.params.values()) + list(self.values.values())])
+        return sum([_nbytes(value) for value in values.values()])
+
+    def getCaches(self):
+        return dict([(name, func) for name, (func, deps) in self.stages.items()
+                     if isinstance(func, StageCache)])
+
+    def setCacheLimits(self, maxEntries=None, maxBytes=None):
+        for cache in self.getCaches().values():
+            cache.setLimits(maxEntries, maxBytes)
+
+    def clearCaches(self):
+        for cache in self.getCaches().values():
+            cache.clear()
+
+    def cacheStats(self):
+        """Hits, misses, entries and bytes of every cached stage."""
+        return dict([(name, cache.stats()) for name, cache in self.getCaches().items()])
+
+def decimate(data, step):
+    #every step-th point, always keeping the last one; a view of data if it can be
+    if step <= 1:
+        return data
+    data = asarray(data, float)
+    result = data[::step]
+    if (len(data) - 1) % step:
+        result = concatenate((result, data[-1:]))
+    return result
+
+def _grid(xdata, step):
+    return decimate(xdata, step)
+
+def _background(grid, ydata, bgparams, step, E0):
+    lindex, hindex, order = bgparams
+    if step > 1:
+        last = len(grid) - 1
+        lindex = min(lindex // step, last)
+        hindex = min((hindex + step - 1) // step, last)
+    return calc.calcBackground(grid, decimate(ydata, step), lindex, hindex, order, E0)
+
+def _normalized(ydata, background, step):
+    return asarray(decimate(ydata, step), float) - background
+
+def _spline(grid, normalized, E0, segs, step):
+    #returns (normdata, splinedata), both divided by the spline at E0
+    if step > 1:
+        #calcSpline needs the knots on the grid
+        segs = [(seg[0], calc.getClosest(seg[1], grid), calc.getClosest(seg[2], grid)) for seg in segs]
+    tempspline, sp_E0 = calc.calcSpline(grid, normalized, E0, segs)
+    return normalized / sp_E0, asarray(tempspline, float) / sp_E0
+
+def _chi(grid, spline, E0):
+    #returns (kdata, xafsdata) for the part of the data above E0; the
+    #normalized data and spline going into it are views, not copies
+    normdata, splinedata = spline
+    k0index = int(searchsorted(grid, E0, side='left'))
+    if k0index >= len(grid):
+        return asarray([]), asarray([])
+
+    kdata = calc.KEV * np_sqrt(asarray(grid[k0index:], float) - E0)
+    return kdata, calc.calcXAFSBatch(normdata[k0index:], splinedata[k0index:], kdata)
+
+def _fft(chi, kwindow):
+    #returns (rdata, fftdata)
+    kdata, xafsdata = chi
+    fftdata, DR = calc.calcFFTBatch(kdata, xafsdata, kwindow[0], kwindow[1])
+    return arange(fftdata.shape[1]) * DR, fftdata[0]
+
+def xafsPipeline():
+    """Pipeline for one scan.
+
+    Parameters are xdata, ydata and E0, bgparams as (lindex, hindex,
+    order) for calcBackground, segs as for calcSpline and kwindow as
+    (kmin, kmax). step > 1 evaluates everything on every step-th point
+    only, for quick previews; the grid stage holds the energies used.
+    Stages are grid, background, normalized, spline (normdata,
+    splinedata), chi (kdata, xafsdata) and fft (rdata, fftdata).
+
+    Every stage is cached; since a cache hit hands back the very same
+    object, the stages below it hit their caches too.
+    """
+    pipeline = Pipeline()
+    pipeline.setParam('step', 1)
+    pipeline.addStage('grid', _grid, ('xdata', 'step'), cache=True)
+    pipeline.addStage('background', _background, ('grid', 'ydata', 'bgparams', 'step', 'E0'), cache=True)
+    pipeline.addStage('normalized', _normalized, ('ydata', 'background', 'step'), cache=True)
+    pipeline.addStage('spline', _spline, ('grid', 'normalized', 'E0', 'segs', 'step'), cache=True)
+    pipeline.addStage('chi', _chi, ('grid', 'spline', 'E0'), cache=True)
+    pipeline.addStage('fft', _fft, ('chi', 'kwindow'), cache=True)
+    return pipeline
@@ -0,0 +1,205 @@
+# pool.py -- the pool of worker processes that recomputes the linked scans
+#            of a workspace and the rows of a time series, with
+#            WorkspaceRunner and StackRunner handing it the jobs of each.
+#            Starting the pool pulls in multiprocessing, so this module is
+#            only imported once either of them has work.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+
+from os import cpu_count
+from time import sleep
+from multiprocessing import get_context
+from concurrent.futures import ProcessPoolExecutor
+from PyQt5.QtCore import QObject, QCoreApplication, QEvent, pyqtSignal
+
+from . import workspace
+from . import stack
+
+_pool = {'executor': None} #see processPool()
+
+def processPool(workers=None):
+    """The pool of worker processes the runners share, started on first
+    use. The processes start from scratch instead of forking the GUI."""
+    if _pool['executor'] is None:
+        workers = workers or max(1, (cpu_count() or 2) - 1)
+        _pool['executor'] = ProcessPoolExecutor(workers, mp_context=get_context('spawn'))
+    return _pool['executor']
+
+def shutdownPool():
+    if _pool['executor'] is not None:
+        _pool['executor'].shutdown(wait=False)
+        _pool['executor'] = None
+
+class WorkspaceRunner(QObject):
+    """Recomputes workspace documents in a pool of worker processes.
+
+    compute() queues a document with the settings it has now, replacing a
+    queued job for it that hasn't started; computed is emitted on the GUI
+    thread once a document holds the results of its current settings.
+    Results for settings that changed in the meantime are dropped. The
+    worker processes are the ones of processPool().
+    """
+    computed = pyqtSignal(object)
+    failed = pyqtSignal(str)
+    _done = pyqtSignal(object, object, int, object, object)
+
+    def __init__(self, parent=None, workers=None):
+        QObject.__init__(self, parent)
+        self.workers = workers
+        self.jobs = {} # document -> future
+        self._done.connect(self._deliver)
+
+    def compute(self, documents):
+        executor = processPool(self.workers)
+        for document in documents:
+            if document in self.jobs:
+                self.jobs.pop(document).cancel()
+            scan = document.scan
+            version = document.version
+            future = executor.submit(workspace.computeStages, scan.xdata, scan.ydata,
+                                          scan.i0data, scan.getSettings())
+            future.add_done_callback(lambda future, document=document, version=version:
+                                     self._finished(future, document, version))
+            self.jobs[document] = future
+
+    def isIdle(self):
+        return not self.jobs
+
+    def _finished(self, future, document, version):
+        #a thread of the executor
+        if future.cancelled():
+            return
+        try:
+            values, error = future.result(), None
+        except Exception as e:
+            values, error = None, e
+        self._done.emit(future, document, version, values, error)
+
+    def _deliver(self, future, document, version, values, error):
+        if self.jobs.get(document) is future:
+            del self.jobs[document]
+        if version != document.version:
+            return
+        if error is not None:
+            self.failed.emit("Couldn't compute %s: %s" % (document.scan.title, error))
+            return
+        document.results = workspace.resultPipeline(document.scan, values)
+        self.computed.emit(document)
+
+    def wait(self):
+        """Block until every queued document has been computed and delivered."""
+        while self.jobs:
+            for future in list(self.jobs.values()):
+                try:
+                    future.result()
+                except Exception:
+                    pass
+            #the results are posted once the executor is done with a job
+            sleep(0.001)
+            QCoreApplication.sendPostedEvents(None, QEvent.MetaCall)
+
+    def shutdown(self):
+        #the pool is shared; shutdownPool() stops it once every runner is done
+        for future in self.jobs.values():
+            future.cancel()
+        self.jobs = {}
+
+class StackRunner(QObject):
+    """Computes the rows of a SpectrumStack in batches in worker processes.
+
+    compute() queues the rows not computed with the stack's settings in
+    batches of stack.BATCH_ROWS, the ones nearest to a given row first,
+    and cancels queued batches that haven't started. rowsReady is emitted
+    on the GUI thread with the rows of each batch once the stack holds
+    them; batches for settings that changed in the meantime are dropped.
+    The worker processes are the ones of processPool().
+    """
+    rowsReady = pyqtSignal(object)
+    failed = pyqtSignal(str)
+    _done = pyqtSignal(object, object, object, object, object, object)
+
+    def __init__(self, parent=None, workers=None):
+        QObject.__init__(self, parent)
+        self.workers = workers
+        self.stack = None
+        self.jobs = {} # future -> rows
+        self.pending = {} # row -> settings it is being computed with
+        self._done.connect(self._deliver)
+
+    def compute(self, spectra, around=0):
+        self.cancel()
+        if spectra is not self.stack:
+            #batches still running for another stack are dropped when they arrive
+            self.stack = spectra
+            self.pending = {}
+        settings = spectra.settings
+        rows = [row for row in spectra.getOutdated(around) if self.pending.get(row) != settings]
+        executor = processPool(self.workers)
+        for i in range(0, len(rows), stack.BATCH_ROWS):
+            batch = rows[i:i + stack.BATCH_ROWS]
+            future = executor.submit(stack.computeRows, [spectra.paths[row] for row in batch],
+                                     settings, spectra.grids)
+            future.add_done_callback(lambda future, batch=batch:
+                                     self._finished(future, spectra, batch, settings))
+            self.jobs[future] = batch
+            for row in batch:
+                self.pending[row] = settings
+
+    def cancel(self):
+        #batches already running are left to finish
+        for future, batch in list(self.jobs.items()):
+            if future.cancel():
+                del self.jobs[future]
+                for row in batch:
+                    self.pending.pop(row, None)
+
+    def isIdle(self):
+        return not self.jobs
+
+    def _finished(self, future, spectra, batch, settings):
+        #a thread of the executor
+        if future.cancelled():
+            return
+        try:
+            result, error = future.result(), None
+        except Exception as e:
+            result, error = None, e
+        self._done.emit(future, spectra, batch, settings, result, error)
+
+    def _deliver(self, future, spectra, batch, settings, result, error):
+        self.jobs.pop(future, None)
+        if spectra is not self.stack:
+            return
+        for row in batch:
+            if self.pending.get(row) == settings:
+                del self.pending[row]
+        if error is not None:
+            self.failed.emit("Couldn't compute the time series: %s" % (error,))
+            return
+        if settings != spectra.settings:
+            return
+        images, errors = result
+        spectra.setRows(batch, images, settings)
+        if errors:
+            self.failed.emit("Couldn't read %s" % "; ".join(errors))
+        self.rowsReady.emit(batch)
+
+    def wait(self):
+        """Block until every queued batch has been computed and delivered."""
+        while self.jobs:
+            for future in list(self.jobs):
+                try:
+                    future.result()
+                except Exception:
+                    pass
+            sleep(0.001)
+            QCoreApplication.sendPostedEvents(None, QEvent.MetaCall)
+
+    def shutdown(self):
+        for future in self.jobs:
+            future.cancel()
+        self.jobs = {}
+        self.pending = {}
@@ -0,0 +1,249 @@
+#!/usr/bin/env python
+
+# preedge.py -- fits of pre-edge peaks in normalized XANES spectra. Each
+#               spectrum is modelled as a sum of gaussians (calc.gauss) on
+#               top of an arctan edge step, and fitted by Levenberg-Marquardt
+#               with analytic derivatives. Spectra are fitted a stack at a
+#               time and stacks are spread over worker processes.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+
+from math import pi
+from concurrent.futures import ProcessPoolExecutor
+from numpy import (asarray, atleast_2d, zeros, ones, arctan, einsum, eye, clip,
+                   interp, vstack, array, isfinite, searchsorted, full, argsort,
+                   take_along_axis)
+import numpy.linalg as LinearAlgebra
+
+from .calc import gauss
+
+PEAKPARAMS = 3 #area, centroid and width of each gaussian
+EDGEPARAMS = 4 #height, position and width of the arctan step plus an offset
+MINWIDTH = 0.05 #eV; widths are kept above this so the gaussians stay finite
+CHUNK = 64 #spectra fitted together in one process
+
+def model(xdata, params, npeaks):
+    #model for a stack of parameter sets, one per row
+    x = asarray(xdata, float)[None, :]
+    params = atleast_2d(params)
+
+    data = zeros((params.shape[0], x.shape[1]))
+    for j in range(npeaks):
+        area, mean, stdev = [params[:, PEAKPARAMS * j + i][:, None] for i in range(PEAKPARAMS)]
+        data += area * gauss(x, mean, stdev)
+
+    height, pos, width, offset = [params[:, PEAKPARAMS * npeaks + i][:, None] for i in range(EDGEPARAMS)]
+    data += height * (0.5 + arctan((x - pos) / width) / pi) + offset
+
+    return data
+
+def jacobian(xdata, params, npeaks):
+    #analytic derivatives of model() with respect to every parameter
+    x = asarray(xdata, float)[None, :]
+    nparams = params.shape[1]
+    jac = zeros((params.shape[0], x.shape[1], nparams))
+
+    for j in range(npeaks):
+        col = PEAKPARAMS * j
+        area, mean, stdev = [params[:, col + i][:, None] for i in range(PEAKPARAMS)]
+        g = gauss(x, mean, stdev)
+        dx = x - mean
+        jac[:, :, col] = g
+        jac[:, :, col + 1] = area * g * dx / stdev ** 2
+        jac[:, :, col + 2] = area * g * (dx ** 2 / stdev ** 3 - 1.0 / stdev)
+
+    col = PEAKPARAMS * npeaks
+    height, pos, width = [params[:, col + i][:, None] for i in range(3)]
+    z = (x - pos) / width
+    lorentz = height / (pi * width * (1.0 + z * z))
+    jac[:, :, col] = 0.5 + arctan(z) / pi
+    jac[:, :, col + 1] = -lorentz
+    jac[:, :, col + 2] = -lorentz * z
+    jac[:, :, col + 3] = 1.0
+
+    return jac
+
+def initialGuess(xdata, ystack, centers, width, edge, edgeWidth):
+    #with the positions and widths fixed the model is linear in the areas,
+    #the edge height and the offset; every spectrum shares that design matrix
+    x = asarray(xdata, float)
+    npeaks = len(centers)
+    col = PEAKPARAMS * npeaks
+
+    params = zeros((ystack.shape[0], col + EDGEPARAMS))
+    for j in range(npeaks):
+        params[:, PEAKPARAMS * j + 1] = centers[j]
+        params[:, PEAKPARAMS * j + 2] = width
+    params[:, col + 1] = edge
+    params[:, col + 2] = edgeWidth
+
+    linear = [PEAKPARAMS * j for j in range(npeaks)] + [col, col + 3]
+    design = jacobian(x, params[:1], npeaks)[0][:, linear]
+    soln = LinearAlgebra.lstsq(design, ystack.T, rcond=None)[0]
+    params[:, linear] = soln.T
+
+    return params
+
+def levenbergMarquardt(xdata, ystack, params, npeaks, maxIter=100, tol=1e-10):
+    """Fit every row of ystack at once, starting from params.
+
+    Each spectrum keeps its own damping and stops on its own once its
+    chi^2 no longer improves. Returns (params, chisq).
+    """
+    x = asarray(xdata, float)
+    params = params.copy()
+    nspec, nparams = params.shape
+    widths = [PEAKPARAMS * j + 2 for j in range(npeaks)] + [PEAKPARAMS * npeaks + 2]
+    means = [PEAKPARAMS * j + 1 for j in range(npeaks)]
+    span = x[-1] - x[0]
+
+    resid = ystack - model(x, params, npeaks)
+    chisq = (resid * resid).sum(axis=1)
+    damping = full(nspec, 1.0)
+    active = ones(nspec, bool)
+    ident = eye(nparams)
+
+    for it in range(maxIter):
+        if not active.any():
+            break
+        rows = active.nonzero()[0]
+
+        jac = jacobian(x, params[rows], npeaks)
+        jtj = einsum('mpi,mpj->mij', jac, jac)
+        grad = einsum('mpi,mp->mi', jac, resid[rows])
+
+        #marquardt scaling of the diagonal
+        diag = einsum('mii->mi', jtj)
+        lhs = jtj + damping[rows][:, None, None] * diag[:, :, None] * ident
+        try:
+            step = LinearAlgebra.solve(lhs, grad[:, :, None])[:, :, 0]
+        except LinearAlgebra.LinAlgError:
+            step = array([LinearAlgebra.lstsq(a, b, rcond=None)[0] for a, b in zip(lhs, grad)])
+
+        trial = params[rows] + step
+        #peaks have to stay inside the window to be identifiable
+        trial[:, widths] = clip(abs(trial[:, widths]), MINWIDTH, span)
+        trial[:, means] = clip(trial[:, means], x[0], x[-1])
+
+        tresid = ystack[rows] - model(x, trial, npeaks)
+        tchisq = (tresid * tresid).sum(axis=1)
+        better = isfinite(tchisq) & (tchisq < chisq[rows])
+
+        accept = rows[better]
+        gain = chisq[accept] - tchisq[better]
+        params[accept] = trial[better]
+        resid[accept] = tresid[better]
+        damping[accept] *= 0.3
+        damping[rows[~better]] *= 10.0
+
+        #done when an accepted step barely helps or the damping runs away
+        converged = zeros(nspec, bool)
+        converged[accept] = gain <= tol * (1.0 + tchisq[better])
+        chisq[accept] = tchisq[better]
+        active &= ~converged & (damping < 1e12)
+
+    return params, chisq
+
+def _fitStack(args):
+    #worker entry point; has to live at module level so it can be pickled
+    xdata, ystack, centers, width, edge, edgeWidth, maxIter = args
+    npeaks = len(centers)
+    params = initialGuess(xdata, ystack, centers, width, edge, edgeWidth)
+    params, chisq = levenbergMarquardt(xdata, ystack, params, npeaks, maxIter)
+
+    #peaks may trade places during the fit; report them in order of energy
+    peaks = params[:, :PEAKPARAMS * npeaks].reshape(len(params), npeaks, PEAKPARAMS)
+    order = argsort(peaks[:, :, 1], axis=1)
+    params[:, :PEAKPARAMS * npeaks] = take_along_axis(peaks, order[:, :, None], axis=1).reshape(len(params), -1)
+    return params, chisq
+
+def fitPreEdge(xdata, ystack, centers, window, E0, width=1.0, edgeWidth=2.0,
+               maxIter=100, workers=None):
+    """Fit gaussian pre-edge peaks to a stack of normalized spectra.
+
+    xdata is the common energy grid and ystack holds one normalized
+    spectrum (NormPlot.normdata) per row. centers are starting energies
+    for the peaks, window the (low, high) energy range fitted, E0 the
+    starting position of the arctan edge step. Stacks of CHUNK spectra are
+    fitted in up to workers processes (all cores when None, in this
+    process when 1).
+
+    Returns (centroids, areas, params, chisq); centroids and areas have one
+    row per spectrum and one column per peak, params holds every fitted
+    parameter (area, centroid, width per peak, then edge height, position,
+    width and offset).
+    """
+    x = asarray(xdata, float)
+    ystack = atleast_2d(asarray(ystack, float))
+    low = searchsorted(x, window[0], side='left')
+    high = searchsorted(x, window[1], side='right')
+    x = x[low:high]
+    ystack = ystack[:, low:high]
+    centers = [float(c) for c in centers]
+
+    jobs = [(x, ystack[i:i + CHUNK], centers, width, E0, edgeWidth, maxIter)
+            for i in range(0, ystack.shape[0], CHUNK)]
+
+    if workers == 1 or len(jobs) == 1:
+        results = [_fitStack(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_fitStack, jobs))
+
+    params = vstack([r[0] for r in results])
+    chisq = array([c for r in results for c in r[1]])
+
+    npeaks = len(centers)
+    areas = params[:, [PEAKPARAMS * j for j in range(npeaks)]]
+    centroids = params[:, [PEAKPARAMS * j + 1 for j in range(npeaks)]]
+
+    return centroids, areas, params, chisq
+
+def readNormalized(filename):
+    #energy and NORMAL columns of a saved PySpline (.d) file
+    xdata = []
+    normdata = []
+    file = open(filename)
+    line = file.readline()
+    while line:
+        tokens = line.strip().split(',')
+        if len(tokens) >= 6:
+            try:
+                row = [float(t) for t in tokens]
+                xdata.append(row[0])
+                normdata.append(row[5])
+            except ValueError:
+                pass
+        line = file.readline()
+    file.close()
+
+    return array(xdata), array(normdata)
+
+if(__name__=='__main__'):
+    #python -m src.preedge "7113.2 7115.0" 7105 7125 7120 file1.d file2.d ...
+    import sys
+    if len(sys.argv) < 6:
+        print("usage: preedge.py \"center1 center2 ...\" emin emax edge file.d ...")
+        sys.exit(1)
+
+    centers = [float(c) for c in sys.argv[1].split()]
+    window = (float(sys.argv[2]), float(sys.argv[3]))
+    edge = float(sys.argv[4])
+    files = sys.argv[5:]
+
+    #everything is fitted on the grid of the first file
+    xdata, first = readNormalized(files[0])
+    stack = [first]
+    for name in files[1:]:
+        x, y = readNormalized(name)
+        stack.append(interp(xdata, x, y))
+
+    centroids, areas, params, chisq = fitPreEdge(xdata, vstack(stack), centers, window, edge)
+    for name, c, a, chi in zip(files, centroids, areas, chisq):
+        text = name
+        for j in range(len(centers)):
+            text += " %.3f %.5f" % (c[j], a[j])
+        print(text + " %.3g" % chi)
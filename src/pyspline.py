@@ -12,45 +12,44 @@
 
 #os specific things
 import sys
-from os.path import exists
-from time import localtime,asctime
+from contextlib import contextmanager
+from os.path import exists, abspath, basename
+from time import localtime,asctime,time
 
 from .qt_compat import (
     QWidget, QMainWindow, QDialog, QApplication, QPrinter, QPainter, QPixmap, QColor, QFontMetrics, QFont, QRect, QFileDialog, QMessageBox, QAction, QToolBar, QMenuBar, QMenu, QTextEdit, QPushButton, QSpacerItem, QSizePolicy, QString, SIGNAL, PYSIGNAL, qApp, translate,
     QSize, QPen, Qt
 )
-from PyQt5.QtCore import QFileInfo
-from PyQt5.QtGui import QIcon
-from PyQt5.QtWidgets import QStyle, QInputDialog
+from PyQt5.QtCore import QFileInfo, QTimer
+from PyQt5.QtGui import QIcon, QKeySequence
+from PyQt5.QtWidgets import QStyle, QInputDialog, QProgressDialog
 from .qwt_compat import QwtPlot
 
-# program files (use package-relative imports)
+# program files (use package-relative imports). Only what the raw data
+# window needs is imported here; the other windows, the dialogs and the
+# tools are imported when first used, see test_import_time.py
 from .rawplot import RawPlot
-from .dataplot import DataPlot
-from .normplot import NormPlot
-from .fftplot import FFTPlot
-from .kplot import KPlot
-from .i0plot import I0Plot
-from .bounds import bounds, toKSpace, KEV
-from .edge import EdgeDialog
-from .poly import Polynomial
-from .aboutbox import AboutBox
-from .comments import Comments
-from .icons import (image0_data, image1_data, image2_data, image3_data,
-                   image4_data, image5_data, image6_data, image7_data,
-                   image8_data, image9_data)
+from .dataplot import DataPlot, replotBatch, blockedUpdates
 from . import calc
+from . import pipeline
+from .runner import PipelineRunner, FileLoader, Prefetcher
+from .scanlist import ScanList, listScans
+from .spectrum import Spectrum
 
-#math libraries
+#math libraries; numpy's star import would load all of its subpackages
 from math import sqrt,pi
-from numpy import *
-import numpy.linalg as LinearAlgebra
-import numpy.fft as FFT
+from numpy import array, clip
 
 import string
 
 KEV=0.5123143 #conversion between eV and k
-HC=12398.5471 #conversion between eV and lambda
+PREVIEW_MS=30 #target time of one update while a marker is dragged
+PREVIEW_POINTS=2000 #points a first preview is decimated to
+SPECULATE_MS=100 #idle time before nudges of the hovered knot are precomputed
+SPECULATE_POINTS=2 #data points tried either way of the hovered knot
+SPECULATE_LIMIT=0.25 #s; no speculation when one evaluation takes longer
+PREFETCH_MS=200 #idle time before the scans next in line are read ahead
+SERIES_MS=300 #idle time before the time series is brought up to new settings
 
 #Canvas class is for printing
 class Canvas(QWidget):
@@ -206,6 +205,13 @@ class Canvas(QWidget):
         painter.end()
         
         
+def _spectrumAttribute(name, readonly=False):
+    #the scan's data and metadata live in PySpline.spectrum
+    getter = lambda self: getattr(self.spectrum, name)
+    if readonly:
+        return property(getter)
+    return property(getter, lambda self, value: setattr(self.spectrum, name, value))
+
 class PySpline(QMainWindow):
     def __init__(self, parent=None, name=None, fl=0):
         # PyQt5: QMainWindow(parent: QWidget = None, flags: Qt.WindowFlags = Qt.WindowFlags())
@@ -230,13 +236,8 @@ class PySpline(QMainWindow):
         if not name:
             self.setObjectName("Form1")
 
-        self.xdata=[]
-        self.ydata=[]
-        self.i0data=[]
-        self.background=[]
-        self.filename=""
-        self.title=""
-        self.comments=[]
+        # the scan itself; the windows only show what it holds
+        self.spectrum = Spectrum()
 
         self.raw=RawPlot(self)
         #self.raw.setSizePolicy(QSizePolicy.Minimum,QSizePolicy.Minimum)
@@ -246,27 +247,70 @@ class PySpline(QMainWindow):
         
         self.setCentralWidget(self.raw)
         
-        self.norm=NormPlot()
-        #self.norm.setSizePolicy(QSizePolicy.Minimum,QSizePolicy.Minimum)
-        self.norm.resize(600,400)
-        self.norm.plot.setAxisScale(QwtPlot.xBottom,0,100)
-        self.norm.plot.setAxisTitle(QwtPlot.xBottom, "Energy (eV)")
-        self.norm.show()
-        
-        self.kspace=KPlot()
-        self.kspace.resize(600,400)
-        self.kspace.plot.setAxisScale(QwtPlot.xBottom,0,100)
-        self.kspace.plot.setAxisTitle(QwtPlot.xBottom, "k (1/A)")
-        self.kspace.show()
-        
-        self.fft=FFTPlot()
-        self.fft.resize(600,400)
-        self.fft.show()
-        self.fft.plot.setAxisTitle(QwtPlot.xBottom, "R (A)")
-        
-        self.i0=I0Plot()
-        self.i0.resize(600,400)
-        self.i0.plot.setAxisTitle(QwtPlot.xBottom, "Energy (eV)")
+        # the other windows are only built when first needed, see getWindow()
+        self.windows = {}
+        
+        # one processing graph shared by all windows; each view remembers
+        # the version of the stage it shows so unchanged results are skipped
+        self.pipeline = self.spectrum.pipeline
+        self.raw.setPipeline(self.pipeline)
+        self.shownVersions = {}
+        
+        # the windows only record their parameters; the pipeline is evaluated
+        # on a worker thread and the results are shown when they arrive.
+        # requests made while handling one event are coalesced into one job
+        self.raw.deferred = True
+        self.runner = PipelineRunner(self.pipeline, self)
+        self.runner.finished.connect(self.showResults)
+        self.runner.failed.connect(self.message)
+        self.requestTimer = QTimer(self)
+        self.requestTimer.setSingleShot(True)
+        self.requestTimer.timeout.connect(self.startUpdate)
+        self.previewStep = 0 # decimation used while dragging, 0 until first needed
+        self.adaptedFrom = None
+        self.transactionDepth = 0 # see transaction()
+        
+        # positions next to the spline knot under the cursor are evaluated
+        # ahead of time while nothing else is going on, see speculate()
+        self.speculateTimer = QTimer(self)
+        self.speculateTimer.setSingleShot(True)
+        self.speculateTimer.timeout.connect(self.startSpeculation)
+        self.speculateKnot = -1
+        
+        # files are read and parsed on a worker of their own, with a
+        # progress dialog that is only made when first needed
+        self.loader = FileLoader(self)
+        self.loader.progress.connect(self.showLoadProgress)
+        self.loader.loaded.connect(self.showScanFile)
+        self.loader.failed.connect(self.showLoadError)
+        self.progressDialog = None
+        self.loadSettings = None # settings the scan being loaded gets, see stepScan()
+        
+        # the scans next in the directory are read and processed ahead of
+        # time with the settings of the one shown, see startPrefetch()
+        self.scans = None
+        self.prefetcher = Prefetcher(self)
+        self.prefetcher.ready.connect(self.keepPrefetched)
+        self.prefetching = None
+        self.prefetchTimer = QTimer(self)
+        self.prefetchTimer.setSingleShot(True)
+        self.prefetchTimer.timeout.connect(self.startPrefetch)
+        
+        # every opened scan stays in the workspace, made with the first
+        # one; the one shown is document. Scans linked to it are recomputed
+        # in worker processes once its own results are in, see
+        # syncWorkspace(); the runner and its pool start when first needed
+        self.workspace = None
+        self.document = None
+        self.workspaceRunner = None
+        self.workspaceView = None
+        
+        # the scans of the directory as a time series, see updateSeries()
+        self.series = None
+        self.stackRunner = None
+        self.seriesTimer = QTimer(self)
+        self.seriesTimer.setSingleShot(True)
+        self.seriesTimer.timeout.connect(self.updateSeries)
         
         try:
             self.raw.plot.positionMessage.connect(self.message)
@@ -278,78 +322,171 @@ class PySpline(QMainWindow):
             self.raw.signalPlotChanged.connect(self.updateNormPlot)
         except Exception:
             pass
-
-        try:
-            # NormPlot exposes plot_changed
-            self.norm.plot_changed.connect(self.updateXAFSPlot)
-        except Exception:
-            pass
-
-        try:
-            # DataPlot exposes signalUpdate
-            self.kspace.plot.signalUpdate.connect(self.updateFFTPlot)
-        except Exception:
-            pass
         
         self.initActions()
 
-    def readArray(self,file):
-        arr=[]
-        line=file.readline()
-        while(line):
-            s=line.strip()
-            if not s:
-                line=file.readline()
-                continue
-            # Split by comma if present, otherwise whitespace
-            if ',' in line:
-                tokens=[t.strip() for t in line.strip().split(',') if t.strip()!='']
-            else:
-                tokens=line.split()
-            try:
-                sub=[float(t) for t in tokens]
-            except ValueError:
-                # Skip non-numeric/header lines gracefully
-                line=file.readline()
-                continue
-            arr.append(sub)
-            line=file.readline()
-        # Return numpy array
-        return array(arr)
-        
+    def hasWindow(self, name):
+        return name in self.windows
+
+    def getWindow(self, name):
+        """The norm, kspace, fft, i0 or heatmap window, built on first use.
+
+        The pipeline computes without them, so a window is only made when
+        data first reaches its stage or it's shown from the Window menu.
+        A new window is shown if its Window menu entry is checked.
+        """
+        if name not in self.windows:
+            window = getattr(self, 'create' + name.capitalize() + 'Window')()
+            self.windows[name] = window
+            window.setShown(self.windowActions[name].isChecked())
+        return self.windows[name]
+
+    norm = property(lambda self: self.getWindow('norm'))
+    kspace = property(lambda self: self.getWindow('kspace'))
+    fft = property(lambda self: self.getWindow('fft'))
+    i0 = property(lambda self: self.getWindow('i0'))
+
+    E0 = _spectrumAttribute('E0')
+    title = _spectrumAttribute('title')
+    comments = _spectrumAttribute('comments')
+    filename = _spectrumAttribute('filename')
+    xdata = _spectrumAttribute('xdata', readonly=True)
+    ydata = _spectrumAttribute('ydata', readonly=True)
+    i0data = _spectrumAttribute('i0data', readonly=True)
+
+    def showWindow(self, name, on):
+        #a window that doesn't exist yet needn't be built to be hidden
+        if on or self.hasWindow(name):
+            self.getWindow(name).setShown(on)
+
+    def createNormWindow(self):
+        from .normplot import NormPlot
+        window=NormPlot()
+        window.resize(600,400)
+        window.plot.setAxisScale(QwtPlot.xBottom,0,100)
+        window.plot.setAxisTitle(QwtPlot.xBottom, "Energy (eV)")
+        window.setPipeline(self.pipeline)
+        window.deferred = True
+        window.plot_changed.connect(self.updateXAFSPlot)
+        window.plot.knotHovered.connect(self.speculate)
+        window.closed.connect(self.slotWindowNormActionToggled)
+        return window
+
+    def createKspaceWindow(self):
+        from .kplot import KPlot
+        window=KPlot()
+        window.resize(600,400)
+        window.plot.setAxisScale(QwtPlot.xBottom,0,100)
+        window.plot.setAxisTitle(QwtPlot.xBottom, "k (1/A)")
+        window.plot.signalUpdate.connect(self.updateFFTPlot)
+        window.closed.connect(self.slotWindowXAFSActionToggled)
+        window.setOverlay(self.getOverlay('chi'))
+        return window
+
+    def createFftWindow(self):
+        from .fftplot import FFTPlot
+        window=FFTPlot()
+        window.resize(600,400)
+        window.plot.setAxisTitle(QwtPlot.xBottom, "R (A)")
+        window.closed.connect(self.slotWindowFFTActionToggled)
+        window.setOverlay(self.getOverlay('fft'))
+        
+        #catch up with the transform computed so far
+        self.shownVersions.pop('fft', None)
+        if self.pipeline.isReady('fft') and not self.pipeline.isDirty('fft'):
+            self.shownVersions['fft'] = self.pipeline.getVersion('fft')
+            window.setFFTData(*self.pipeline.get('fft'))
+        return window
+
+    def createHeatmapWindow(self):
+        from .heatmapplot import HeatmapPlot
+        window=HeatmapPlot()
+        window.resize(600,500)
+        window.selected.connect(self.showSeriesScan)
+        window.closed.connect(self.slotWindowHeatmapActionToggled)
+        self.seriesTimer.start(0)
+        return window
+
+    def createI0Window(self):
+        from .i0plot import I0Plot
+        window=I0Plot()
+        window.resize(600,400)
+        window.plot.setAxisTitle(QwtPlot.xBottom, "Energy (eV)")
+        window.closed.connect(self.slotWindowI0ActionToggled)
+        if len(self.i0data):
+            window.setI0Data(self.xdata, self.i0data)
+        return window
+
+    def setData(self, xdata, ydata, i0data):
+        #the spectrum takes the columns first, the windows show its copies
+        self.spectrum.setData(xdata, ydata, i0data)
+        if self.hasWindow('i0'):
+            self.i0.setI0Data(self.xdata, self.i0data)
+
     def fileOpen(self):
-    
-        self.xdata = []
-        self.ydata = []
-        self.i0data = []
-        self.background = []
         
         fname, _ = QFileDialog.getOpenFileName(self, "Open Data File", "", "Data Files (*.d *.dat *.001);;All Files (*)")
         if not fname:
             return
         
-        # Detect file format by examining header
-        try:
-            with open(fname, 'r') as fh:
-                head = ''.join([fh.readline() or '' for _ in range(25)])
-            
-            # Check for SSRL EXAFS Data Collector format
-            if ('SSRL' in head and 'EXAFS Data Collector' in head) or ('Data:' in head and 'Requested Energy' in head):
-                self.fileOpenSSRL(fname)
-                return
-            
-            # Check for legacy .d format (has E0, BACKGROUND, SPLINE headers)
-            if 'E0' in head and 'BACKGROUND' in head and 'SPLINE' in head:
-                self.fileStringOpen(fname)
-                return
+        # the format is told from the file's header, see loader.detectFormat
+        self.loadFile(fname)
+
+    def loadFile(self, path, format=None, settings=None):
+        """Read and parse path on the loader's worker thread.
+
+        The window stays usable meanwhile and a progress dialog can cancel
+        the load; the scan replaces the current one in showScanFile(). A
+        new load cancels one that hasn't finished. With settings the scan
+        is shown with them instead of its own, see ScanFile.getSettings.
+        """
+        self.loadSettings = settings
+        if self.progressDialog is None:
+            self.progressDialog = QProgressDialog(self)
+            self.progressDialog.setWindowTitle("Open")
+            self.progressDialog.setMinimumDuration(500)
+            self.progressDialog.canceled.connect(self.cancelLoad)
+            # it would show up by itself after the minimum duration otherwise
+            self.progressDialog.reset()
+        self.progressDialog.setLabelText("Reading " + QFileInfo(path).fileName())
+        self.loader.load(path, format)
+        self.progressDialog.setValue(0)
+        
+    def cancelLoad(self):
+        self.loader.cancel()
+        self.message("Open cancelled")
+        
+    def showLoadProgress(self, percent):
+        if self.progressDialog is not None and self.loader.isLoading():
+            self.progressDialog.setValue(min(percent, 99))
             
-            # Otherwise, it's a simple data file without headers - use Import workflow
-            # This handles .dat files with just energy,absorption columns
-            self.fileOpenAsImport(fname)
+    def finishLoad(self):
+        #reset() would report a cancel if it came from the dialog
+        if self.progressDialog is not None:
+            self.progressDialog.canceled.disconnect(self.cancelLoad)
+            self.progressDialog.reset()
+            self.progressDialog.canceled.connect(self.cancelLoad)
             
-        except Exception as e:
-            QMessageBox.critical(self, "Open Error", f"Could not read file: {str(e)}")
+    def showLoadError(self, error):
+        self.finishLoad()
+        QMessageBox.critical(self, "Open Error", error)
+        
+    def showScanFile(self, scan):
+        #the arrays are ready; dialogs about the scan are only shown now
+        self.finishLoad()
+        for warning in scan.warnings:
+            QMessageBox.warning(self, "Open Warning", warning)
+        if self.loadSettings is not None:
+            scan.setSettings(self.loadSettings)
+            self.showScanThrough(scan)
+            return
+        if scan.format == 'ssrl':
+            self.showSSRL(scan)
+        elif scan.format == 'spline':
+            self.showSplineFile(scan)
+        elif not self.showColumns(scan):
             return
+        self.addDocument(scan)
 
     def fileOpenSSRL(self, path):
         """Open SSRL EXAFS Data Collector file (.001) and extract energy, I0, and I1.
@@ -359,72 +496,12 @@ class PySpline(QMainWindow):
           - Raw Y:  'I1' (transmission sample)
         E0 is estimated from the maximum derivative of (I1/I0) vs energy.
         """
-        energies = []
-        i0s = []
-        it_s = []
-        with open(path, 'r') as f:
-            lines = f.readlines()
-        # Find the start of numeric data after the 'Data:' section
-        start_idx = None
-        in_data_names = False
-        for idx, line in enumerate(lines):
-            if line.strip().startswith('Data:'):
-                in_data_names = True
-                continue
-            if in_data_names:
-                # Column names block ends when we encounter a blank line followed by numeric row
-                if line.strip() == '':
-                    # Next non-empty line should be numeric
-                    start_idx = idx + 1
-                    break
-        if start_idx is None:
-            # Fallback: find first line that looks numeric with many columns
-            for idx, line in enumerate(lines):
-                parts = line.strip().split()
-                if len(parts) >= 10:
-                    try:
-                        _ = [float(p) for p in parts[:10]]
-                        start_idx = idx
-                        break
-                    except Exception:
-                        continue
-        if start_idx is None:
-            QMessageBox.critical(self, "Open Error", "Couldn't locate numeric data block in SSRL file.")
-            return
-        for line in lines[start_idx:]:
-            parts = line.strip().split()
-            if len(parts) < 8:
-                continue
-            try:
-                vals = [float(p) for p in parts]
-            except Exception:
-                continue
-            # Indices: 0 RTC, 1 Sum_RTC, 2 Requested, 3 Achieved, 4 I0, 5 I1, 6 I2, 7 I3
-            energies.append(vals[3])
-            i0s.append(vals[4])
-            it_s.append(vals[5])
-
-        if len(energies) < 10:
-            QMessageBox.critical(self, "Open Error", "Not enough numeric rows to load SSRL file.")
-            return
-
-        xdata = energies
-        i0data = i0s
-        ydata = it_s
-
-        # Estimate E0 as max derivative point of transmission ratio
-        t = array(ydata, float) / (array(i0data, float) + 1e-12)
-        x = array(xdata, float)
-        # Use central differences via numpy.gradient
-        try:
-            dt = abs(gradient(t, x))
-        except Exception:
-            # Fallback: simple finite difference on uniform assumption
-            dt = abs(diff(t))
-            x = x[:-1]
-        idx = int(dt.argmax())
-        E0_est = float(x[idx])
-
+        self.loadFile(path, 'ssrl')
+        
+    def showSSRL(self, scan):
+        xdata = scan.xdata
+        E0_est = scan.E0
+        
         # Prompt user to confirm or adjust E0 estimate
         try:
             val, ok = QInputDialog.getDouble(self, "Set E0", "Estimated E0 (eV):", E0_est, 0.0, 1e9, 3)
@@ -434,351 +511,387 @@ class PySpline(QMainWindow):
             # If dialog is unavailable, continue with estimate
             pass
 
-        self.filename = path
-        self.title = QFileInfo(path).baseName()
-        self.comments = ["Imported from SSRL .001"]
+        self.filename = scan.path
+        self.title = scan.title
+        self.comments = scan.comments
         self.E0 = E0_est
 
-        self.resetPlots()
-
         # Choose background window around E0
-        lowx = max(min(xdata), E0_est - 200)
-        highx = min(max(xdata), E0_est + 200)
-        self.setupRawPlot(xdata, ydata, lowx, highx, 2)
-        # Norm plot: two segments, starting at E0 to end
-        self.setupNormPlot(xdata, [E0_est, xdata[-1]], [2])
-        self.i0.setI0Data(xdata, i0data)
-
+        lowx = xdata[0] if xdata[0] > E0_est - 200 else E0_est - 200
+        highx = xdata[-1] if xdata[-1] < E0_est + 200 else E0_est + 200
         kmax = calc.toKSpace(xdata[-1], self.E0)
-        self.setupXAFSPlot(kmax, 0, kmax)
-        self.raw.updatePlot()
+
+        with self.transaction():
+            self.setData(xdata, scan.ydata, scan.i0data)
+            self.resetPlots()
+            self.setupRawPlot(self.spectrum.xdata, self.spectrum.ydata, lowx, highx, 2)
+            # Norm plot: two segments, starting at E0 to end
+            self.setupNormPlot(xdata, [E0_est, xdata[-1]], [2])
+            self.setupXAFSPlot(kmax, 0, kmax)
+            
     def fileStringOpen(self,str):
         
         if str == None:
             return
         
-        self.filename=str
-        file=open(str)
+        self.loadFile(str, 'spline')
         
-#check to see if it has a title
-        line=file.readline()
-        if(line[:5]=='TITLE'):
-            self.title=line[6:-1]
-            line=file.readline()
-            
-#check to see if line is a comment
-        while(line[0]=='#'):
-            self.comments.append(line[2:-1])
-            line=file.readline()
-            
-        # read E0: find a line starting with E0 and parse the numeric value
-        while line and not line.lstrip().upper().startswith('E0'):
-            line = file.readline()
-        if not line:
-            QMessageBox.critical(self, "Open Error", "No E0 line found in file.")
-            file.close()
-            return
-        parts = line.split()
-        e0 = None
-        for tok in parts[1:]:
-            t = tok.replace('eV','').replace('EV','')
-            try:
-                e0 = float(t)
-                break
-            except ValueError:
-                continue
-        if e0 is None:
-            QMessageBox.critical(self, "Open Error", f"Couldn't parse E0 from line: {' '.join(parts)}")
-            file.close()
-            return
-        self.E0 = e0
-
-        # read background bounds and order
-        # Expect a line starting with BACKGROUND lowx (order) highx
-        line = file.readline()
-        while line and not line.lstrip().upper().startswith('BACKGROUND'):
-            line = file.readline()
-        if not line:
-            QMessageBox.critical(self, "Open Error", "No BACKGROUND line found in file.")
-            file.close()
-            return
-        array = line.split()
-        try:
-            rawlowx = float(array[1])
-            rawhighx = float(array[3])
-            raworder = int(array[2].strip('()'))
-        except Exception:
-            QMessageBox.critical(self, "Open Error", f"Couldn't parse BACKGROUND line: {' '.join(array)}")
-            file.close()
-            return
+    def showSplineFile(self, scan):
+        xdata = scan.xdata
+        rawlowx, rawhighx, raworder = scan.background
         
-        # read spline info into markers and orders lists
-        # Expect a line starting with: SPLINE m0 (o0) m1 (o1) ... mN
-        line = file.readline()
-        while line and not line.lstrip().upper().startswith('SPLINE'):
-            line = file.readline()
-        if not line:
-            QMessageBox.critical(self, "Open Error", "No SPLINE line found in file.")
-            file.close()
-            return
-        array = line.split()
-        markers = []
-        orders = []
-        for tok in array[1:]:
-            if tok.startswith('(') and tok.endswith(')'):
-                try:
-                    orders.append(int(tok.strip('()')))
-                except Exception:
-                    pass
-            else:
-                try:
-                    markers.append(float(tok))
-                except Exception:
-                    pass
-        # Ensure we have at least one more marker than orders (segment count)
-        if len(markers) != len(orders) + 1:
-            # Best-effort: if last token may include unit, try to strip
-            if len(markers) > 0 and isinstance(markers[-1], float):
-                pass
-            else:
-                QMessageBox.warning(self, "Open Warning", "Unexpected SPLINE format; results may be incorrect.")
-        
-        # check to see if k-window is specified; if not, we'll default later
-        line = file.readline()
-        window = None
-        if line:
-            array = line.split()
-            if array and array[0].upper() == 'KWIN':
-                try:
-                    window = (float(array[1]), float(array[2]))
-                except Exception:
-                    window = None
-            else:
-                # Keep file pointer where it is for data reading
-                file.seek(file.tell() - len(line))
-       
-        
-        # file stream is now data, read it (robust to headers and comma/space)
-        arrs = self.readArray(file)
-        file.close()
-
-        #arrs looks like:
-        # [ [col1 col2 col3 col4]
-        #   [col1 col2 col3 col4]
-        #   ....
-        # ]]
-        # transpose to get columns in useful format
-
-        data = transpose(arrs)
-        xdata = data[0].tolist()
-        i0data = data[2].tolist()
-        ydata = data[3].tolist()
-
-        self.resetPlots()
+        self.filename = scan.path
+        self.title = scan.title
+        self.comments = scan.comments
+        self.E0 = scan.E0
         
         rawlowx=calc.getClosest(rawlowx,xdata)
         rawhighx=calc.getClosest(rawhighx,xdata)
         
-        self.setupRawPlot(xdata,ydata,rawlowx,rawhighx,raworder)
-        self.setupNormPlot(xdata,markers,orders)
-        self.i0.setI0Data(xdata,i0data)
-        
         kmax = calc.toKSpace(xdata[-1], self.E0)
-        if window is None:
-            window = (0.0, kmax)
-        self.setupXAFSPlot(kmax, window[0], window[1])
-        
-        self.raw.updatePlot()
-#         self.connect(self.raw.plot,PYSIGNAL('positionMessage()'),self.message)
-#         self.connect(self.norm.plot,PYSIGNAL('signalChangedPlot'),self.slotUpdateNormPlot)
-#         self.connect(self.kspace.plot,PYSIGNAL('signalChangedPlot'),self.slotUpdateKSpacePlot)
+        
+        with self.transaction():
+            self.setData(xdata, scan.ydata, scan.i0data)
+            self.resetPlots()
+            self.setupRawPlot(self.spectrum.xdata, self.spectrum.ydata,rawlowx,rawhighx,raworder)
+            self.setupNormPlot(xdata,scan.markers,scan.orders)
+            self.setupXAFSPlot(kmax, scan.kwindow[0], scan.kwindow[1])
     
     def fileImport(self):
-
-        xdata = []
-        ydata = []
-        i0data = []
         
         filename, _ = QFileDialog.getOpenFileName(self, "Import Data", "", "Data Files (*.dat);;All Files (*)")
-        self.filename = filename
-        if not self.filename:
+        if not filename:
             return
             
-        file = open(filename)
-        
-        line = file.readline()
-        while line:
-            # Handle both comma and whitespace separated values
-            if ',' in line:
-                array = [x.strip() for x in line.split(',') if x.strip()]
-            else:
-                array = line.split()
-            
-            if not array:
-                line = file.readline()
-                continue
-                
-            try:
-                # Try to parse as floats; skip header/comment lines
-                # assume ev k i0 raw (4 columns)
-                if len(array) == 4:
-                    xdata.append(float(array[0]))
-                    i0data.append(float(array[2]))
-                    ydata.append(float(array[3]))
-                # assume ev absorption (2 columns)
-                elif len(array) == 2:
-                    xdata.append(float(array[0]))
-                    ydata.append(float(array[1]))
-                    i0data.append(1.0)
-                # assume ev k (also 2 columns, but we treat as ev absorption)
-                else:
-                    xdata.append(float(array[0]))
-                    ydata.append(float(array[1]))
-                    i0data.append(1.0)
-            except (ValueError, IndexError):
-                # Skip lines that can't be parsed as numbers
-                pass
-                
-            line = file.readline()
-        
-        file.close()
-        
-        edgeDialog = EdgeDialog()
-        result = edgeDialog.exec_()
-        
-        if result == QDialog.Rejected:
-            return
-            
-        self.E0 = edgeDialog.getValue()
-        self.title = edgeDialog.getTitle()
-        
-        #check to see if E0 is reasonable!!
-        while (self.E0 < xdata[0]) or (self.E0 > xdata[-1]):
-            errstr = "There appears to be a problem with E0=" + str(self.E0) + ". This value does not fall in the range of your data."
-            QMessageBox.critical(self, "Error with E0", errstr)
-
-            result = edgeDialog.exec_()
-            
-            if result == QDialog.Rejected:
-                return
-                
-            self.E0 = edgeDialog.getValue()
-            self.title = edgeDialog.getTitle()
-                
-        self.resetPlots()
-        self.setupRawPlot(xdata,ydata,xdata[0],xdata[-1],2)
-        self.setupNormPlot(xdata,[self.E0,xdata[-1]],[2])
-        self.i0.setI0Data(xdata,i0data)
-        
-        kmax=calc.toKSpace(xdata[-1],self.E0)
-        self.setupXAFSPlot(kmax,0,kmax)
-        
-        self.raw.updatePlot()
+        self.loadFile(filename, 'columns')
     
     def fileOpenAsImport(self, filename):
         """Open a simple data file (like .dat) using the Import workflow with EdgeDialog.
         This is called by fileOpen when it detects a file without E0/BACKGROUND/SPLINE headers.
         """
+        self.loadFile(filename, 'columns')
+        
+    def showColumns(self, scan):
         try:
-            xdata = []
-            ydata = []
-            i0data = []
-            
-            self.filename = filename
-            
-            try:
-                file = open(filename)
-                
-                line = file.readline()
-                while line:
-                    # Handle both comma and whitespace separated values
-                    if ',' in line:
-                        array = [x.strip() for x in line.split(',') if x.strip()]
-                    else:
-                        array = line.split()
-                    
-                    if not array:
-                        line = file.readline()
-                        continue
-                        
-                    try:
-                        # Try to parse as floats; skip header/comment lines
-                        # assume ev k i0 raw (4 columns)
-                        if len(array) == 4:
-                            xdata.append(float(array[0]))
-                            i0data.append(float(array[2]))
-                            ydata.append(float(array[3]))
-                        # assume ev absorption (2 columns)
-                        elif len(array) == 2:
-                            xdata.append(float(array[0]))
-                            ydata.append(float(array[1]))
-                            i0data.append(1.0)
-                        # assume ev k (also 2 columns, but we treat as ev absorption)
-                        else:
-                            xdata.append(float(array[0]))
-                            ydata.append(float(array[1]))
-                            i0data.append(1.0)
-                    except (ValueError, IndexError):
-                        # Skip lines that can't be parsed as numbers
-                        pass
-                        
-                    line = file.readline()
-                
-                file.close()
-            except Exception as e:
-                QMessageBox.critical(self, "Import Error", f"Could not read file: {str(e)}")
-                return
-            
-            if not xdata:
-                QMessageBox.critical(self, "Import Error", "No valid data found in file.")
-                return
+            xdata = scan.xdata
             
             # Show EdgeDialog for E0 selection
+            from .edge import EdgeDialog
             edgeDialog = EdgeDialog()
             result = edgeDialog.exec_()
             
             if result == QDialog.Rejected:
-                return
+                return False
                 
-            self.E0 = edgeDialog.getValue()
-            self.title = edgeDialog.getTitle()
+            E0 = edgeDialog.getValue()
             
             # Check to see if E0 is reasonable
-            while (self.E0 < xdata[0]) or (self.E0 > xdata[-1]):
-                errstr = "There appears to be a problem with E0=" + str(self.E0) + ". This value does not fall in the range of your data."
+            while (E0 < xdata[0]) or (E0 > xdata[-1]):
+                errstr = "There appears to be a problem with E0=" + str(E0) + ". This value does not fall in the range of your data."
                 QMessageBox.critical(self, "Error with E0", errstr)
 
                 result = edgeDialog.exec_()
                 
                 if result == QDialog.Rejected:
-                    return
-                    
-                self.E0 = edgeDialog.getValue()
-                self.title = edgeDialog.getTitle()
+                    return False
                     
-            self.resetPlots()
-            self.setupRawPlot(xdata, ydata, xdata[0], xdata[-1], 2)
-            self.setupNormPlot(xdata, [self.E0, xdata[-1]], [2])
-            self.i0.setI0Data(xdata, i0data)
+                E0 = edgeDialog.getValue()
             
+            self.filename = scan.path
+            self.title = edgeDialog.getTitle()
+            self.comments = []
+            self.E0 = E0
             kmax = calc.toKSpace(xdata[-1], self.E0)
-            self.setupXAFSPlot(kmax, 0, kmax)
             
-            self.raw.updatePlot()
+            with self.transaction():
+                self.setData(xdata, scan.ydata, scan.i0data)
+                self.resetPlots()
+                self.setupRawPlot(self.spectrum.xdata, self.spectrum.ydata, xdata[0], xdata[-1], 2)
+                self.setupNormPlot(xdata, [self.E0, xdata[-1]], [2])
+                self.setupXAFSPlot(kmax, 0, kmax)
+            return True
         except Exception as e:
             import traceback
             traceback.print_exc()
             QMessageBox.critical(self, "Setup Error", f"Error during file open: {type(e).__name__}: {str(e)}")
+            return False
+    
+    def getSettings(self):
+        """E0, background, knots and k window of the scan shown, as
+        ScanFile.getSettings() gives them; None without a scan."""
+        if self.E0 is None or not self.hasWindow('norm'):
+            return None
+        rawknots = self.raw.plot.knots
+        kknots = self.kspace.plot.knots
+        if len(rawknots) < 2 or len(self.norm.plot.knots) < 2 or len(kknots) < 2:
+            return None
+        background = (rawknots[0].getPosition(), rawknots[1].getPosition(), self.raw.getSpinBoxValue())
+        markers = tuple(self.norm.plot.knotset.positions.tolist())
+        kwindow = (kknots[0].getPosition(), kknots[1].getPosition())
+        return (self.E0, background, markers, tuple(self.norm.getOrders()), kwindow)
+        
+    def getScanList(self):
+        #the scans of the shown file's directory; another directory starts a new list
+        path = abspath(self.filename)
+        if self.scans is None or path not in self.scans.paths:
+            self.prefetcher.cancel()
+            self.prefetching = None
+            self.scans = ScanList(listScans(path))
+        self.scans.setCurrent(path)
+        return self.scans
+        
+    def nextScan(self):
+        self.stepScan(1)
+        
+    def previousScan(self):
+        self.stepScan(-1)
+        
+    def stepScan(self, step):
+        """Show the scan step files away in the directory, with the E0,
+        background, knots and k window of the one shown now.
+
+        A scan that was read ahead with these settings is shown at once;
+        any other is loaded like an opened file.
+        """
+        settings = self.getSettings()
+        if not self.filename or settings is None:
+            self.message("Open a scan first")
+            return
+        scans = self.getScanList()
+        path = scans.step(step)
+        if path is None:
+            self.message("No more scans in this directory")
+            return
+        self.openScanThrough(path, settings)
+        
+    def openScanThrough(self, path, settings):
+        #path with settings; at once if it was read ahead with them
+        prefetched = self.getScanList().take(path, settings)
+        if prefetched is None:
+            self.loadFile(path, settings=settings)
+            return
+        self.showScanThrough(*prefetched)
+        
+    def showScanThrough(self, scan, spectrum=None):
+        #a scan with settings of another; spectrum holds its results if read ahead
+        if not scan.title:
+            scan.title = basename(scan.path).split('.')[0]
+        self.showSplineFile(scan)
+        if spectrum is not None:
+            self.pipeline.take(spectrum.pipeline)
+        # the document steps through the run, keeping its links
+        if self.document is not None:
+            self.document.setScan(scan)
+            self.updateWorkspaceView()
+        else:
+            self.addDocument(scan)
+        scans = self.getScanList()
+        self.message("Scan %i of %i: %s" % (scans.index + 1, len(scans.paths), basename(scan.path)))
+        
+    def startPrefetch(self):
+        #read the scans next in line while nothing else is going on
+        settings = self.getSettings()
+        if not self.filename or settings is None or self.transactionDepth or self.loader.isLoading():
+            return
+        if not self.runner.isIdle():
+            self.prefetchTimer.start(PREFETCH_MS)
+            return
+        scans = self.getScanList()
+        paths = [path for path in scans.getAhead() if not scans.has(path, settings)]
+        # jobs already under way for the same scans are left to finish
+        if not paths or ((tuple(paths), settings) == self.prefetching and not self.prefetcher.isIdle()):
             return
+        self.prefetching = (tuple(paths), settings)
+        self.prefetcher.prefetch(paths, settings)
+        
+    def keepPrefetched(self, path, settings, result):
+        if self.scans is not None and path in self.scans.paths:
+            self.scans.put(path, settings, *result)
+    
+    def addDocument(self, scan):
+        #the scan just shown joins the workspace
+        settings = self.getSettings()
+        if settings is None:
+            return
+        scan.title = self.title
+        scan.comments = self.comments
+        scan.setSettings(settings)
+        if self.workspace is None:
+            from .workspace import Workspace
+            self.workspace = Workspace()
+        self.document = self.workspace.add(scan)
+        self.updateWorkspaceView()
+        
+    def showDocument(self, document):
+        """Show a scan of the workspace; at once if its results are current."""
+        self.document = document
+        self.showSplineFile(document.scan)
+        if document.results is not None:
+            self.pipeline.take(document.results)
+        self.updateWorkspaceView()
+        
+    def syncWorkspace(self):
+        """Keep the full results of the scan shown with its document and pass
+        the settings it is linked for on to the other documents, which are
+        then recomputed in worker processes."""
+        settings = self.getSettings()
+        if self.document is None or settings is None:
+            return
+        self.document.scan.title = self.title
+        self.document.scan.comments = self.comments
+        changed = self.workspace.setSettings(self.document, settings, self.pipeline.snapshot())
+        if changed:
+            self.computeDocuments(changed)
+            self.updateWorkspaceView()
+            
+    def computeDocuments(self, documents):
+        #recompute documents in the worker processes
+        if self.workspaceRunner is None:
+            from .pool import WorkspaceRunner
+            self.workspaceRunner = WorkspaceRunner(self)
+            self.workspaceRunner.computed.connect(lambda document: self.updateWorkspaceView())
+            self.workspaceRunner.failed.connect(self.message)
+        self.workspaceRunner.compute(documents)
+            
+    def getSelectedDocuments(self):
+        #the documents selected in the workspace view, or the one shown
+        documents = []
+        if self.workspaceView is not None:
+            documents = self.workspaceView.getSelected()
+        if not documents and self.document is not None:
+            documents = [self.document]
+        return documents
+        
+    def linkDocuments(self, kind):
+        """Link kind of the selected documents, taking it from the one shown
+        if it is among them."""
+        documents = self.getSelectedDocuments()
+        if len(documents) < 2:
+            self.message("Select two or more scans in the workspace to link")
+            return
+        if self.document in documents:
+            documents.remove(self.document)
+            documents.insert(0, self.document)
+        changed = self.workspace.link(documents, kind)
+        if changed:
+            self.computeDocuments(changed)
+        self.updateWorkspaceView()
+        
+    def unlinkDocuments(self):
+        if self.workspace is None:
+            return
+        from .workspace import KINDS
+        for kind in KINDS:
+            self.workspace.unlink(self.getSelectedDocuments(), kind)
+        self.updateWorkspaceView()
+        
+    def closeDocuments(self):
+        #drop the selected scans from the workspace; if the one shown goes,
+        #the last one left is shown instead
+        if self.workspace is None:
+            return
+        for document in self.getSelectedDocuments():
+            self.workspace.remove(document)
+            if document is self.document:
+                self.document = None
+        if self.document is None and self.workspace.documents:
+            self.showDocument(self.workspace.documents[-1])
+        self.updateWorkspaceView()
+        
+    def updateSeries(self):
+        """Bring the time series up to the settings of the scan shown.
+
+        Its own row is taken from the pipeline at once; the other scans of
+        the directory are computed in batches in worker processes, nearest
+        to it first. Rows keep their old results until the new ones come.
+        """
+        window = self.windows.get('heatmap')
+        settings = self.getSettings()
+        if window is None or not window.isVisible() or not self.filename or settings is None:
+            return
+        if self.pipeline.get('step') != 1 or not self.pipeline.isReady('fft') or self.pipeline.isDirty('fft'):
+            return
+        scans = self.getScanList()
+        if self.series is None or self.series.paths != scans.paths:
+            from .stack import SpectrumStack, makeGrids
+            self.series = SpectrumStack(scans.paths, makeGrids(self.pipeline))
+            window.setStack(self.series)
+        self.series.setSettings(settings)
+        if scans.index >= 0:
+            self.series.setRow(scans.index, self.pipeline, settings)
+            window.setCurrentScan(scans.index)
+        if self.stackRunner is None:
+            from .pool import StackRunner
+            self.stackRunner = StackRunner(self)
+            self.stackRunner.rowsReady.connect(self.showSeriesRows)
+            self.stackRunner.failed.connect(self.message)
+        self.stackRunner.compute(self.series, max(scans.index, 0))
+        
+    def showSeriesRows(self, rows):
+        if self.hasWindow('heatmap'):
+            self.windows['heatmap'].showRows(rows)
+        
+    def cancelSeries(self):
+        #the time series was hidden; batches not started yet aren't needed
+        if self.stackRunner is not None:
+            self.stackRunner.cancel()
+        
+    def showSeriesScan(self, row):
+        #the scan picked in the time series, with the settings of the one shown
+        settings = self.getSettings()
+        if self.series is None or settings is None:
+            return
+        path = self.series.paths[row]
+        if path != abspath(self.filename):
+            self.openScanThrough(path, settings)
+        
+    def getOverlay(self, name):
+        """Curves of stage name ('chi' or 'fft') of the other scans of the
+        workspace whose results are current, for OverlayItem.setCurves()."""
+        from .overlay import overlayColor
+        curves = []
+        if self.workspace is None or not self.workspaceOverlayAction.isChecked():
+            return curves
+        for i, document in enumerate(self.workspace.documents):
+            results = document.results
+            if document is self.document or results is None or results.isDirty(name):
+                continue
+            xdata, ydata = results.get(name)
+            curves.append((document, xdata, ydata, overlayColor(i)))
+        return curves
+        
+    def updateOverlay(self):
+        #the k-space and FFT windows replot once, whatever changed
+        with replotBatch():
+            if self.hasWindow('kspace'):
+                self.kspace.setOverlay(self.getOverlay('chi'))
+            if self.hasWindow('fft'):
+                self.fft.setOverlay(self.getOverlay('fft'))
+        
+    def updateWorkspaceView(self):
+        #the dock is made once there are two scans to choose from; the
+        #overlays show the same scans
+        self.updateOverlay()
+        if self.workspaceView is None:
+            if self.workspace is None or len(self.workspace.documents) < 2:
+                return
+            from .workspaceview import WorkspaceView
+            self.workspaceView = WorkspaceView(self)
+            self.workspaceView.activated.connect(self.showDocument)
+            self.addDockWidget(Qt.RightDockWidgetArea, self.workspaceView)
+        jobs = self.workspaceRunner.jobs if self.workspaceRunner is not None else {}
+        self.workspaceView.setDocuments(self.workspace, self.document, jobs)
     
     def resetPlots(self):
         #in the event that we are opening a file when one is open,
         #makers and curves need to be cleared
         
+        self.previewStep = 0
         self.raw.plot.resetPlot()
         self.norm.plot.resetPlot()
         self.kspace.plot.resetPlot()
-        self.fft.plot.resetPlot()
+        if self.hasWindow('fft'):
+            self.fft.plot.resetPlot()
         
     def setupRawPlot(self,xdata,ydata,lowx,highx,order):
         
@@ -792,31 +905,25 @@ class PySpline(QMainWindow):
         # Set E0 first so updateKnots doesn't crash with None
         self.norm.setE0(self.E0)
         
-        # Set flag to prevent knot redistribution during file loading
-        self.norm._loading_from_file = True
-        
-        # make sure scale of plot is reasonable
-        self.norm.plot.setAxisScale(QwtPlot.xBottom, xdata[0], xdata[-1])
-        
-        # adjust markers to closest data positions
-        for i in range(len(markers)):
-            temp = calc.getClosest(markers[i], xdata)
-            self.norm.plot.addKnot(temp)
+        # the knots given are used as they are; a transaction keeps the
+        # knot count change from redistributing them
+        with self.transaction():
+            # make sure scale of plot is reasonable
+            self.norm.plot.setAxisScale(QwtPlot.xBottom, xdata[0], xdata[-1])
             
-        # Allow first knot to move down to E0-50 instead of exactly E0
-        # This gives more flexibility while still keeping it near the edge
-        lower_bound = xdata[0] if xdata[0] > self.E0 - 50 else self.E0 - 50
-        self.norm.plot.addBoundsExceptions(0, 0, lower_bound)
-        
-        # set number of knots in normplot window (this creates order spinboxes)
-        self.norm.setNumKnots(len(markers))
-        self.norm.setOrders(orders)
-        
-        # Clear the flag
-        self.norm._loading_from_file = False
-        
-        # NOTE: Don't call norm.updatePlot() here - the data hasn't been set yet!
-        # The data will be set when raw.updatePlot() runs and triggers updateNormPlot()
+            # adjust markers to closest data positions
+            for i in range(len(markers)):
+                temp = calc.getClosest(markers[i], xdata)
+                self.norm.plot.addKnot(temp)
+                
+            # Allow first knot to move down to E0-50 instead of exactly E0
+            # This gives more flexibility while still keeping it near the edge
+            lower_bound = xdata[0] if xdata[0] > self.E0 - 50 else self.E0 - 50
+            self.norm.plot.addBoundsExceptions(0, 0, lower_bound)
+            
+            # set number of knots in normplot window (this creates order spinboxes)
+            self.norm.setNumKnots(len(markers))
+            self.norm.setOrders(orders)
        
     def setupXAFSPlot(self,max,pos1,pos2):
         
@@ -872,85 +979,20 @@ class PySpline(QMainWindow):
             reply = QMessageBox.question(self, "File Exists", f"The file named {qstr} exists. Do you want to overwrite this file?", QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
             if reply != QMessageBox.Yes:
                 return
+        self.finishUpdate()
         file=open(qstr, "w")
         file.write("R FFT\n")
 
-        rdata=self.fft.rdata
-        fftdata=self.fft.fftdata
+        #the FFT window may never have been opened
+        rdata, fftdata = self.pipeline.get('fft')
         
         for i in range(len(rdata)):
             file.write("%7.3f %7.3f\n"%(rdata[i],fftdata[i]))
         file.close()
                
     def save(self,string):
-        file=open(string,"w")
-
-        #write title and comments
-        file.write("TITLE "+self.title+"\n")
-        for line in self.comments:
-            file.write("# "+line+"\n")
-            
-        #write E0
-        file.write("E0 %.3f\n" % self.E0)
-
-        #get background marker information
-        markers=self.raw.plot.knots
-        lowx=markers[0].getPosition()
-        highx=markers[1].getPosition()
-        order=self.raw.getSpinBoxValue()
-        
-        #write background info
-        #file.write("BACKGROUND "+str(lowx)+" ("+str(order)+") "+str(highx)+" eV\n")
-        file.write("BACKGROUND %.5f (%i) %.5f eV\n" % (lowx,order,highx))
-
-        #write spline segs info
-        file.write("SPLINE ")
-        segs=self.norm.getSegs()
-        for seg in segs:
-            file.write("%.5f" % seg[1]) #lower bound
-            file.write(" ("+str(seg[0]-1)+") ") #order
-        file.write("%.5f eV\n" % segs[-1][2]) #higher bound of last segment
-
-        #write windowing info
-        knots=self.kspace.plot.knots
-        min=knots[0].getPosition()
-        max=knots[1].getPosition()
-        
-        file.write("KWIN %.5f %.5f \n" % (min,max))
-        
-        #header string
-        file.write("EV K IO RAW BACKGROND NORMAL SPLINE XAFS\n")
-
-        #actual data, pad kdata and xafsdata with zeros
-        xdata=self.raw.xdata
-        i0data=self.i0.ydata
-        ydata=self.raw.ydata
-        background=self.raw.background
-        normdata=self.norm.normdata
-        splinedata=self.norm.splinedata
-        xafsdata=self.kspace.xafsdata
-        tempk=self.kspace.kdata
-        
-        datasize = len(xdata)
-        kdata = zeros((datasize), float)
-        kdata[-len(tempk):] = tempk
-        xafs = zeros((datasize), float)
-        xafs[-len(xafsdata):] = xafsdata
-
-        data=[xdata,kdata,i0data,ydata,background,
-                    normdata,splinedata,xafs]
-        data2=array(data)
-        datat=transpose(data2).tolist()
-
-        for row in datat:
-            for i in range(len(row)):
-                file.write("%.6f" % row[i])
-                if (i == len(row) - 1):
-                    file.write("\n")
-                else:
-                    file.write(",")
-        
-        file.close()
+        self.finishUpdate()
+        self.spectrum.save(string)
         
     def filePrint(self):
 
@@ -975,6 +1017,7 @@ class PySpline(QMainWindow):
             printer.setResolution(300)
         except Exception:
             pass
+        self.finishUpdate()
         painter=QPainter(printer)
         self.printPlot(painter)
         painter.end()
@@ -1110,6 +1153,7 @@ class PySpline(QMainWindow):
             yoffset+=(fontheight+fontleading)
         
     def editParameters(self):
+        from .edge import EdgeDialog
         edgeDialog = EdgeDialog()
         edgeDialog.slotCheckBoxToggled(True)
         edgeDialog.checkBox1.setChecked(True)
@@ -1150,6 +1194,7 @@ class PySpline(QMainWindow):
         self.updateNormPlot()
             
     def editComments(self):
+        from .comments import Comments
         com = Comments()
         
         comment_str = ""
@@ -1169,6 +1214,133 @@ class PySpline(QMainWindow):
         for line in text.splitlines():
             self.comments.append(line)
         
+    def calcUncertainty(self):
+        #monte-carlo percentile bands of chi(k) and |FT| for the current parameters
+        self.finishUpdate()
+        xdata = self.raw.xdata
+        if len(xdata) == 0 or len(self.raw.plot.knots) < 2 or len(self.kspace.plot.knots) < 2:
+            return
+        
+        segs = self.norm.getSegs()
+        if not segs:
+            return
+        
+        lindex = calc.getClosestIndex(self.raw.plot.knots[0].getPosition(), xdata)
+        hindex = calc.getClosestIndex(self.raw.plot.knots[1].getPosition(), xdata)
+        order = self.raw.getSpinBoxValue() + 1
+        kmin = self.kspace.plot.knots[0].getPosition()
+        kmax = self.kspace.plot.knots[1].getPosition()
+        
+        start = time()
+        from . import montecarlo
+        kdata, kbands, rdata, rbands, fallbacks = montecarlo.calcBands(xdata, self.raw.ydata, self.E0,
+                                                                       lindex, hindex, order, segs,
+                                                                       kmin, kmax)
+        
+        self.kspace.setBands(kdata, kbands[0], kbands[-1])
+        self.fft.setBands(rdata, rbands[0], rbands[-1])
+        message = "Uncertainty bands (2.5-97.5%%) calculated in %.2f s" % (time() - start)
+        if fallbacks:
+            message += ", %i groups kept the nominal knots" % fallbacks
+        self.message(message)
+        
+    def optimizeKnots(self, orders=False):
+        #place the spline knots (and orders) to minimize the low-R part of the FFT
+        self.finishUpdate()
+        knots = self.norm.plot.knots
+        if len(self.norm.xdata) == 0 or len(knots) < 2 or len(self.kspace.plot.knots) < 2:
+            return
+        
+        segs = self.norm.getSegs()
+        if not segs:
+            return
+        
+        kmin = self.kspace.plot.knots[0].getPosition()
+        kmax = self.kspace.plot.knots[1].getPosition()
+        knotset = self.norm.plot.knotset
+        locked = knotset.locked.copy()
+        locked[[0, -1]] = True
+        
+        start = time()
+        from . import knotopt
+        segs, value = knotopt.optimizeKnots(self.norm.xdata, self.norm.ydata, self.E0, segs,
+                                            kmin, kmax, limits=self.norm.plot.getKnotLimits(),
+                                            locked=locked.tolist(), orders=orders)
+        
+        knotset.positions = array([seg[1] for seg in segs] + [segs[-1][2]], float)
+        self.norm.plot.fixKnotsBounds()
+        self.norm.plot.syncKnots()
+        if orders:
+            self.norm.setOrders([seg[0] - 1 for seg in segs])
+        self.norm.updatePlot()
+        
+        self.message("Knots optimized in %.2f s (low-R |FT|^2 %.4g)" % (time() - start, value))
+        
+    def selectSplineGCV(self):
+        #rank numbers of knots and segment orders by generalized cross-validation
+        self.finishUpdate()
+        knots = self.norm.plot.knots
+        if len(self.norm.xdata) == 0 or len(knots) < 2 or len(self.kspace.plot.knots) < 2:
+            return
+        
+        first = calc.getClosest(knots[0].getPosition(), self.norm.xdata)
+        last = calc.getClosest(knots[-1].getPosition(), self.norm.xdata)
+        
+        #keep the spline from following the EXAFS itself
+        kmin = self.kspace.plot.knots[0].getPosition()
+        kmax = self.kspace.plot.knots[1].getPosition()
+        from . import gcv
+        
+        start = time()
+        results = gcv.rankSplines(self.norm.xdata, self.norm.ydata, self.E0, first, last,
+                                  kmin=kmin, kmax=kmax)
+        elapsed = time() - start
+        if not results:
+            self.message("No spline configuration could be scored")
+            return
+        
+        text = "Best spline configurations (%i scored in %.2f s):\n\n" % (len(results), elapsed)
+        for score, num, orders in results[:5]:
+            text += "%i knots, orders %s: GCV %.4g\n" % (num, " ".join([str(o) for o in orders]), score)
+        text += "\nApply the best one?"
+        
+        reply = QMessageBox.question(self, "Spline GCV", text, QMessageBox.Yes | QMessageBox.No, QMessageBox.Yes)
+        if reply != QMessageBox.Yes:
+            return
+        
+        score, num, orders = results[0]
+        with self.transaction():
+            self.norm.setNumKnots(num)
+            self.norm.updateKnots()
+            self.norm.setOrders(orders)
+        
+    def fitPreEdgePeaks(self):
+        #gaussian pre-edge peaks on the normalized data of the current scan
+        self.finishUpdate()
+        if len(self.norm.xdata) == 0 or not self.E0:
+            return
+        
+        text, ok = QInputDialog.getText(self, "Pre-edge Peaks", "Peak energies (eV):")
+        if not ok:
+            return
+        try:
+            centers = [float(c) for c in text.replace(',', ' ').split()]
+        except ValueError:
+            self.message("Peak energies must be numbers")
+            return
+        if not centers:
+            return
+        
+        window = (min(centers) - 10.0, self.E0 + 10.0)
+        from . import preedge
+        centroids, areas, params, chisq = preedge.fitPreEdge(self.norm.xdata, [self.norm.normdata],
+                                                             centers, window, self.E0, workers=1)
+        
+        text = "Window %.1f to %.1f eV, chi^2 %.4g\n\n" % (window[0], window[1], chisq[0])
+        for j in range(len(centers)):
+            text += "Peak %i: centroid %.3f eV, area %.5f\n" % (j + 1, centroids[0][j], areas[0][j])
+        QMessageBox.information(self, "Pre-edge Peaks", text)
+        
     def fileExit(self):
         self.close()
 
@@ -1179,89 +1351,200 @@ class PySpline(QMainWindow):
 ##        print "Form1.helpContents(): Not implemented yet"
 
     def helpAbout(self):
+        from .aboutbox import AboutBox
         self.box=AboutBox()
         self.box.show()
         
     def updateNormPlot(self):
-        # Guard: ensure raw plot has computed background first
-        ydata = getattr(self.raw, 'ydata', [])
-        xdata = getattr(self.raw, 'xdata', [])
-        background = getattr(self.raw, 'background', [])
-        
-        if not ydata or not xdata or not background:
-            return
-        if len(ydata) != len(background):
+        # Guard: ensure raw plot has set up the background first
+        if not self.pipeline.hasParams('xdata', 'ydata', 'bgparams'):
             return
-            
-        tempnorm = []
-        for i in range(len(ydata)):
-            tempnorm.append(ydata[i] - background[i])
-            
-        self.norm.setNormData(xdata, tempnorm, self.E0)
+        
+        # E0 may have been edited since the data was loaded
+        self.norm.setE0(self.E0)
+        # knots snap to the grid right away; the data follows with the results
+        if self.norm.xdata is not self.raw.xdata:
+            self.norm.setGrid(self.raw.xdata, self.E0)
         self.norm.updatePlot()
+        self.requestUpdate()
+        
     def updateXAFSPlot(self):
         # Ensure we have at least two knots on the norm plot
         normknots = getattr(self.norm.plot, 'knots', [])
         if len(normknots) < 2:
             return
 
-        self.kspace.clearFixedKnots()
-
-        # Add fixed vertical markers at the same positions in k-space
-        for knot in normknots:
-            pos = knot.getPosition()
-            kpos = calc.toKSpace(pos, self.E0)
-            try:
-                self.kspace.addFixedKnot(kpos)
-            except Exception:
-                pass
-
-        xdata = list(getattr(self.raw, 'xdata', []))
-        normdata = getattr(self.norm, 'normdata', [])
-        splinedata = getattr(self.norm, 'splinedata', [])
-
-        if not xdata or not normdata or not splinedata:
-            return
-
-        # generate kdata
-        kdata = [calc.toKSpace(x, self.E0) for x in xdata]
+        # fixed vertical markers at the same positions in k-space
+        self.kspace.setFixedKnots([calc.toKSpace(knot.getPosition(), self.E0)
+                                   for knot in normknots])
 
-        # find index of first x >= E0 safely
-        k0index = 0
-        while k0index < len(xdata) and xdata[k0index] < self.E0:
-            k0index += 1
-        if k0index >= len(xdata):
-            # E0 is beyond data range
-            return
-
-        xafsdata = calc.calcXAFS(normdata[k0index:], splinedata[k0index:], kdata[k0index:])
-        if not xafsdata:
-            return
-
-        self.kspace.setXAFSData(kdata[k0index:], xafsdata)
-
-        # Trigger FFT update only when K-space data is ready
-        try:
-            self.updateFFTPlot()
-        except Exception:
-            pass
+        # picks up the k window as well
+        self.updateFFTPlot()
         
     def updateFFTPlot(self):
         
         knots=self.kspace.plot.knots
-        kmin=knots[0].getPosition()
-        kmax=knots[1].getPosition()
-        
-        kdata=self.kspace.kdata
-        xafsdata=self.kspace.xafsdata
+        if len(knots) >= 2:
+            kmin=knots[0].getPosition()
+            kmax=knots[1].getPosition()
+        
+            # a k-window change only dirties the FFT stage
+            self.pipeline.setParam('kwindow', (kmin, kmax))
+        self.requestUpdate()
+        
+    @contextmanager
+    def transaction(self):
+        """Apply a group of data, knot and order changes as one.
+
+        Signals of the plot windows and their controls are blocked inside
+        it, so nothing is redistributed, recomputed or redrawn on the way;
+        when the outermost transaction ends the raw plot sends the single
+        update that carries everything down the chain.
+        """
+        self.transactionDepth += 1
+        try:
+            #loading builds the norm and k windows; their knots are parameters
+            objects = [self.raw, self.raw.plot, self.raw.spinBox,
+                       self.norm, self.norm.plot, self.norm.spinBoxes, self.kspace.plot]
+            if self.hasWindow('fft'):
+                objects.append(self.fft.plot)
+            with blockedUpdates(*objects):
+                yield
+        finally:
+            self.transactionDepth -= 1
+        if self.transactionDepth == 0:
+            self.raw.updatePlot()
         
-        fftdata,DR=calc.calcFFT(kdata,xafsdata,kmin,kmax)
+    def requestUpdate(self):
+        #a transaction asks for one update when it's done
+        if self.transactionDepth:
+            return
+        if not self.requestTimer.isActive():
+            self.requestTimer.start(0)
+        
+    def isDragging(self):
+        #k-window drags only touch the FFT, so they don't need a preview
+        return (self.raw.plot.mode == 'MOVING_MARKER' or
+                (self.hasWindow('norm') and self.norm.plot.mode == 'MOVING_MARKER'))
+        
+    def startUpdate(self, full=False):
+        #while background or spline knots are dragged, evaluate a decimated
+        #preview; the release evaluates the full grid again
+        step = 1
+        if not full and self.isDragging():
+            self.adaptPreview()
+            if self.previewStep < 1:
+                self.previewStep = len(self.raw.xdata) // PREVIEW_POINTS or 1
+            step = self.previewStep
+        self.pipeline.setParam('step', step)
+        self.runner.request()
+        
+    def finishUpdate(self):
+        #wait for the full results of every change made so far
+        if self.requestTimer.isActive() or self.pipeline.get('step') != 1:
+            self.requestTimer.stop()
+            self.startUpdate(full=True)
+        self.runner.wait()
+        
+    def adaptPreview(self):
+        #scale the decimation so a preview takes about PREVIEW_MS, using the
+        #last timed job whether its results were used or not
+        snapshot = self.runner.measured
+        if snapshot is None or snapshot is self.adaptedFrom:
+            return
+        self.adaptedFrom = snapshot
+        step = snapshot.get('step')
+        # a full job is only a first estimate; it may have redone just the FFT
+        if step == 1 and self.previewStep >= 1:
+            return
+        scale = self.runner.elapsed * 1000.0 / PREVIEW_MS
+        if scale > 1.5 or scale < 0.5 or self.previewStep < 1:
+            # at least every point, at most every hundredth
+            limit = len(self.raw.xdata) // 100 or 1
+            self.previewStep = int(clip(round(step * scale), 1, limit))
+        
+    def speculate(self, index):
+        #the spline knot under the cursor changed; -1 when there's none
+        self.speculateKnot = index
+        self.runner.cancelSpeculation()
+        if index < 0:
+            self.speculateTimer.stop()
+        else:
+            self.speculateTimer.start(SPECULATE_MS)
+            
+    def startSpeculation(self):
+        """Precompute the spline, chi(k) and FFT for nudges of the hovered knot.
+
+        A release after a small drag snaps the knot to one of the nearest
+        data points, so those positions are evaluated on the worker while it
+        is idle; the real update then finds everything in the stage caches.
+        Any real request cancels the speculation. It is skipped when one
+        evaluation takes longer than SPECULATE_LIMIT, since a running stage
+        can't be interrupted.
+        """
+        if self.speculateKnot < 0 or not self.hasWindow('norm') or self.isDragging():
+            return
+        if self.transactionDepth or self.requestTimer.isActive() or not self.runner.isIdle():
+            #real work first
+            self.speculateTimer.start(SPECULATE_MS)
+            return
+        if (self.pipeline.get('step') != 1 or self.runner.elapsed > SPECULATE_LIMIT or
+                self.pipeline.isDirty('fft') or not self.pipeline.isReady('fft')):
+            return
         
-        rdata=[]
-        for i in range(len(fftdata)):
-            rdata.append(i*DR)
+        snapshots = []
+        for segs in self.norm.getNudges(self.speculateKnot, SPECULATE_POINTS):
+            snapshot = self.pipeline.snapshot()
+            snapshot.setParam('segs', segs)
+            snapshots.append(snapshot)
+        self.runner.speculate(snapshots, ('spline', 'chi', 'fft'))
+        
+    def showResults(self):
+        #push every stage that has a new result to its window, repainting
+        #each window once at the end
+        with replotBatch():
+            self.showStages()
+        #the knot may have moved; speculate around where it is now
+        if self.speculateKnot >= 0 and self.pipeline.get('step') == 1:
+            self.speculateTimer.start(SPECULATE_MS)
+        #the next scans are read with the settings that are final for now
+        if self.pipeline.get('step') == 1:
+            self.syncWorkspace()
+            self.prefetchTimer.start(PREFETCH_MS)
+            if self.hasWindow('heatmap'):
+                self.seriesTimer.start(SERIES_MS)
             
-        self.fft.setFFTData(rdata,fftdata)
+    def showStages(self):
+        done = [name for name in pipeline.STAGES if not self.pipeline.isDirty(name)]
+        full = self.pipeline.get('step') == 1
+        
+        if 'background' in done:
+            self.raw.showBackground()
+        
+        # the norm window keeps the full grid its knots snap to
+        if 'normalized' in done and full:
+            version = self.pipeline.getVersion('normalized')
+            if self.shownVersions.get('normalized') != version:
+                self.shownVersions['normalized'] = version
+                self.norm.setNormData(self.raw.xdata, self.pipeline.get('normalized'), self.E0)
+        
+        if 'spline' in done:
+            self.norm.showSpline()
+        
+        if 'chi' in done:
+            kdata, xafsdata = self.pipeline.get('chi')
+            version = self.pipeline.getVersion('chi')
+            if len(xafsdata) and self.shownVersions.get('chi') != version:
+                self.shownVersions['chi'] = version
+                self.kspace.setXAFSData(kdata, xafsdata)
+        
+        # the FFT window is built when its first result arrives, unless hidden
+        if 'fft' in done and (self.hasWindow('fft') or self.windowFFTAction.isChecked()):
+            rdata, fftdata = self.pipeline.get('fft')
+            version = self.pipeline.getVersion('fft')
+            if self.shownVersions.get('fft') != version:
+                self.shownVersions['fft'] = version
+                self.fft.setFFTData(rdata, fftdata)
 #         dmax=max(self.fftdata)
 #         self.fft.plot.setAxisScale(QwtPlot.yLeft,0,dmax)
         
@@ -1393,17 +1676,6 @@ class PySpline(QMainWindow):
 #         #all setup should be done, but scale axis
 #         self.fft.plot.setAxisScale(QwtPlot.xBottom,0,5)
 
-#     def calcVictoreen(self,kdata,C,D,e0):
-#         data=[]
-#         
-#         for k in kdata:
-#             ev=fromKSpace(k,e0)
-#             Lambda=HC/ev
-#             temp=C*pow(Lambda,3)-D*pow(Lambda,4)
-#             data.append(temp)
-#             
-#         return data
-    
     def message(self,string):
             try:
                 self.statusBar().showMessage(string)
@@ -1438,6 +1710,23 @@ class PySpline(QMainWindow):
                 pass
         self.fileSaveAsAction = QAction("Save As", self)
         self.fileExportFFTAction = QAction("Export FFT", self)
+        self.fileNextScanAction = QAction("Next Scan", self)
+        self.fileNextScanAction.setShortcut(QKeySequence("Ctrl+PgDown"))
+        self.filePreviousScanAction = QAction("Previous Scan", self)
+        self.filePreviousScanAction.setShortcut(QKeySequence("Ctrl+PgUp"))
+        self.workspaceLinkActions = dict([(kind, QAction(text, self)) for kind, text in
+                                          (('background', "Link Background"),
+                                           ('knots', "Link Knots"),
+                                           ('kwindow', "Link K-window"))])
+        self.workspaceUnlinkAction = QAction("Unlink", self)
+        self.workspaceCloseAction = QAction("Close Scan", self)
+        self.workspaceOverlayAction = QAction("Overlay Scans", self)
+        self.workspaceOverlayAction.setCheckable(True)
+        self.toolsUncertaintyAction = QAction("Uncertainty Bands", self)
+        self.toolsKnotsAction = QAction("Optimize Knots", self)
+        self.toolsKnotsOrdersAction = QAction("Optimize Knots and Orders", self)
+        self.toolsGCVAction = QAction("Select Spline by GCV", self)
+        self.toolsPreEdgeAction = QAction("Fit Pre-edge Peaks", self)
         self.filePrintAction = QAction("Print", self)
         try:
             # Not all Qt versions have SP_DialogPrintButton; use a generic file icon instead
@@ -1460,6 +1749,14 @@ class PySpline(QMainWindow):
         self.windowI0Action = QAction("I0", self)
         self.windowI0Action.setCheckable(True)
         self.windowI0Action.setChecked(False)
+        self.windowHeatmapAction = QAction("Time Series", self)
+        self.windowHeatmapAction.setCheckable(True)
+        self.windowHeatmapAction.setChecked(False)
+        self.windowActions = {'norm': self.windowNormAction,
+                              'kspace': self.windowXAFSAction,
+                              'fft': self.windowFFTAction,
+                              'i0': self.windowI0Action,
+                              'heatmap': self.windowHeatmapAction}
         # self.helpContentsAction = QAction("Contents", self)
         # self.helpIndexAction = QAction("Index", self)
         self.helpAboutAction = QAction("About", self)
@@ -1482,6 +1779,9 @@ class PySpline(QMainWindow):
         self.fileMenu.addAction(self.fileSaveAsAction)
         self.fileMenu.addAction(self.fileExportFFTAction)
         self.fileMenu.addSeparator()
+        self.fileMenu.addAction(self.filePreviousScanAction)
+        self.fileMenu.addAction(self.fileNextScanAction)
+        self.fileMenu.addSeparator()
         self.fileMenu.addAction(self.filePrintAction)
         self.fileMenu.addSeparator()
         self.fileMenu.addAction(self.fileExitAction)
@@ -1490,11 +1790,30 @@ class PySpline(QMainWindow):
         self.editMenu.addAction(self.editParametersAction)
         self.editMenu.addAction(self.editCommentsAction)
 
+        self.toolsMenu = self.MenuBar.addMenu("Tools")
+        self.toolsMenu.addAction(self.toolsUncertaintyAction)
+        self.toolsMenu.addSeparator()
+        self.toolsMenu.addAction(self.toolsKnotsAction)
+        self.toolsMenu.addAction(self.toolsKnotsOrdersAction)
+        self.toolsMenu.addAction(self.toolsGCVAction)
+        self.toolsMenu.addSeparator()
+        self.toolsMenu.addAction(self.toolsPreEdgeAction)
+
+        self.workspaceMenu = self.MenuBar.addMenu("Workspace")
+        for action in self.workspaceLinkActions.values():
+            self.workspaceMenu.addAction(action)
+        self.workspaceMenu.addAction(self.workspaceUnlinkAction)
+        self.workspaceMenu.addSeparator()
+        self.workspaceMenu.addAction(self.workspaceCloseAction)
+        self.workspaceMenu.addSeparator()
+        self.workspaceMenu.addAction(self.workspaceOverlayAction)
+
         self.windowMenu = self.MenuBar.addMenu("Windows")
         self.windowMenu.addAction(self.windowNormAction)
         self.windowMenu.addAction(self.windowXAFSAction)
         self.windowMenu.addAction(self.windowFFTAction)
         self.windowMenu.addAction(self.windowI0Action)
+        self.windowMenu.addAction(self.windowHeatmapAction)
 
         self.helpMenu = self.MenuBar.addMenu("Help")
         self.helpMenu.addAction(self.helpAboutAction)
@@ -1511,27 +1830,30 @@ class PySpline(QMainWindow):
             self.fileSaveAction.triggered.connect(self.fileSave)
             self.fileSaveAsAction.triggered.connect(self.fileSaveAs)
             self.fileExportFFTAction.triggered.connect(self.exportFourier)
+            self.fileNextScanAction.triggered.connect(self.nextScan)
+            self.filePreviousScanAction.triggered.connect(self.previousScan)
             self.filePrintAction.triggered.connect(self.filePrint)
             self.fileExitAction.triggered.connect(self.fileExit)
 
             self.editParametersAction.triggered.connect(self.editParameters)
             self.editCommentsAction.triggered.connect(self.editComments)
 
-            self.windowNormAction.toggled.connect(self.norm.setShown)
-            if hasattr(self.norm, 'closed'):
-                self.norm.closed.connect(self.slotWindowNormActionToggled)
+            self.toolsUncertaintyAction.triggered.connect(self.calcUncertainty)
+            self.toolsKnotsAction.triggered.connect(lambda: self.optimizeKnots(False))
+            self.toolsKnotsOrdersAction.triggered.connect(lambda: self.optimizeKnots(True))
+            self.toolsGCVAction.triggered.connect(self.selectSplineGCV)
+            self.toolsPreEdgeAction.triggered.connect(self.fitPreEdgePeaks)
 
-            self.windowXAFSAction.toggled.connect(self.kspace.setShown)
-            if hasattr(self.kspace, 'closed'):
-                self.kspace.closed.connect(self.slotWindowXAFSActionToggled)
+            for kind, action in self.workspaceLinkActions.items():
+                action.triggered.connect(lambda checked, kind=kind: self.linkDocuments(kind))
+            self.workspaceUnlinkAction.triggered.connect(self.unlinkDocuments)
+            self.workspaceCloseAction.triggered.connect(self.closeDocuments)
+            self.workspaceOverlayAction.toggled.connect(lambda on: self.updateOverlay())
 
-            self.windowFFTAction.toggled.connect(self.fft.setShown)
-            if hasattr(self.fft, 'closed'):
-                self.fft.closed.connect(self.slotWindowFFTActionToggled)
-
-            self.windowI0Action.toggled.connect(self.i0.setShown)
-            if hasattr(self.i0, 'closed'):
-                self.i0.closed.connect(self.slotWindowI0ActionToggled)
+            for name, action in self.windowActions.items():
+                action.toggled.connect(lambda on, name=name: self.showWindow(name, on))
+            # the time series is only kept up to date while it's shown
+            self.windowHeatmapAction.toggled.connect(lambda on: self.seriesTimer.start(0) if on else self.cancelSeries())
 
             self.helpAboutAction.triggered.connect(self.helpAbout)
         except Exception:
@@ -1540,9 +1862,19 @@ class PySpline(QMainWindow):
 
 
     def closeEvent(self,e):
-        self.norm.close()
-        self.kspace.close()
-        self.fft.close()
+        self.runner.shutdown()
+        self.loader.shutdown()
+        self.prefetcher.shutdown()
+        # the worker processes are shared, so they go once the runners
+        # have dropped their jobs
+        runners = [runner for runner in (self.workspaceRunner, self.stackRunner) if runner is not None]
+        for runner in runners:
+            runner.shutdown()
+        if runners:
+            from .pool import shutdownPool
+            shutdownPool()
+        for window in self.windows.values():
+            window.close()
         e.accept()
         
     def slotWindowNormActionToggled(self):
@@ -1557,6 +1889,9 @@ class PySpline(QMainWindow):
     def slotWindowI0ActionToggled(self):
         self.windowI0Action.setChecked(False)
             
+    def slotWindowHeatmapActionToggled(self):
+        self.windowHeatmapAction.setChecked(False)
+            
     def languageChange(self):
         self.setWindowTitle(self.__tr("Raw Data"))
         
@@ -1580,10 +1915,17 @@ class PySpline(QMainWindow):
         self.editParametersAction.setText(self.__tr("Parameters..."))
         self.editCommentsAction.setText(self.__tr("Comments..."))
         
+        self.toolsUncertaintyAction.setText(self.__tr("&Uncertainty Bands"))
+        self.toolsKnotsAction.setText(self.__tr("Optimize &Knots"))
+        self.toolsKnotsOrdersAction.setText(self.__tr("Optimize Knots and &Orders"))
+        self.toolsGCVAction.setText(self.__tr("Select Spline by &GCV..."))
+        self.toolsPreEdgeAction.setText(self.__tr("Fit &Pre-edge Peaks..."))
+        
         self.windowNormAction.setText(self.__tr("&Normalized Data"))
         self.windowXAFSAction.setText(self.__tr("&EXAFS"))
         self.windowFFTAction.setText(self.__tr("&Fourier Transform"))
         self.windowI0Action.setText(self.__tr("I0 Data"))
+        self.windowHeatmapAction.setText(self.__tr("&Time Series"))
         
         self.helpAboutAction.setText(self.__tr("&About"))
         
@@ -1606,9 +1948,3 @@ class PySpline(QMainWindow):
 #     else:
 #         return pow(k/KEV,2)+e0
     
-def gauss(x,mean,stdev):
-    
-    norm=1/(stdev*sqrt(2*pi))
-    temp=-1*pow(x-mean,2)/(2*stdev*stdev)
-    return norm*exp(temp)
-    
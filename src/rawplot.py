@@ -20,6 +20,7 @@ from .qwt_compat import QwtPlot, QwtMarker, QwtCurve, QwtPlotItem, QwtPlotGrid
 
 from .dataplot import DataPlot
 from . import calc
+from . import pipeline
         
 class RawPlot(QWidget):
     # Modern signal emitted when the plot data changes
@@ -36,6 +37,9 @@ class RawPlot(QWidget):
         self.ydata = []
         self.background = []
         self.E0 = 0
+        self.pipeline = pipeline.xafsPipeline()
+        self.shownVersion = 0
+        self.deferred = False # True when someone else evaluates the pipeline
         
         # Create main layout
         main_layout = QGridLayout(self)
@@ -46,9 +50,11 @@ class RawPlot(QWidget):
         self.textLabel1.setText("Order of Background:")
         controls_layout.addWidget(self.textLabel1)
         self.spinBox = QSpinBox(self)
-        self.spinBox.setMaximumSize(QSize(50, 25))
+        self.spinBox.setMaximumSize(QSize(60, 25))
         self.spinBox.setValue(2)
-        self.spinBox.setMinimum(-1)
+        # -1 is y=a/x+b, the value below it is the Victoreen form
+        self.spinBox.setMinimum(calc.VICTOREEN - 1)
+        self.spinBox.setSpecialValueText("Vict")
         controls_layout.addWidget(self.spinBox)
         spacer = QSpacerItem(100, 10, QSizePolicy.Expanding, QSizePolicy.Minimum)
         controls_layout.addItem(spacer)
@@ -67,12 +73,16 @@ class RawPlot(QWidget):
         self.backCurve.setTitle("background")
         self.backCurve.attach(self.plot)
         self.backCurve.setPen(QPen(QColor(Qt.red), 2))
+
+        # long scans are drawn as one min/max envelope per pixel
+        self.rawEnvelope = self.plot.addEnvelope(self.rawCurve)
+        self.backEnvelope = self.plot.addEnvelope(self.backCurve)
         
         # Add controls and plot to main layout
         main_layout.addLayout(controls_layout, 0, 0)
         main_layout.addWidget(self.plot, 1, 0)
 
-        self.spinBox.setToolTip("Change Order of Background")
+        self.spinBox.setToolTip("Change Order of Background\n-1: a/x+b\nVict: Victoreen C*lambda^3-D*lambda^4")
 
         # PyQt5: New-style signal/slot connections
         self.plot.signalUpdate.connect(self.updatePlot)
@@ -84,11 +94,20 @@ class RawPlot(QWidget):
     def __tr(self,s,c = None):
         return qApp.translate("normData",s,c)
     
+    def setPipeline(self, pipeline):
+        #share the processing graph with the other windows
+        self.pipeline = pipeline
+        self.shownVersion = 0
+        
     def setRawData(self, xdata, ydata, E0):
-        self.rawCurve.setData(xdata, ydata)
+        # shared with the other windows, not copied
+        xdata = calc.column(xdata)
+        ydata = calc.column(ydata)
+        self.rawEnvelope.setData(xdata, ydata)
         self.xdata = xdata
         self.ydata = ydata
         self.E0 = E0
+        self.pipeline.setParams(xdata=xdata, ydata=ydata, E0=E0)
         DataPlot.setData(self.plot, xdata)
         self.plot.setAxisScale(QwtPlot.xBottom, xdata[0], xdata[-1])
         self.plot.replot()
@@ -96,21 +115,16 @@ class RawPlot(QWidget):
     def updatePlot(self, *args):
         # def calcBackground(self,xmin,xmax):
         # Ensure we have two knots before computing background
-        if len(self.plot.knots) < 2 or not self.xdata or not self.ydata:
+        if len(self.plot.knots) < 2 or len(self.xdata) == 0 or len(self.ydata) == 0:
             return
         order = self.getSpinBoxValue() + 1  # need constant!
         temp = self.plot.knots[0].getPosition()
-        xmin = calc.getClosest(temp, self.xdata)
-        lindex = self.xdata.index(xmin)
+        lindex = calc.getClosestIndex(temp, self.xdata)
         temp = self.plot.knots[1].getPosition()
-        xmax = calc.getClosest(temp, self.xdata)
-        hindex = self.xdata.index(xmax)
-        self.background = calc.calcBackground(self.xdata, self.ydata, lindex, hindex, order, self.E0)
-        self.backCurve.setData(self.xdata, self.background)
-        ymax = max([max(self.ydata), max(self.background)])
-        ymin = min([min(self.ydata), min(self.background)])
-        self.plot.setAxisScale(QwtPlot.yLeft, ymin, ymax)
-        self.plot.replot()
+        hindex = calc.getClosestIndex(temp, self.xdata)
+        self.pipeline.setParam('bgparams', (lindex, hindex, order))
+        if not self.deferred:
+            self.showBackground()
         # Emit modern PyQt5 signal to notify listeners that the plot changed
         try:
             self.signalPlotChanged.emit()
@@ -118,6 +132,19 @@ class RawPlot(QWidget):
             # If for some reason signals aren't available, silently continue
             pass
 
+    def showBackground(self):
+        self.background = self.pipeline.get('background')
+        # only redraw when the background actually changed
+        if self.pipeline.getVersion('background') == self.shownVersion:
+            return
+        self.shownVersion = self.pipeline.getVersion('background')
+        # previews while dragging are on a coarser grid
+        self.backEnvelope.setData(self.pipeline.get('grid'), self.background)
+        ymax = max([self.ydata.max(), self.background.max()])
+        ymin = min([self.ydata.min(), self.background.min()])
+        self.plot.setAxisScale(QwtPlot.yLeft, ymin, ymax)
+        self.plot.replot()
+
 if(__name__=='__main__'):
     import sys
     app=QApplication(sys.argv)
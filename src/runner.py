@@ -0,0 +1,283 @@
+# runner.py -- evaluates the processing pipeline off the GUI thread. Each
+#              request takes a snapshot of the pipeline and evaluates it on a
+#              single worker thread; the results come back to the GUI thread
+#              by signal and are dropped if a newer parameter change made
+#              them stale. While it is idle the worker can also evaluate
+#              speculative snapshots, only to fill the stage caches.
+#              FileLoader does the same for reading and parsing files and
+#              Prefetcher for reading and processing the scans next in line.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+
+from time import time
+from concurrent.futures import ThreadPoolExecutor
+from PyQt5.QtCore import QObject, QCoreApplication, QEvent, pyqtSignal
+
+from . import pipeline
+from . import loader
+from . import scanlist
+
+class PipelineRunner(QObject):
+    """Runs Pipeline evaluations on a worker thread.
+
+    request() queues an evaluation of every stage whose parameters are
+    set. A queued job that hasn't started yet is cancelled by the next
+    request, a running one has its results discarded when they arrive.
+    finished is emitted on the GUI thread once the pipeline holds new
+    results. elapsed is the time the last job took and measured the
+    snapshot it evaluated, whether its results were used or not.
+
+    speculate() queues snapshots of likely next parameters behind the
+    real work; every request() cancels them.
+    """
+    finished = pyqtSignal()
+    failed = pyqtSignal(str)
+    _done = pyqtSignal(object, object, float)
+
+    def __init__(self, pipeline, parent=None):
+        QObject.__init__(self, parent)
+        self.pipeline = pipeline
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.last = None
+        self.stale = 0
+        self.elapsed = 0.0
+        self.measured = None
+        self.speculation = 0 # a speculative job stops once this changes
+        self.speculative = []
+        self.speculated = 0
+        self._done.connect(self._deliver)
+
+    def request(self, targets=None):
+        if targets is None:
+            targets = [name for name in pipeline.STAGES if self.pipeline.isReady(name)]
+        if not targets:
+            return
+        self.cancelSpeculation()
+
+        #a job still waiting for the worker is already out of date
+        if self.last is not None and self.last.cancel():
+            self.stale += 1
+
+        snapshot = self.pipeline.snapshot()
+        self.last = self.executor.submit(self._run, snapshot, targets)
+
+    def _run(self, snapshot, targets):
+        #worker thread; the snapshot is private to this job
+        start = time()
+        try:
+            for name in targets:
+                snapshot.get(name)
+        except Exception as e:
+            self._done.emit(snapshot, e, time() - start)
+            return
+        self._done.emit(snapshot, None, time() - start)
+
+    def isIdle(self):
+        #True once the last request has been evaluated
+        return self.last is None or self.last.done()
+
+    def speculate(self, snapshots, targets):
+        """Evaluate snapshots for their side effect on the stage caches.
+
+        Their results are never adopted: once the parameters really take
+        one of these values, evaluating them is a cache hit. The jobs run
+        one at a time after everything requested so far; queued ones are
+        cancelled and a running one stops after its current stage when
+        speculate() or request() is called again.
+        """
+        self.cancelSpeculation()
+        token = self.speculation
+        for snapshot in snapshots:
+            self.speculative.append(self.executor.submit(self._speculate, snapshot, targets, token))
+
+    def _speculate(self, snapshot, targets, token):
+        #worker thread; targets are in processing order so each reuses the last
+        for name in targets:
+            if token != self.speculation:
+                return
+            try:
+                snapshot.get(name)
+            except Exception:
+                return
+        self.speculated += 1
+
+    def cancelSpeculation(self):
+        self.speculation += 1
+        for future in self.speculative:
+            future.cancel()
+        self.speculative = []
+
+    def _deliver(self, snapshot, error, elapsed):
+        #stale jobs still tell how long an evaluation takes
+        self.elapsed = elapsed
+        self.measured = snapshot
+        if not self.pipeline.adopt(snapshot):
+            self.stale += 1
+            return
+        if error is not None:
+            self.failed.emit(str(error))
+            return
+        self.finished.emit()
+
+    def wait(self):
+        """Block until the last request has been evaluated and delivered."""
+        if self.last is None:
+            return
+        try:
+            self.last.result()
+        except Exception:
+            pass
+        #queued signals go through a proxy object, so deliver all of them
+        QCoreApplication.sendPostedEvents(None, QEvent.MetaCall)
+
+    def shutdown(self):
+        self.cancelSpeculation()
+        self.executor.shutdown(wait=False)
+
+class FileLoader(QObject):
+    """Reads and parses files on a worker thread.
+
+    load() queues loader.loadFile() for a path; progress carries the
+    percentage done, then loaded the ScanFile or failed an error message,
+    all on the GUI thread. cancel(), or the next load(), stops the job at
+    its next progress report without any of these signals.
+    """
+    progress = pyqtSignal(int)
+    loaded = pyqtSignal(object)
+    failed = pyqtSignal(str)
+    _progress = pyqtSignal(int, int)
+    _done = pyqtSignal(int, object, object)
+
+    def __init__(self, parent=None):
+        QObject.__init__(self, parent)
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.last = None
+        self.token = 0 # a job stops once this changes
+        self._progress.connect(self._deliverProgress)
+        self._done.connect(self._deliver)
+
+    def load(self, path, format=None):
+        self.cancel()
+        self.last = self.executor.submit(self._run, path, format, self.token)
+
+    def cancel(self):
+        self.token += 1
+        if self.last is not None:
+            self.last.cancel()
+
+    def isLoading(self):
+        return self.last is not None and not self.last.done()
+
+    def _run(self, path, format, token):
+        #worker thread; only whole percents are sent on
+        shown = [-1]
+        def progress(fraction):
+            if token != self.token:
+                raise loader.LoadCancelled()
+            percent = int(fraction * 100)
+            if percent != shown[0]:
+                shown[0] = percent
+                self._progress.emit(token, percent)
+        try:
+            scan = loader.loadFile(path, format, progress)
+        except loader.LoadCancelled:
+            return
+        except loader.LoadError as e:
+            self._done.emit(token, None, str(e))
+            return
+        except Exception as e:
+            self._done.emit(token, None, "Could not read file: " + str(e))
+            return
+        self._done.emit(token, scan, None)
+
+    def _deliverProgress(self, token, percent):
+        if token == self.token:
+            self.progress.emit(percent)
+
+    def _deliver(self, token, scan, error):
+        #a cancelled job may have finished before it noticed
+        if token != self.token:
+            return
+        if error is not None:
+            self.failed.emit(error)
+            return
+        self.loaded.emit(scan)
+
+    def wait(self):
+        """Block until the last load has finished and been delivered."""
+        if self.last is None:
+            return
+        try:
+            self.last.result()
+        except Exception:
+            pass
+        QCoreApplication.sendPostedEvents(None, QEvent.MetaCall)
+
+    def shutdown(self):
+        self.cancel()
+        self.executor.shutdown(wait=False)
+
+class Prefetcher(QObject):
+    """Reads and processes scans ahead of time on a worker thread.
+
+    prefetch() queues scanlist.prefetch() for each path, nearest first,
+    and cancels the jobs of the previous call that haven't started yet.
+    ready carries the path, the settings and the (scan, spectrum) of each
+    finished job on the GUI thread. A file that can't be read is skipped;
+    opening it for real reports why.
+    """
+    ready = pyqtSignal(str, object, object)
+    _done = pyqtSignal(int, str, object, object)
+
+    def __init__(self, parent=None):
+        QObject.__init__(self, parent)
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.jobs = []
+        self.token = 0 # a running job stops once this changes
+        self._done.connect(self._deliver)
+
+    def prefetch(self, paths, settings):
+        self.cancel()
+        token = self.token
+        self.jobs = [self.executor.submit(self._run, path, settings, token) for path in paths]
+
+    def cancel(self):
+        self.token += 1
+        for job in self.jobs:
+            job.cancel()
+        self.jobs = []
+
+    def isIdle(self):
+        return all([job.done() for job in self.jobs])
+
+    def _run(self, path, settings, token):
+        #worker thread
+        def progress(fraction):
+            if token != self.token:
+                raise loader.LoadCancelled()
+        try:
+            result = scanlist.prefetch(path, settings, progress)
+        except Exception:
+            return
+        if token == self.token:
+            self._done.emit(token, path, settings, result)
+
+    def _deliver(self, token, path, settings, result):
+        if token == self.token:
+            self.ready.emit(path, settings, result)
+
+    def wait(self):
+        """Block until the queued jobs have finished and been delivered."""
+        for job in self.jobs:
+            try:
+                job.result()
+            except Exception:
+                pass
+        QCoreApplication.sendPostedEvents(None, QEvent.MetaCall)
+
+    def shutdown(self):
+        self.cancel()
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,170 @@
+# scanlist.py -- stepping through the scans of one directory with the same
+#                E0, background, knots and k window. The scans next in line
+#                are read and processed ahead of time (see runner.Prefetcher)
+#                and kept here until they are shown, within a memory limit.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+
+from collections import OrderedDict
+from os import listdir
+from os.path import dirname, isfile, join, splitext, abspath
+
+from . import calc
+from . import loader
+from .knotset import KnotSet
+from .spectrum import Spectrum
+from .pipeline import STAGES
+
+PREFETCH_AHEAD = 2 #scans read ahead in the direction of travel
+PREFETCH_BYTES = 256 * 1024 * 1024 #rough memory limit of the scans read ahead
+
+def listScans(path):
+    """The files next to path with its extension, sorted by name."""
+    folder = dirname(abspath(path))
+    ext = splitext(path)[1].lower()
+    names = sorted([name for name in listdir(folder) if splitext(name)[1].lower() == ext])
+    return [join(folder, name) for name in names if isfile(join(folder, name))]
+
+def _place(positions, limits):
+    #where DataPlot.addKnot() puts knots added one by one within limits
+    knotset = KnotSet()
+    for pos in positions:
+        knotset.add(pos, limits=limits)
+    return knotset.positions.tolist()
+
+def scanSpectrum(scan):
+    """A Spectrum of scan with the pipeline parameters set, not evaluated.
+
+    scan needs settings (see ScanFile.setSettings); the parameters are
+    derived from them the way the windows derive theirs when the scan is
+    shown, so Pipeline.take() can hand the results over.
+    """
+    xdata = scan.xdata
+    spectrum = Spectrum()
+    spectrum.setData(xdata, scan.ydata, scan.i0data)
+    spectrum.setE0(scan.E0)
+    limits = (xdata[0], xdata[-1])
+
+    #background knots and order, as RawPlot.updatePlot
+    lowx, highx, order = scan.background
+    bgknots = _place([calc.getClosest(lowx, xdata), calc.getClosest(highx, xdata)], limits)
+    if len(bgknots) == 2:
+        spectrum.pipeline.setParam('bgparams', (calc.getClosestIndex(bgknots[0], xdata),
+                                                calc.getClosestIndex(bgknots[1], xdata), order + 1))
+
+    #spline knots snapped to the grid, as NormPlot.getSegs
+    knotset = KnotSet()
+    for marker in scan.markers:
+        knotset.add(calc.getClosest(marker, xdata), limits=limits)
+    orders = [scan.orders[i] + 1 if i < len(scan.orders) else 3 for i in range(len(knotset) - 1)]
+    segs = knotset.getSegs(orders, xdata)
+    if segs:
+        spectrum.pipeline.setParam('segs', tuple(segs))
+
+    #k window, as the k-space plot clamps its knots
+    kwindow = _place(scan.kwindow, (0, calc.toKSpace(xdata[-1], scan.E0)))
+    if len(kwindow) == 2:
+        spectrum.pipeline.setParam('kwindow', tuple(kwindow))
+
+    return spectrum
+
+def processScan(scan):
+    #scanSpectrum() with every stage evaluated at full resolution
+    spectrum = scanSpectrum(scan)
+    for name in STAGES:
+        if spectrum.pipeline.isReady(name):
+            spectrum.pipeline.get(name)
+    return spectrum
+
+def prefetch(path, settings, progress=None):
+    #worker thread: the ScanFile and processed Spectrum of path
+    scan = loader.loadFile(path, progress=progress)
+    scan.setSettings(settings)
+    return scan, processScan(scan)
+
+class ScanList:
+    """The scans of a directory, the one shown and the ones read ahead.
+
+    paths are in order and index is the one shown, -1 if it isn't one of
+    them. Scans read ahead are kept with the settings they were processed
+    with until take() hands them out. Once they take more than maxBytes,
+    the ones furthest from being shown next go first, then the oldest.
+    """
+    def __init__(self, paths, maxBytes=PREFETCH_BYTES):
+        self.paths = list(paths)
+        self.index = -1
+        self.direction = 1
+        self.maxBytes = maxBytes
+        self.entries = OrderedDict() # path -> (settings, scan, spectrum, nbytes)
+        self.nbytes = 0
+
+    def setCurrent(self, path):
+        path = abspath(path)
+        self.index = self.paths.index(path) if path in self.paths else -1
+
+    def getNeighbour(self, step):
+        #path step scans away from the one shown, None past either end
+        if self.index < 0:
+            return None
+        i = self.index + step
+        if 0 <= i < len(self.paths):
+            return self.paths[i]
+        return None
+
+    def step(self, step):
+        #the path step scans away becomes the one shown
+        path = self.getNeighbour(step)
+        if path is not None:
+            self.index += step
+            self.direction = 1 if step > 0 else -1
+        return path
+
+    def getAhead(self, count=PREFETCH_AHEAD):
+        #the paths that would be shown next, nearest first
+        paths = [self.getNeighbour(self.direction * i) for i in range(1, count + 1)]
+        return [path for path in paths if path is not None]
+
+    def has(self, path, settings):
+        return path in self.entries and self.entries[path][0] == settings
+
+    def put(self, path, settings, scan, spectrum):
+        self.drop(path)
+        nbytes = spectrum.pipeline.nbytes() + spectrum.i0data.nbytes
+        self.entries[path] = (settings, scan, spectrum, nbytes)
+        self.nbytes += nbytes
+        self.trim()
+
+    def take(self, path, settings):
+        """The (scan, spectrum) read ahead for path with settings, or None.
+
+        An entry is handed out only once; one made with other settings is
+        dropped.
+        """
+        if path not in self.entries:
+            return None
+        entry = self.entries[path]
+        self.drop(path)
+        if entry[0] != settings:
+            return None
+        return entry[1], entry[2]
+
+    def drop(self, path):
+        if path in self.entries:
+            self.nbytes -= self.entries.pop(path)[3]
+
+    def trim(self):
+        ahead = self.getAhead()
+        while self.entries and self.nbytes > self.maxBytes:
+            others = [path for path in self.entries if path not in ahead]
+            if others:
+                self.drop(others[0])
+            else:
+                #all of them are next in line; the furthest goes
+                self.drop(max(self.entries, key=ahead.index))
+
+    def clear(self):
+        self.entries.clear()
+        self.nbytes = 0
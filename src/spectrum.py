@@ -0,0 +1,133 @@
+# spectrum.py -- one scan as a plain data model: its measured columns, its
+#                metadata and the pipeline that processes it. The windows
+#                only show what a Spectrum holds, so a scan can be kept,
+#                processed and saved to a .d file without any of them.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+
+from numpy import zeros, ones, column_stack, savetxt
+
+from . import calc
+from .pipeline import xafsPipeline
+
+#columns of a saved (.d) file, in order
+COLUMNS = ('EV', 'K', 'IO', 'RAW', 'BACKGROND', 'NORMAL', 'SPLINE', 'XAFS')
+
+class Spectrum:
+    """Data, metadata and processing of one scan.
+
+    xdata, ydata and i0data are read-only float64 columns (calc.column),
+    so windows and other scans share them instead of copying. E0, title,
+    comments and filename describe the scan. Everything derived from the
+    data lives in pipeline: bgparams, segs and kwindow are its parameters,
+    background, normdata, splinedata, kdata, xafsdata, rdata and fftdata
+    its full resolution results, evaluated when first asked for.
+
+    A Spectrum is a handful of references, so many of them can be kept
+    in memory for the price of their columns and cached results.
+    """
+    __slots__ = ('xdata', 'ydata', 'i0data', 'E0', 'title', 'comments',
+                 'filename', 'pipeline')
+
+    def __init__(self, pipeline=None):
+        if pipeline is None:
+            pipeline = xafsPipeline()
+        self.pipeline = pipeline
+        self.xdata = calc.column([])
+        self.ydata = calc.column([])
+        self.i0data = calc.column([])
+        self.E0 = None
+        self.title = ""
+        self.comments = []
+        self.filename = ""
+
+    def setData(self, xdata, ydata, i0data=None):
+        #i0 is all ones for scans that don't have it
+        self.xdata = calc.column(xdata)
+        self.ydata = calc.column(ydata)
+        if i0data is None:
+            i0data = ones(len(self.xdata))
+        self.i0data = calc.column(i0data)
+        self.pipeline.setParams(xdata=self.xdata, ydata=self.ydata)
+
+    def setE0(self, E0):
+        self.E0 = E0
+        self.pipeline.setParam('E0', E0)
+
+    def getParam(self, name, default=None):
+        if not self.pipeline.hasParams(name):
+            return default
+        return self.pipeline.get(name)
+
+    def getStage(self, name):
+        #full resolution result, even while the pipeline holds a preview
+        if self.pipeline.get('step') == 1:
+            return self.pipeline.get(name)
+        snapshot = self.pipeline.snapshot()
+        snapshot.setParam('step', 1)
+        return snapshot.get(name)
+
+    bgparams = property(lambda self: self.getParam('bgparams'))
+    segs = property(lambda self: self.getParam('segs'))
+    kwindow = property(lambda self: self.getParam('kwindow'))
+
+    background = property(lambda self: self.getStage('background'))
+    normdata = property(lambda self: self.getStage('spline')[0])
+    splinedata = property(lambda self: self.getStage('spline')[1])
+    kdata = property(lambda self: self.getStage('chi')[0])
+    xafsdata = property(lambda self: self.getStage('chi')[1])
+    rdata = property(lambda self: self.getStage('fft')[0])
+    fftdata = property(lambda self: self.getStage('fft')[1])
+
+    def getColumns(self):
+        """The columns of a saved file as one array, a row per energy.
+
+        k and chi(k) start at E0, so they are padded with zeros below it.
+        """
+        kdata, xafsdata = self.getStage('chi')
+        normdata, splinedata = self.getStage('spline')
+
+        size = len(self.xdata)
+        k = zeros(size, float)
+        xafs = zeros(size, float)
+        if len(kdata):
+            k[-len(kdata):] = kdata
+            xafs[-len(xafsdata):] = xafsdata
+
+        return column_stack((self.xdata, k, self.i0data, self.ydata,
+                             self.getStage('background'), normdata, splinedata, xafs))
+
+    def save(self, filename):
+        """Write the scan as a PySpline (.d) file."""
+        lindex, hindex, order = self.bgparams
+        segs = self.segs
+        kmin, kmax = self.kwindow
+
+        file = open(filename, "w")
+
+        #write title and comments
+        file.write("TITLE " + self.title + "\n")
+        for line in self.comments:
+            file.write("# " + line + "\n")
+
+        file.write("E0 %.3f\n" % self.E0)
+
+        #background bounds and order
+        file.write("BACKGROUND %.5f (%i) %.5f eV\n" % (self.xdata[lindex], order - 1, self.xdata[hindex]))
+
+        #lower bound and order of each spline segment, then the upper bound of the last
+        file.write("SPLINE ")
+        for seg in segs:
+            file.write("%.5f" % seg[1])
+            file.write(" (" + str(seg[0] - 1) + ") ")
+        file.write("%.5f eV\n" % segs[-1][2])
+
+        file.write("KWIN %.5f %.5f \n" % (kmin, kmax))
+
+        file.write(" ".join(COLUMNS) + "\n")
+        savetxt(file, self.getColumns(), fmt="%.6f", delimiter=",")
+
+        file.close()
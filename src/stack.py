@@ -0,0 +1,185 @@
+# stack.py -- a time series of scans, e.g. an operando or quick-EXAFS run,
+#             as images with one row per scan: the normalized data on a
+#             common energy grid, chi(k) on a common k grid and |FT| on a
+#             common R grid. Rows are computed in batches in worker processes
+#             (see pool.StackRunner) and replaced one batch at a time when
+#             the settings change. Every image keeps coarser levels with
+#             pairs of rows merged, so a view of thousands of scans is drawn
+#             from a level with about one row per pixel.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+
+from numpy import (asarray, full, nan, isnan, where, linspace, interp, float32,
+                   uint8, clip, nanmin, nanmax, unique, argsort)
+
+from . import loader
+from . import scanlist
+
+AXES = ('energy', 'k', 'r') #images of a stack
+ENERGY_POINTS = 1024 #columns of the energy image, at most
+K_POINTS = 512 #columns of the k image
+BATCH_ROWS = 32 #scans read and processed by one worker job
+COLORS = 255 #color indices; index COLORS marks a row not computed yet
+
+def makeGrids(pipeline):
+    """The energy, k and R grids of a stack, from the processed pipeline
+    of one of its scans."""
+    xdata = pipeline.get('xdata')
+    kdata = pipeline.get('chi')[0]
+    rdata = pipeline.get('fft')[0]
+    return {'energy': linspace(xdata[0], xdata[-1], min(len(xdata), ENERGY_POINTS)),
+            'k': linspace(0.0, kdata[-1] if len(kdata) else 1.0, K_POINTS),
+            'r': asarray(rdata, float)}
+
+def stackRow(pipeline, grids):
+    """The rows of a processed pipeline on grids, by axis; NaN outside the
+    range of its data."""
+    curves = {'energy': (pipeline.get('grid'), pipeline.get('spline')[0]),
+              'k': pipeline.get('chi'),
+              'r': pipeline.get('fft')}
+    rows = {}
+    for axis in AXES:
+        xdata, ydata = curves[axis]
+        if len(xdata):
+            rows[axis] = interp(grids[axis], xdata, ydata, left=nan, right=nan).astype(float32)
+        else:
+            rows[axis] = full(len(grids[axis]), nan, float32)
+    return rows
+
+def computeRows(paths, settings, grids):
+    """Worker process: the rows of the scans at paths with settings.
+
+    Returns ({axis: array with a row per path}, errors); a scan that can't
+    be read or processed leaves a row of NaN and its message in errors.
+    """
+    images = dict([(axis, full((len(paths), len(grids[axis])), nan, float32)) for axis in AXES])
+    errors = []
+    for i, path in enumerate(paths):
+        try:
+            scan = loader.loadFile(path)
+            scan.setSettings(settings)
+            rows = stackRow(scanlist.processScan(scan).pipeline, grids)
+        except Exception as e:
+            errors.append("%s: %s" % (path, e))
+            continue
+        for axis in AXES:
+            images[axis][i] = rows[axis]
+    return images, errors
+
+def _merge(a, b):
+    #mean of two rows of a level, ignoring rows not computed yet
+    out = (a + b) * 0.5
+    out = where(isnan(a), b, out)
+    return where(isnan(b), a, out)
+
+class StackImage:
+    """One image of a stack and its coarser levels.
+
+    levels[0] has a row per scan; each next level merges pairs of rows of
+    the one before, down to a single row. Color indices are kept per level
+    once asked for and only redone for the rows that change, or all of
+    them when the color range grows.
+    """
+    def __init__(self, grid, count):
+        self.grid = grid
+        self.levels = [full((count, len(grid)), nan, float32)]
+        while len(self.levels[-1]) > 1:
+            self.levels.append(full(((len(self.levels[-1]) + 1) // 2, len(grid)), nan, float32))
+        self.indices = [None] * len(self.levels)
+        self.range = None # (low, high) of the colors
+        self.version = 0
+
+    def setRows(self, rows, values):
+        """Rows rows (indices into levels[0]) become values, and the rows of
+        the coarser levels they are part of follow."""
+        rows = asarray(rows, int)
+        self.levels[0][rows] = values
+        self.growRange(values)
+        self.recolor(0, rows)
+        for i in range(1, len(self.levels)):
+            rows = unique(rows // 2)
+            finer = self.levels[i - 1]
+            pairs = clip(rows * 2 + 1, 0, len(finer) - 1)
+            self.levels[i][rows] = _merge(finer[rows * 2], finer[pairs])
+            self.recolor(i, rows)
+        self.version += 1
+
+    def growRange(self, values):
+        if isnan(values).all():
+            return
+        low, high = float(nanmin(values)), float(nanmax(values))
+        if self.range is not None:
+            if self.range[0] <= low and high <= self.range[1]:
+                return
+            low, high = min(low, self.range[0]), max(high, self.range[1])
+        if high <= low:
+            high = low + 1.0
+        self.range = (low, high)
+        self.indices = [None] * len(self.levels)
+
+    def toIndices(self, values):
+        #color indices of values; rows not computed yet get COLORS
+        if self.range is None:
+            return full(values.shape, COLORS, uint8)
+        low, high = self.range
+        scaled = clip((values - low) * ((COLORS - 1) / (high - low)), 0, COLORS - 1)
+        return where(isnan(values), COLORS, scaled).astype(uint8)
+
+    def recolor(self, level, rows):
+        if self.indices[level] is not None:
+            self.indices[level][rows] = self.toIndices(self.levels[level][rows])
+
+    def getIndices(self, level):
+        """Color indices of every row of level, kept until they change."""
+        if self.indices[level] is None:
+            self.indices[level] = self.toIndices(self.levels[level])
+        return self.indices[level]
+
+    def chooseLevel(self, rows, pixels):
+        #coarsest level that still has a row per pixel for rows scans
+        level = 0
+        while level + 1 < len(self.levels) and rows >= (2 << level) * pixels:
+            level += 1
+        return level
+
+class SpectrumStack:
+    """The scans at paths as images by axis.
+
+    settings are the ones every row should be computed with; rowSettings
+    are the ones each row was computed with, None for rows without
+    results. A row keeps showing its old results until new ones replace
+    it.
+    """
+    def __init__(self, paths, grids):
+        self.paths = list(paths)
+        self.grids = grids
+        self.images = dict([(axis, StackImage(grids[axis], len(self.paths))) for axis in AXES])
+        self.settings = None
+        self.rowSettings = [None] * len(self.paths)
+
+    def __len__(self):
+        return len(self.paths)
+
+    def setSettings(self, settings):
+        self.settings = settings
+
+    def setRows(self, rows, images, settings):
+        #images as computeRows() returns them, one row per index of rows
+        for axis in AXES:
+            self.images[axis].setRows(rows, images[axis])
+        for row in rows:
+            self.rowSettings[row] = settings
+
+    def setRow(self, row, pipeline, settings):
+        #the results of a scan processed here, e.g. the one shown
+        values = stackRow(pipeline, self.grids)
+        self.setRows([row], dict([(axis, values[axis][None, :]) for axis in AXES]), settings)
+
+    def getOutdated(self, around=0):
+        """Rows not computed with settings, nearest to row around first."""
+        rows = [row for row, settings in enumerate(self.rowSettings) if settings != self.settings]
+        rows = asarray(rows, int)
+        return rows[argsort(abs(rows - around), kind='stable')].tolist()
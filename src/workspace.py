@@ -0,0 +1,158 @@
+# workspace.py -- many scans loaded at once. Each scan keeps its data, its
+#                 settings and the results they give; the background, the
+#                 knots and the k window can each be linked across a group
+#                 of scans, so changing them on one changes them on all.
+#                 The linked scans are recomputed in worker processes (see
+#                 pool.WorkspaceRunner).
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+
+from . import loader
+from . import scanlist
+from .pipeline import STAGES
+
+KINDS = ('background', 'knots', 'kwindow') #parts of the settings that can be linked
+
+def getPart(settings, kind):
+    #one kind of a ScanFile.getSettings() tuple; knots are (markers, orders)
+    E0, background, markers, orders, kwindow = settings
+    if kind == 'background':
+        return background
+    if kind == 'knots':
+        return (markers, orders)
+    return kwindow
+
+def setPart(settings, kind, value):
+    E0, background, markers, orders, kwindow = settings
+    if kind == 'background':
+        background = value
+    elif kind == 'knots':
+        markers, orders = value
+    else:
+        kwindow = value
+    return (E0, background, markers, orders, kwindow)
+
+def computeStages(xdata, ydata, i0data, settings):
+    """Worker process: every stage of a scan with settings, by name."""
+    scan = loader.ScanFile('', 'columns')
+    scan.xdata, scan.ydata, scan.i0data = xdata, ydata, i0data
+    scan.setSettings(settings)
+    pipeline = scanlist.processScan(scan).pipeline
+    return dict([(name, pipeline.get(name)) for name in STAGES if not pipeline.isDirty(name)])
+
+def resultPipeline(scan, values):
+    #a pipeline of scan holding stage values from computeStages()
+    pipeline = scanlist.scanSpectrum(scan).pipeline
+    for name in STAGES:
+        if name in values:
+            pipeline.setValue(name, values[name])
+    return pipeline
+
+class Document:
+    """One scan of a workspace.
+
+    scan is the ScanFile it was loaded from, with the settings it has now.
+    results is a Pipeline holding what those settings give, or None while
+    they are out of date; version changes with every change of settings,
+    so results computed for older ones can be told apart.
+    """
+    __slots__ = ('scan', 'results', 'version')
+
+    def __init__(self, scan):
+        self.scan = scan
+        self.results = None
+        self.version = 0
+
+    def getSettings(self):
+        return self.scan.getSettings()
+
+    def setScan(self, scan):
+        #another scan takes the document's place, links and all
+        self.scan = scan
+        self.version += 1
+        self.results = None
+
+    def setSettings(self, settings, results=None):
+        if settings != self.scan.getSettings():
+            self.scan.setSettings(settings)
+            self.version += 1
+            self.results = None
+        if results is not None:
+            self.results = results
+
+class Workspace:
+    """Documents and the groups their settings are linked in.
+
+    For every kind of KINDS a document is in at most one group. Setting
+    a document's settings passes each changed kind on to the group it is
+    in for that kind.
+    """
+    def __init__(self):
+        self.documents = []
+        self.groups = dict([(kind, []) for kind in KINDS]) # kind -> lists of documents
+
+    def add(self, scan):
+        document = Document(scan)
+        self.documents.append(document)
+        return document
+
+    def remove(self, document):
+        for kind in KINDS:
+            self.unlink([document], kind)
+        self.documents.remove(document)
+
+    def getGroup(self, document, kind):
+        for group in self.groups[kind]:
+            if document in group:
+                return group
+        return None
+
+    def getLinked(self, document, kind):
+        #the other documents linked to document for kind
+        group = self.getGroup(document, kind)
+        if group is None:
+            return []
+        return [other for other in group if other is not document]
+
+    def link(self, documents, kind):
+        """Link kind of documents; they all take it from the first one.
+
+        Returns the documents whose settings changed.
+        """
+        self.unlink(documents, kind)
+        if len(documents) < 2:
+            return []
+        self.groups[kind].append(list(documents))
+        return self.setSettings(documents[0], documents[0].getSettings())
+
+    def unlink(self, documents, kind):
+        for group in self.groups[kind]:
+            for document in documents:
+                if document in group:
+                    group.remove(document)
+        self.groups[kind] = [group for group in self.groups[kind] if len(group) > 1]
+
+    def setSettings(self, document, settings, results=None):
+        """Give document settings, and the kinds it is linked for to its groups.
+
+        results are what settings give for document, if known. Returns
+        the other documents whose settings changed; their results are out
+        of date then.
+        """
+        document.setSettings(settings, results)
+        changed = []
+        for kind in KINDS:
+            value = getPart(settings, kind)
+            for other in self.getLinked(document, kind):
+                current = other.getSettings()
+                if getPart(current, kind) != value:
+                    other.setSettings(setPart(current, kind, value))
+                    if other not in changed:
+                        changed.append(other)
+        return changed
+
+    def getOutdated(self):
+        return [document for document in self.documents if document.results is None]
@@ -0,0 +1,63 @@
+# workspaceview.py -- the WorkspaceView dock listing the scans of the
+#                     workspace, the groups their settings are linked in and
+#                     whether their results are up to date
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+
+from PyQt5.QtCore import pyqtSignal
+from PyQt5.QtGui import QFont
+from PyQt5.QtWidgets import QDockWidget, QListWidget, QListWidgetItem, QAbstractItemView
+
+from .workspace import KINDS
+
+#letters the groups of each kind are shown with: B1 is background group 1
+LABELS = {'background': 'B', 'knots': 'K', 'kwindow': 'W'}
+
+class WorkspaceView(QDockWidget):
+    # a document was double-clicked or chosen with Enter
+    activated = pyqtSignal(object)
+
+    def __init__(self, parent=None):
+        QDockWidget.__init__(self, "Workspace", parent)
+        self.setObjectName("Workspace")
+        self.list = QListWidget(self)
+        self.list.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.list.itemActivated.connect(self.slotItemActivated)
+        self.setWidget(self.list)
+        self.documents = []
+
+    def setDocuments(self, workspace, current, busy=()):
+        """Show the documents of workspace; current is in bold and busy
+        are the ones being recomputed. The selection is kept."""
+        selected = self.getSelected()
+        self.documents = list(workspace.documents)
+        self.list.clear()
+        for document in self.documents:
+            text = document.scan.title or "(untitled)"
+            labels = []
+            for kind in KINDS:
+                group = workspace.getGroup(document, kind)
+                if group is not None:
+                    labels.append("%s%i" % (LABELS[kind], workspace.groups[kind].index(group) + 1))
+            if labels:
+                text += "  [" + " ".join(labels) + "]"
+            if document in busy:
+                text += "  (computing)"
+            elif document.results is None and document is not current:
+                text += "  (out of date)"
+            item = QListWidgetItem(text, self.list)
+            if document is current:
+                font = QFont(item.font())
+                font.setBold(True)
+                item.setFont(font)
+            item.setSelected(document in selected)
+
+    def getSelected(self):
+        rows = sorted([self.list.row(item) for item in self.list.selectedItems()])
+        return [self.documents[row] for row in rows if row < len(self.documents)]
+
+    def slotItemActivated(self, item):
+        self.activated.emit(self.documents[self.list.row(item)])
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+
+# The batch calc functions used by the pipeline and the Monte-Carlo bands
+# against the scalar ones they stand in for: every row of a stack has to
+# come out the same as that row on its own. Runs under pytest or on its own.
+
+import os
+import sys
+
+from numpy import linspace, exp, sqrt, sin, where, clip, maximum, asarray, allclose
+from numpy.random import default_rng
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+from src import calc
+
+E0 = 7112.0
+POINTS = 400
+ROWS = 5
+SEED = 2
+NOISE = 1e-3
+#both sides fit powers of the raw energy, so they only agree to within the
+#conditioning of those fits; a thousandth of the noise is far below any
+#difference that would show. Spline segments are kept to quadratics, the
+#cubic systems are too ill-conditioned to compare two summation orders.
+TOLERANCE = 1e-3 * NOISE
+
+def makeStack():
+    #ROWS noisy copies of an edge step with a damped sine on a sloping pre-edge
+    x = linspace(E0 - 200.0, E0 + 900.0, POINTS)
+    k = calc.KEV * sqrt(clip(x - E0, 0.0, None))
+    osc = where(x > E0, 0.1 * sin(4.4 * k) * exp(-0.01 * k * k) / maximum(k, 1.0), 0.0)
+    y = 0.2 - 1e-5 * (x - E0) + (1.0 + osc) / (1.0 + exp(-(x - E0) / 2.0))
+    return x, y + default_rng(SEED).normal(0.0, NOISE, (ROWS, POINTS))
+
+def test_background_batch():
+    x, ystack = makeStack()
+    below = int(calc.getClosestIndices([E0 - 30.0], x)[0])
+    above = int(calc.getClosestIndices([E0 + 100.0], x)[0])
+    for order in (1, 2, 3, 0, calc.VICTOREEN):
+        for hindex in (below, above):
+            batch = calc.calcBackgroundBatch(x, ystack, 0, hindex, order, E0)
+            for row in range(ROWS):
+                scalar = calc.calcBackground(x, ystack[row], 0, hindex, order, E0)
+                assert allclose(batch[row], scalar, rtol=0.0, atol=TOLERANCE), (order, hindex, row)
+
+def test_spline_batch():
+    x, ystack = makeStack()
+    for knots in ([E0, x[-1]], [E0, E0 + 300.0, x[-1]], [E0 + 10.0, E0 + 150.0, E0 + 500.0, x[-1]]):
+        index = calc.getClosestIndices(knots, x)
+        for order in (2, 3):
+            segs = [(order, x[index[i]], x[index[i + 1]]) for i in range(len(knots) - 1)]
+            splines, sp_E0 = calc.calcSplineBatch(x, ystack, E0, segs)
+            for row in range(ROWS):
+                spline, scalar_E0 = calc.calcSpline(x, ystack[row], E0, segs)
+                assert allclose(splines[row], asarray(spline), rtol=0.0, atol=TOLERANCE), (knots, order, row)
+                assert abs(sp_E0[row] - scalar_E0) < TOLERANCE
+
+def test_xafs_fft_batch():
+    #chi(k) and its FFT of the rows above E0, over a few windows
+    x, ystack = makeStack()
+    index = calc.getClosestIndices([E0, E0 + 300.0, x[-1]], x)
+    segs = [(3, x[index[i]], x[index[i + 1]]) for i in range(2)]
+    splines, sp_E0 = calc.calcSplineBatch(x, ystack, E0, segs)
+    k0 = int(index[0]) + 1
+    kdata = calc.KEV * sqrt(x[k0:] - E0)
+    xafs = calc.calcXAFSBatch(ystack[:, k0:], splines[:, k0:], kdata)
+    for row in range(ROWS):
+        scalar = calc.calcXAFS(ystack[row, k0:].tolist(), splines[row, k0:].tolist(), kdata.tolist())
+        assert allclose(xafs[row], scalar, rtol=1e-12, atol=0.0), row
+    for kmin, kmax in ((2.0, 12.0), (0.0, 20.0), (3.5, 9.0)):
+        fft, DR = calc.calcFFTBatch(kdata, xafs, kmin, kmax)
+        for row in range(ROWS):
+            scalar, scalarDR = calc.calcFFT(kdata.tolist(), xafs[row].tolist(), kmin, kmax)
+            assert DR == scalarDR and len(scalar) == fft.shape[1]
+            assert allclose(fft[row], scalar, rtol=1e-9, atol=1e-12), (kmin, kmax, row)
+
+def test_closest_indices():
+    #one rule for every caller: halfway goes down, repeated energies to the
+    #first of them and outside to the ends
+    grid = [1.0, 2.0, 3.0, 3.0, 5.0]
+    values = [0.0, 1.0, 1.5, 1.6, 2.5, 3.0, 4.0, 4.5, 6.0]
+    expected = [0, 0, 0, 1, 1, 2, 2, 4, 4]
+    assert calc.getClosestIndices(values, grid).tolist() == expected
+    assert [calc.getClosestIndex(value, grid) for value in values] == expected
+    assert [calc.getClosestIndex(value, asarray(grid)) for value in values] == expected
+    assert calc.getClosestIndex(2.5, []) == 0 and calc.getClosestIndex(2.5, [7.0]) == 0
+
+if(__name__=='__main__'):
+    test_background_batch()
+    test_spline_batch()
+    test_xafs_fft_batch()
+    test_closest_indices()
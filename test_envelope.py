@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+
+# The per-pixel envelopes of envelope.py: whatever range and canvas width
+# a curve is drawn at, and whichever pyramid level chooseLevel() picks for
+# it, the reduced points keep the extremes of the data in view, including
+# spikes one sample wide near where they are, with x values in order.
+# Runs under pytest or on its own.
+
+import os
+import sys
+
+from numpy import linspace, sin, diff, flatnonzero, abs as np_abs, all as np_all
+from numpy.random import default_rng
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+from src.envelope import makePyramid, chooseLevel, envelope, POINTS_PER_PIXEL
+
+SEED = 6
+POINTS = 200000
+SPIKES = 40
+RANGES = ((0.0, 1000.0), (100.0, 900.0), (-50.0, 300.0), (480.0, 520.0), (700.0, 1100.0),
+          (499.9, 500.1))
+WIDTHS = (7, 100, 640, 1500)
+
+def makeCurve():
+    #a slow wave with noise and spikes up and down of a single sample
+    rng = default_rng(SEED)
+    x = linspace(0.0, 1000.0, POINTS)
+    y = sin(x / 50.0) + rng.normal(0.0, 0.01, POINTS)
+    spikes = rng.choice(POINTS, SPIKES, replace=False)
+    y[spikes] = rng.choice([-1.0, 1.0], SPIKES) * rng.uniform(2.0, 5.0, SPIKES)
+    return x, y, spikes
+
+def test_envelope_keeps_extremes():
+    x, y, spikes = makeCurve()
+    levels = makePyramid(x, y)
+    assert len(levels) > 4
+    for xmin, xmax in RANGES:
+        shown = flatnonzero((x >= xmin) & (x <= xmax))
+        for pixels in WIDTHS:
+            level = chooseLevel(levels, xmin, xmax, pixels)
+            xout, yout = envelope(level, xmin, xmax, pixels)
+            assert len(xout) == len(yout) > 0
+            assert np_all(diff(xout) >= 0), (xmin, xmax, pixels)
+            #no more than a few points per column, unless all of them fit
+            assert len(xout) <= 4 * (pixels + 2) or len(xout) <= len(shown) + 2
+
+            #the extremes in view are drawn, and nothing beyond the data is
+            assert yout.max() >= y[shown].max() and yout.min() <= y[shown].min()
+            covered = (x >= xout[0]) & (x <= xout[-1])
+            assert yout.max() <= y[covered].max() and yout.min() >= y[covered].min()
+
+            #every spike in view is drawn within about a column of its place,
+            #unless a bigger one shares its column
+            column = (xmax - xmin) / float(pixels)
+            for spike in spikes:
+                if not xmin <= x[spike] <= xmax:
+                    continue
+                around = y[np_abs(x - x[spike]) <= 1.5 * column]
+                if y[spike] != (around.max() if y[spike] > 0 else around.min()):
+                    continue
+                near = np_abs(xout[yout == y[spike]] - x[spike])
+                assert len(near) and near.min() <= 1.5 * column, (xmin, xmax, pixels, spike)
+
+def test_choose_level():
+    #the coarsest level with enough blocks in the range for every column
+    x, y, spikes = makeCurve()
+    levels = makePyramid(x, y)
+    for xmin, xmax in RANGES:
+        for pixels in WIDTHS:
+            level = chooseLevel(levels, xmin, xmax, pixels)
+            index = [i for i in range(len(levels)) if levels[i] is level][0]
+            count = ((level[0] >= xmin) & (level[0] <= xmax)).sum()
+            assert index == 0 or count >= POINTS_PER_PIXEL * pixels
+            if index + 1 < len(levels):
+                coarser = levels[index + 1][0]
+                assert ((coarser >= xmin) & (coarser <= xmax)).sum() < POINTS_PER_PIXEL * pixels
+
+def test_few_points_drawn_as_is():
+    x, y, spikes = makeCurve()
+    levels = makePyramid(x[:50], y[:50])
+    xout, yout = envelope(chooseLevel(levels, x[0], x[49], 640), x[0], x[49], 640)
+    assert (xout == x[:50]).all() and (yout == y[:50]).all()
+
+if(__name__=='__main__'):
+    test_envelope_keeps_extremes()
+    test_choose_level()
+    test_few_points_drawn_as_is()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+
+# The generalized cross-validation score of gcv.py: the trace of the hat
+# matrix has to be the number of free parameters of the spline, checked
+# against the hat matrix built point by point, and the configuration the
+# data was made from should score best. Runs under pytest or on its own.
+
+import os
+import sys
+
+from numpy import (linspace, exp, sqrt, sin, where, clip, maximum, zeros, inf, isfinite, array,
+                   arange, eye, concatenate, cumsum)
+from numpy.linalg import pinv, svd
+from numpy.random import default_rng
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+from src import calc, gcv
+from src.knotopt import KnotSystem, maxFreeParameters
+
+E0 = 7112.0
+POINTS = 400
+SEED = 4
+
+def makeScan():
+    #a noisy edge step with a damped sine on a sloping pre-edge
+    x = linspace(E0 - 200.0, E0 + 900.0, POINTS)
+    k = calc.KEV * sqrt(clip(x - E0, 0.0, None))
+    osc = where(x > E0, 0.1 * sin(4.4 * k) * exp(-0.01 * k * k) / maximum(k, 1.0), 0.0)
+    y = 0.2 - 1e-5 * (x - E0) + (1.0 + osc) / (1.0 + exp(-(x - E0) / 2.0))
+    return x, y + default_rng(SEED).normal(0.0, 1e-3, POINTS)
+
+def hatTrace(system, indices, coeffs):
+    #trace of the hat matrix the slow way, from the dense design matrix
+    #with a row per fitted point and the continuity conditions eliminated
+    #through their null space
+    offsets = concatenate(([0], cumsum(coeffs)))
+    rows = []
+    weights = []
+    for s, order in enumerate(coeffs):
+        for j in range(indices[s], indices[s + 1] + 1):
+            row = zeros(offsets[-1])
+            row[offsets[s]:offsets[s] + order] = system.upow[j, :order]
+            rows.append(row)
+            weights.append(system.weights[j])
+    conditions = []
+    for s in range(len(coeffs) - 1):
+        u = system.u[indices[s + 1]]
+        for derivative in (0, 1):
+            row = zeros(offsets[-1])
+            for side, sign in ((s, -1.0), (s + 1, 1.0)):
+                powers = arange(coeffs[side])
+                value = u ** clip(powers - derivative, 0, None) * (powers if derivative else 1.0)
+                row[offsets[side]:offsets[side] + coeffs[side]] = sign * value
+            conditions.append(row)
+    basis = eye(offsets[-1])
+    if conditions:
+        basis = svd(array(conditions))[2][len(conditions):].T
+    design = array(rows).dot(basis) * sqrt(array(weights))[:, None]
+    return float(design.dot(pinv(design)).trace())
+
+def test_trace_is_free_parameters():
+    x, y = makeScan()
+    system = KnotSystem(x, y, E0, 0.0, 0.0)
+    for num in (2, 3, 5, 8):
+        indices = gcv.distributeKnots(x, E0, E0, x[-1], num)
+        for order in (1, 2, 3, 5):
+            coeffs = [order + 1] * (num - 1)
+            score, rss, trace, n = gcv.scoreGCV(system, indices, coeffs)
+            #two continuity conditions at every inner knot
+            assert trace == sum(coeffs) - 2 * (num - 2)
+            assert n == system.count[indices[-1] + 1] - system.count[indices[0]] + num - 2
+            assert isfinite(score)
+            assert abs(hatTrace(system, indices, coeffs) - trace) < 1e-3, (num, order)
+
+def test_undetermined_segment():
+    #a segment with fewer points above E0 than coefficients can't be scored
+    x, y = makeScan()
+    system = KnotSystem(x, y, E0, 0.0, 0.0)
+    first = int(calc.getClosestIndices([E0], x)[0])
+    indices = [first, first + 3, len(x) - 1]
+    assert gcv.scoreGCV(system, indices, [5, 3])[0] == inf
+    assert isfinite(gcv.scoreGCV(system, indices, [2, 3])[0])
+
+def test_rank_prefers_smooth_spline():
+    #data that is a single quadratic above E0: more knots or higher
+    #orders only fit the noise, so they must not score better
+    x = linspace(E0 - 200.0, E0 + 900.0, POINTS)
+    y = 1.0 + 2e-4 * (x - E0) - 1e-7 * (x - E0) ** 2 + default_rng(SEED).normal(0.0, 1e-3, POINTS)
+    results = gcv.rankSplines(x, y, E0, E0, x[-1], knots=(2, 6), orders=(1, 5))
+    score, num, orders = results[0]
+    assert num == 2 and orders == [2]
+
+def test_rank_free_parameters():
+    #the FFT window caps the free parameters of the configurations tried
+    x = linspace(E0 - 200.0, E0 + 900.0, POINTS)
+    y = 1.0 + 2e-4 * (x - E0) + default_rng(SEED).normal(0.0, 1e-3, POINTS)
+    every = gcv.rankSplines(x, y, E0, E0, x[-1], knots=(2, 6), orders=(1, 5))
+    capped = gcv.rankSplines(x, y, E0, E0, x[-1], knots=(2, 6), orders=(1, 5), kmin=2.0, kmax=8.0)
+    budget = maxFreeParameters(2.0, 8.0)
+    assert 0 < len(capped) < len(every)
+    for score, num, orders in capped:
+        assert sum([o + 1 for o in orders]) - 2 * (num - 2) <= budget
+    assert capped == [r for r in every if sum([o + 1 for o in r[2]]) - 2 * (r[1] - 2) <= budget]
+
+if(__name__=='__main__'):
+    test_trace_is_free_parameters()
+    test_undetermined_segment()
+    test_rank_prefers_smooth_spline()
+    test_rank_free_parameters()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+
+# Import-time budget for starting PySpline. The main window only needs the
+# raw data plot; the other windows, the dialogs and the tools are imported
+# when first used, and numpy's optional subpackages are never pulled in by
+# a star import. Runs under pytest or on its own.
+
+import os
+import sys
+import subprocess
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+IMPORT_BUDGET = 1.0 #seconds for `import src.pyspline`, Qt and numpy included
+RUNS = 3 #the fastest run counts; the first one may have to compile
+
+#imported on demand, so never needed to get the main window up
+LAZY_MODULES = ('src.normplot', 'src.kplot', 'src.fftplot', 'src.i0plot',
+                'src.edge', 'src.aboutbox', 'src.comments', 'src.icons',
+                'src.montecarlo', 'src.knotopt', 'src.gcv', 'src.preedge',
+                'src.workspaceview', 'src.overlay', 'src.heatmapplot',
+                'src.workspace', 'src.stack', 'src.pool', 'concurrent.futures.process',
+                'numpy.random', 'numpy.f2py', 'numpy.testing', 'numpy.ma',
+                'numpy.polynomial')
+
+def importTimes(module):
+    """Cumulative import time in seconds of every module loaded by module.
+
+    Measured in a fresh interpreter with python -X importtime.
+    """
+    env = dict(os.environ)
+    env.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import ' + module],
+                            cwd=HERE, env=env, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+
+    times = {}
+    for line in result.stderr.splitlines():
+        #import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        try:
+            times[fields[2].strip()] = int(fields[1]) / 1e6
+        except ValueError:
+            pass #the header line
+    return times
+
+def test_import_budget():
+    best = min([importTimes('src.pyspline')['src.pyspline'] for i in range(RUNS)])
+    print("import src.pyspline: %.3f s (budget %.3f s)" % (best, IMPORT_BUDGET))
+    assert best < IMPORT_BUDGET
+
+def test_lazy_modules():
+    times = importTimes('src.pyspline')
+    loaded = [name for name in LAZY_MODULES if name in times]
+    assert not loaded, "imported at startup: " + ", ".join(loaded)
+
+if(__name__=='__main__'):
+    test_import_budget()
+    test_lazy_modules()
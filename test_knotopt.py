@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+
+# KnotSystem, the spline system knotopt.py rebuilds for every trial knot
+# placement, against the system calcSpline solves: both have to give the
+# same spline, though KnotSystem works in a centred and scaled energy.
+# optimizeKnots started from poor knots has to lower the low-R objective
+# while keeping locked knots, limits, points per segment and the number of
+# free parameters. Runs under pytest or on its own.
+
+import os
+import sys
+
+from numpy import (linspace, exp, sqrt, sin, where, clip, maximum, arange, array, zeros,
+                   isinf, allclose, inf)
+import numpy.linalg as LinearAlgebra
+from numpy.random import default_rng
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+from src import calc
+from src.knotopt import KnotSystem, optimizeKnots, maxFreeParameters
+
+E0 = 7112.0
+POINTS = 400
+SEED = 3
+NOISE = 1e-3
+TOLERANCE = 1e-3 * NOISE #see test_batch.py
+KMIN, KMAX = 2.0, 12.0
+POOR = [E0, E0 + 10.0, E0 + 20.0, E0 + 900.0] #knots crowded at the edge
+
+def makeScan():
+    #a noisy edge step with a damped sine on a sloping pre-edge
+    x = linspace(E0 - 200.0, E0 + 900.0, POINTS)
+    k = calc.KEV * sqrt(clip(x - E0, 0.0, None))
+    osc = where(x > E0, 0.1 * sin(4.4 * k) * exp(-0.01 * k * k) / maximum(k, 1.0), 0.0)
+    y = 0.2 - 1e-5 * (x - E0) + (1.0 + osc) / (1.0 + exp(-(x - E0) / 2.0))
+    return x, y + default_rng(SEED).normal(0.0, NOISE, POINTS)
+
+def boundsSpline(x, y, indices, coeffs):
+    #the spline from calc.bounds and a plain solve, on the knots' segments
+    segs = [(coeffs[s], x[indices[s]], x[indices[s + 1]]) for s in range(len(coeffs))]
+    matrix, vec = calc.bounds(x, y, segs, E0)
+    soln = LinearAlgebra.solve(array(matrix), array(vec))
+    spline = zeros(len(x))
+    offset = 0
+    for s, order in enumerate(coeffs):
+        start = indices[s]
+        stop = indices[s + 1] + 1
+        spline[start:stop] = (x[start:stop, None] ** arange(order)).dot(soln[offset:offset + order])
+        offset += order + 2
+    return spline
+
+def systemSpline(system, indices, coeffs):
+    #the same spline from KnotSystem.assemble and KnotSystem.solve
+    matrix, vec, offsets = system.assemble([indices], coeffs)
+    soln = system.solve(matrix, vec)[0]
+    spline = zeros(len(system.x))
+    for s, order in enumerate(coeffs):
+        start = indices[s]
+        stop = indices[s + 1] + 1
+        spline[start:stop] = system.upow[start:stop, :order].dot(soln[offsets[s]:offsets[s] + order])
+    return spline
+
+def test_solve_matches_bounds():
+    x, y = makeScan()
+    system = KnotSystem(x, y, E0, 2.0, 12.0)
+    for knots in ([E0, x[-1]], [E0, E0 + 300.0, x[-1]], [E0 + 10.0, E0 + 150.0, E0 + 500.0, x[-1]]):
+        indices = [int(i) for i in calc.getClosestIndices(knots, x)]
+        for order in (2, 3):
+            coeffs = [order] * (len(knots) - 1)
+            expected = boundsSpline(x, y, indices, coeffs)
+            spline = systemSpline(system, indices, coeffs)
+            window = slice(indices[0], indices[-1] + 1)
+            assert allclose(spline[window], expected[window], rtol=0.0, atol=TOLERANCE), (knots, order)
+
+def test_solve_singular():
+    #a segment without points above E0 can't be fitted; the others still are
+    x, y = makeScan()
+    system = KnotSystem(x, y, E0, 2.0, 12.0)
+    low = int(calc.getClosestIndices([E0 - 50.0], x)[0])
+    good = [int(i) for i in calc.getClosestIndices([E0, E0 + 300.0, x[-1]], x)]
+    bad = [low, low + 3, good[-1]]
+    matrix, vec, offsets = system.assemble([good, bad], [3, 3])
+    soln = system.solve(matrix, vec)
+    assert not isinf(soln[0]).any()
+    assert isinf(soln[1]).all()
+
+def poorSegs(x, knots=POOR):
+    #cubic segments between the grid points closest to knots
+    index = calc.getClosestIndices(knots, x)
+    return [(3, float(x[index[i]]), float(x[index[i + 1]])) for i in range(len(knots) - 1)]
+
+def checkSegs(system, segs):
+    #knots in order on grid points, each segment with the points it needs
+    x = system.x
+    knots = [seg[1] for seg in segs] + [segs[-1][2]]
+    indices = [int(i) for i in calc.getClosestIndices(knots, x)]
+    assert allclose(x[indices], knots, rtol=0.0, atol=0.0)
+    for s, seg in enumerate(segs):
+        assert indices[s + 1] - indices[s] >= seg[0] + max(0, system.k0index - indices[s])
+    return indices
+
+def objective(system, segs):
+    indices = calc.getClosestIndices([seg[1] for seg in segs] + [segs[-1][2]], system.x)
+    return system.evaluate([indices], [seg[0] for seg in segs])[0]
+
+def test_optimize_lowers_objective():
+    x, y = makeScan()
+    system = KnotSystem(x, y, E0, KMIN, KMAX)
+    start = poorSegs(x)
+    segs, best = optimizeKnots(x, y, E0, start, KMIN, KMAX)
+    checkSegs(system, segs)
+    assert best < 0.5 * objective(system, start)
+    assert abs(best - objective(system, segs)) <= 1e-9 * best
+    #the end knots are locked by default
+    assert segs[0][1] == start[0][1] and segs[-1][2] == start[-1][2]
+    assert [seg[0] for seg in segs] == [3, 3, 3]
+
+def test_optimize_locked_and_limits():
+    x, y = makeScan()
+    system = KnotSystem(x, y, E0, KMIN, KMAX)
+    start = poorSegs(x)
+    locked = [True, True, False, True]
+    #unconstrained, the third knot goes past E0 + 100
+    limits = [(-inf, inf), (-inf, inf), (E0 + 15.0, E0 + 60.0), (-inf, inf)]
+    segs, best = optimizeKnots(x, y, E0, start, KMIN, KMAX, limits=limits, locked=locked)
+    checkSegs(system, segs)
+    knots = [seg[1] for seg in segs] + [segs[-1][2]]
+    startKnots = [seg[1] for seg in start] + [start[-1][2]]
+    for j, knot in enumerate(knots):
+        if locked[j]:
+            assert knot == startKnots[j]
+        assert limits[j][0] <= knot <= limits[j][1], (j, knot)
+    assert best < objective(system, start)
+
+def test_optimize_orders():
+    x, y = makeScan()
+    system = KnotSystem(x, y, E0, KMIN, KMAX)
+    start = poorSegs(x)
+    segs, best = optimizeKnots(x, y, E0, start, KMIN, KMAX, orders=True)
+    checkSegs(system, segs)
+    coeffs = [seg[0] for seg in segs]
+    assert coeffs != [3, 3, 3]
+    assert sum(coeffs) - 2 * (len(coeffs) - 1) <= maxFreeParameters(KMIN, KMAX)
+    assert best <= optimizeKnots(x, y, E0, start, KMIN, KMAX)[1] * (1 + 1e-9)
+
+if(__name__=='__main__'):
+    test_solve_matches_bounds()
+    test_solve_singular()
+    test_optimize_lowers_objective()
+    test_optimize_locked_and_limits()
+    test_optimize_orders()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+
+# KnotSet, the array model behind the knots of a plot, against the rules
+# the Knot markers used to apply one by one: the boundaries add() and
+# fixBounds() give, the exceptions that override them, the limits
+# ignoring the neighbours and the spline segments snapped to the grid.
+# Runs under pytest or on its own.
+
+import os
+import sys
+
+from numpy import linspace, allclose
+from numpy.random import default_rng
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+from src import calc
+from src.knotset import KnotSet
+
+SEED = 4
+TRIALS = 50
+LOW, HIGH = 6900.0, 8000.0 #axis range of the plot
+GRID = linspace(LOW, HIGH, 441)
+
+#the per-marker rules, each knot a [position, [low, high]]
+
+def oldFixBounds(knots, excepts):
+    if len(knots) < 2:
+        return
+    knots[0][1] = [LOW, knots[1][0] - 0.01]
+    for i in range(1, len(knots) - 1):
+        knots[i][1] = [knots[i - 1][0] + 0.01, knots[i + 1][0] - 0.01]
+    knots[-1][1] = [knots[-2][0] + 0.01, HIGH]
+    for index, side, value in excepts:
+        knots[index][1][side] = value
+
+def oldAdd(knots, pos, excepts):
+    if not knots:
+        knots.append([pos, [LOW, HIGH]])
+        return True
+    last = knots[-1]
+    if pos < last[0]:
+        return False
+    pos = min(max(pos, LOW), HIGH)
+    knots.append([pos, [last[0] + 1.0, HIGH]])
+    last[1][1] = pos - 1.0
+    oldFixBounds(knots, excepts)
+    return True
+
+def oldLimits(knots, excepts):
+    limits = [[float('-inf'), float('inf')] for knot in knots]
+    if limits:
+        limits[0][0] = LOW
+        limits[-1][1] = HIGH
+    for index, side, value in excepts:
+        if index < len(limits):
+            limits[index][side] = value
+    return [tuple(lim) for lim in limits]
+
+def oldSegs(knots, orders):
+    return [(orders[i], calc.getClosest(knots[i][0], GRID), calc.getClosest(knots[i + 1][0], GRID))
+            for i in range(len(knots) - 1)]
+
+def makeCase(rng):
+    #sorted positions, sometimes out of the axis range, and a few exceptions
+    count = int(rng.integers(1, 8))
+    positions = sorted(rng.uniform(LOW - 50.0, HIGH + 50.0, count).tolist())
+    excepts = [(int(rng.integers(0, count)), int(rng.integers(0, 2)), float(rng.uniform(LOW, HIGH)))
+               for i in range(int(rng.integers(0, 4)))]
+    return positions, excepts
+
+def test_add_and_fix_bounds():
+    rng = default_rng(SEED)
+    for trial in range(TRIALS):
+        positions, excepts = makeCase(rng)
+        knotset, knots = KnotSet(), []
+        for pos in positions:
+            assert knotset.add(pos, limits=(LOW, HIGH)) == oldAdd(knots, pos, [])
+            assert allclose(knotset.positions, [knot[0] for knot in knots])
+            assert allclose(knotset.bounds, [knot[1] for knot in knots])
+        #a position below the last knot is refused by both
+        assert knotset.add(positions[-1] - 10.0, limits=(LOW, HIGH)) == oldAdd(knots, positions[-1] - 10.0, [])
+        assert len(knotset) == len(knots)
+
+        for index, side, value in excepts:
+            knotset.addBoundsException(index, side, value)
+        knotset.fixBounds(LOW, HIGH)
+        oldFixBounds(knots, excepts)
+        if len(knots) >= 2:
+            assert allclose(knotset.bounds, [knot[1] for knot in knots]), (positions, excepts)
+        assert knotset.getLimits(LOW, HIGH) == oldLimits(knots, excepts)
+
+def test_exceptions_outlive_clear():
+    knotset = KnotSet()
+    for pos in (7000.0, 7100.0, 7500.0):
+        knotset.add(pos, limits=(LOW, HIGH))
+    knotset.addBoundsException(1, 1, 7300.0)
+    knotset.addBoundsException(1, 1, 7200.0)
+    knotset.clear()
+    assert len(knotset) == 0
+    for pos in (7010.0, 7110.0, 7510.0):
+        knotset.add(pos, limits=(LOW, HIGH))
+    #the later exception for the same end wins
+    assert tuple(knotset.bounds[1]) == (7010.01, 7200.0)
+    assert knotset.getLimits(LOW, HIGH)[1] == (float('-inf'), 7200.0)
+
+def test_segs():
+    rng = default_rng(SEED)
+    for trial in range(TRIALS):
+        positions, excepts = makeCase(rng)
+        knotset, knots = KnotSet(), []
+        for pos in positions:
+            knotset.add(pos, limits=(LOW, HIGH))
+            oldAdd(knots, pos, [])
+        orders = rng.integers(2, 6, max(len(knots) - 1, 0)).tolist()
+        assert [tuple(seg) for seg in knotset.getSegs(orders, GRID)] == oldSegs(knots, orders)
+    assert KnotSet().getSegs([], GRID) == []
+
+if(__name__=='__main__'):
+    test_add_and_fix_bounds()
+    test_exceptions_outlive_clear()
+    test_segs()
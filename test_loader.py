@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+
+# Reading the three kinds of file loader.py understands, from small files
+# written here: a PySpline .d file, an SSRL EXAFS Data Collector file and
+# plain columns. A progress callback sees the load through and can stop it
+# by raising LoadCancelled. Runs under pytest or on its own.
+
+import os
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+from src import loader
+
+POINTS = 40
+
+def energies():
+    return [7000.0 + 5.0 * i for i in range(POINTS)]
+
+def writeFile(folder, name, lines):
+    path = os.path.join(folder, name)
+    with open(path, 'w') as file:
+        file.write('\n'.join(lines) + '\n')
+    return path
+
+def splineLines():
+    lines = ["TITLE test scan",
+             "# measured at 10 K",
+             "E0 7112.000",
+             "BACKGROUND 7000.00000 (2) 7080.00000 eV",
+             "SPLINE 7115.00000 (2) 7150.00000 (3) 7195.00000 eV",
+             "KWIN 2.00000 6.50000 ",
+             "EV K IO RAW BACKGROND NORMAL SPLINE XAFS"]
+    for i, x in enumerate(energies()):
+        lines.append("%f,0.000000,%f,%f,0.0,0.0,0.0,0.0" % (x, 2.0 + i, 0.1 * i))
+    return lines
+
+def ssrlLines():
+    lines = ["SSRL                   EXAFS Data Collector 1.3",
+             "test.001",
+             "Data:",
+             "Real time clock",
+             "Sum real time clock",
+             "Requested Energy",
+             "Achieved Energy",
+             "I0",
+             "I1",
+             "I2",
+             "I3",
+             ""]
+    for i, x in enumerate(energies()):
+        #I1/I0 steps up between points 19 and 20
+        i1 = 0.5 if i < 20 else 2.0
+        lines.append("1.0 %d %f %f 100.0 %f 1.0 1.0" % (i, x - 0.1, x, 100.0 * i1))
+    return lines
+
+def columnLines():
+    lines = ["# energy absorption", "ev mu"]
+    for i, x in enumerate(energies()):
+        lines.append("%f %f" % (x, 0.01 * i))
+    return lines
+
+def test_spline_file():
+    with tempfile.TemporaryDirectory() as folder:
+        scan = loader.loadFile(writeFile(folder, 'scan.d', splineLines()))
+    assert scan.format == 'spline'
+    assert scan.title == "test scan" and scan.comments == ["measured at 10 K"]
+    assert scan.E0 == 7112.0
+    assert scan.background == (7000.0, 7080.0, 2)
+    assert scan.markers == [7115.0, 7150.0, 7195.0] and scan.orders == [2, 3]
+    assert scan.kwindow == (2.0, 6.5)
+    assert list(scan.xdata) == energies()
+    assert scan.i0data[3] == 5.0 and abs(scan.ydata[3] - 0.3) < 1e-12
+    assert not scan.xdata.flags.writeable
+    assert scan.warnings == []
+
+def test_ssrl_file():
+    with tempfile.TemporaryDirectory() as folder:
+        scan = loader.loadFile(writeFile(folder, 'test.001', ssrlLines()))
+    assert scan.format == 'ssrl'
+    assert list(scan.xdata) == energies()
+    assert scan.i0data[0] == 100.0 and scan.ydata[0] == 50.0 and scan.ydata[-1] == 200.0
+    assert scan.E0 in (energies()[19], energies()[20])
+    assert scan.title == "test" and scan.markers is None
+
+def test_column_file():
+    with tempfile.TemporaryDirectory() as folder:
+        scan = loader.loadFile(writeFile(folder, 'scan.txt', columnLines()))
+    assert scan.format == 'columns'
+    assert list(scan.xdata) == energies()
+    assert abs(scan.ydata[-1] - 0.01 * (POINTS - 1)) < 1e-12
+    assert list(scan.i0data) == [1.0] * POINTS
+    assert scan.E0 is None and scan.background is None
+
+def test_unreadable_file():
+    with tempfile.TemporaryDirectory() as folder:
+        path = writeFile(folder, 'notes.txt', ["nothing", "to see here"])
+        try:
+            loader.loadFile(path)
+        except loader.LoadError:
+            pass
+        else:
+            assert False, "LoadError expected"
+
+def test_progress_and_cancel():
+    with tempfile.TemporaryDirectory() as folder:
+        path = writeFile(folder, 'scan.d', splineLines())
+        fractions = []
+        loader.loadFile(path, progress=fractions.append)
+        assert fractions == sorted(fractions) and fractions[-1] == 1.0
+        assert any([0.0 < f < 1.0 for f in fractions])
+
+        #cancelled once reading is done, before anything is parsed
+        def cancel(fraction):
+            if fraction >= loader.READ_SHARE:
+                raise loader.LoadCancelled()
+        try:
+            loader.loadFile(path, progress=cancel)
+        except loader.LoadCancelled:
+            pass
+        else:
+            assert False, "LoadCancelled expected"
+
+if(__name__=='__main__'):
+    test_spline_file()
+    test_ssrl_file()
+    test_column_file()
+    test_unreadable_file()
+    test_progress_and_cancel()
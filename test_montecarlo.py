@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+
+# Checks of the Monte-Carlo uncertainty bands of montecarlo.py on a
+# synthetic scan: the bands widen with the noise and with the knot jitter,
+# and jittered knots that collide are moved apart rather than dropped.
+# Runs under pytest or on its own.
+
+import os
+import sys
+
+from numpy import linspace, exp, sqrt, sin, where, clip, maximum, median, diff, all as np_all
+from numpy.random import default_rng
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+from src import calc, montecarlo
+
+E0 = 7112.0
+POINTS = 600
+REALIZATIONS = 400
+SEED = 1
+KMIN, KMAX = 2.0, 12.0
+QUIET = 1e-6 #noise well below the effect of moving a knot
+
+def makeScan():
+    #edge step with a damped sine on a sloping pre-edge, noiseless
+    x = linspace(E0 - 200.0, E0 + 900.0, POINTS)
+    k = calc.KEV * sqrt(clip(x - E0, 0.0, None))
+    osc = where(x > E0, 0.1 * sin(4.4 * k) * exp(-0.01 * k * k) / maximum(k, 1.0), 0.0)
+    y = 0.2 - 1e-5 * (x - E0) + (1.0 + osc) / (1.0 + exp(-(x - E0) / 2.0))
+    return x, y
+
+def makeSegs(x, knots):
+    #cubic segments between the grid points closest to knots
+    index = calc.getClosestIndices(knots, x)
+    return [(3, x[index[i]], x[index[i + 1]]) for i in range(len(knots) - 1)]
+
+def bandWidth(sigma, knotJitter=0, segs=None):
+    #median width of the chi(k) band over the FFT window, and the fallbacks
+    x, y = makeScan()
+    if segs is None:
+        segs = makeSegs(x, [E0, E0 + 300.0, x[-1]])
+    hindex = int(calc.getClosestIndices([E0 - 50.0], x)[0])
+    kdata, kbands, rdata, rbands, fallbacks = montecarlo.calcBands(
+        x, y, E0, 0, hindex, 2, segs, KMIN, KMAX, n=REALIZATIONS, sigma=sigma,
+        knotJitter=knotJitter, groups=20 if knotJitter else 1, seed=SEED)
+    window = (kdata >= KMIN) & (kdata <= KMAX)
+    return median((kbands[-1] - kbands[0])[window]), fallbacks
+
+def test_separate():
+    assert montecarlo.separate([5, 5, 5], 10, [1, 1]).tolist() == [5, 6, 7]
+    assert montecarlo.separate([9, 3, 9, 9], 10, [1, 1, 1]).tolist() == [3, 7, 8, 9]
+    assert montecarlo.separate([0, 0, 1], 3, [1, 1]).tolist() == [0, 1, 2]
+    assert montecarlo.separate([4, 5, 30], 40, [3, 3]).tolist() == [4, 7, 30]
+    assert montecarlo.separate([38, 39, 39], 40, [3, 2]).tolist() == [34, 37, 39]
+
+def test_jitterSegs_close_knots():
+    #knots four points apart collide often, but every draw keeps them all
+    x, y = makeScan()
+    index = calc.getClosestIndices([E0], x)[0]
+    segs = makeSegs(x, x[[index, index + 4, index + 8, -1]])
+    rng = default_rng(SEED)
+    moved = 0
+    for i in range(200):
+        jittered = montecarlo.jitterSegs(x, segs, 5, rng)
+        assert jittered is not None and len(jittered) == len(segs)
+        knots = calc.getClosestIndices([seg[1] for seg in jittered] + [jittered[-1][2]], x)
+        assert np_all(diff(knots) >= 3)
+        moved += jittered != segs
+    assert moved > 190
+    assert montecarlo.jitterSegs(x[:9], segs, 5, rng) is None
+
+def test_width_scales_with_sigma():
+    #the same draws scaled: the width follows the noise almost exactly
+    narrow, fallbacks = bandWidth(1e-3)
+    wide, fallbacks = bandWidth(2e-3)
+    assert narrow > 0
+    assert abs(wide / narrow - 2.0) < 0.1
+
+def test_width_grows_with_jitter():
+    #with next to no noise the width comes from the knots, and it grows
+    #about in proportion to how far they are moved
+    widths = []
+    for jitter in (0, 5, 20):
+        width, fallbacks = bandWidth(QUIET, jitter)
+        assert fallbacks == 0
+        widths.append(width)
+    assert widths[1] > 5 * widths[0]
+    assert 2 * widths[1] < widths[2] < 8 * widths[1]
+
+    #closely spaced knots are jittered too instead of falling back
+    x, y = makeScan()
+    index = calc.getClosestIndices([E0 + 20.0], x)[0]
+    segs = makeSegs(x, x[[index, index + 4, -1]])
+    fixed, fallbacks = bandWidth(QUIET, 0, segs)
+    jittered, fallbacks = bandWidth(QUIET, 5, segs)
+    assert fallbacks == 0
+    assert jittered > 2 * fixed
+
+    #a short first segment moved below E0 can't be fitted; those groups
+    #keep the nominal knots and are counted
+    index = calc.getClosestIndices([E0], x)[0]
+    segs = makeSegs(x, x[[index, index + 4, -1]])
+    width, fallbacks = bandWidth(QUIET, 20, segs)
+    assert 0 < fallbacks < 20
+
+if(__name__=='__main__'):
+    test_separate()
+    test_jitterSegs_close_knots()
+    test_width_scales_with_sigma()
+    test_width_grows_with_jitter()
+    print("ok")
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+
+# The processing graph of pipeline.py: setting a parameter marks only the
+# stages downstream of it dirty, and only those are computed again when
+# asked for; cached stages hand back earlier results within their limits,
+# and results worked out on a snapshot are only taken over while they are
+# current. Runs under pytest or on its own.
+
+import os
+import sys
+
+from numpy import linspace, exp, sqrt, sin, where, clip, maximum, array, zeros
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+from src import calc, pipeline
+
+E0 = 7112.0
+
+def countingPipeline():
+    #a -> b -> c with b also taking y; calls counts the evaluations per stage
+    calls = {'b': 0, 'c': 0}
+    def b(a, y):
+        calls['b'] += 1
+        return a + y
+    def c(b):
+        calls['c'] += 1
+        return 2 * b
+    graph = pipeline.Pipeline()
+    graph.addStage('b', b, ('a', 'y'))
+    graph.addStage('c', c, ('b',))
+    return graph, calls
+
+def makeScan():
+    #an edge step with a damped sine on a sloping pre-edge
+    x = linspace(E0 - 200.0, E0 + 900.0, 400)
+    k = calc.KEV * sqrt(clip(x - E0, 0.0, None))
+    osc = where(x > E0, 0.1 * sin(4.4 * k) * exp(-0.01 * k * k) / maximum(k, 1.0), 0.0)
+    y = 0.2 - 1e-5 * (x - E0) + (1.0 + osc) / (1.0 + exp(-(x - E0) / 2.0))
+    return calc.column(x), calc.column(y)
+
+def xafsPipeline():
+    x, y = makeScan()
+    graph = pipeline.xafsPipeline()
+    graph.setParams(xdata=x, ydata=y, E0=E0, bgparams=(0, 60, 2),
+                    segs=[(3, x[73], x[200]), (4, x[200], x[-1])], kwindow=(2.0, 12.0))
+    return graph
+
+def test_dirty_propagation():
+    graph, calls = countingPipeline()
+    assert not graph.isReady('c')
+    graph.setParams(a=1, y=10)
+    assert graph.isReady('c') and graph.isDirty('b') and graph.isDirty('c')
+    assert graph.get('c') == 22
+    assert calls == {'b': 1, 'c': 1}
+    assert not graph.isDirty('b') and not graph.isDirty('c')
+
+    #only what is downstream of a goes dirty, and only when asked for
+    assert graph.setParam('a', 2)
+    assert graph.isDirty('b') and graph.isDirty('c')
+    assert calls == {'b': 1, 'c': 1}
+    assert graph.get('b') == 12
+    assert calls == {'b': 2, 'c': 1} and graph.isDirty('c')
+    assert graph.get('c') == 24
+    assert calls == {'b': 2, 'c': 2}
+
+    #a stage given its value makes only its dependents dirty
+    graph.setValue('b', 100)
+    assert not graph.isDirty('b') and graph.isDirty('c')
+    assert graph.get('c') == 200
+    assert calls == {'b': 2, 'c': 3}
+
+def test_unchanged_param_is_free():
+    graph, calls = countingPipeline()
+    graph.setParams(a=array([1.0, 2.0]), y=1.0)
+    graph.get('c')
+    version = graph.getVersion('c')
+
+    #same values, even as new objects, invalidate nothing
+    assert not graph.setParam('a', array([1.0, 2.0]))
+    assert not graph.setParams(a=array([1.0, 2.0]), y=1.0)
+    assert not graph.isDirty('b') and not graph.isDirty('c')
+    graph.get('c')
+    assert calls == {'b': 1, 'c': 1}
+    assert graph.getVersion('c') == version
+
+def test_xafs_stages():
+    #a k window change only recomputes the FFT, a spline change skips the background
+    graph = xafsPipeline()
+    graph.get('fft')
+    versions = dict([(name, graph.getVersion(name)) for name in pipeline.STAGES])
+
+    graph.setParam('kwindow', (3.0, 12.0))
+    assert [name for name in pipeline.STAGES if graph.isDirty(name)] == ['fft']
+    graph.get('fft')
+    x = graph.get('xdata')
+    graph.setParam('segs', [(3, x[73], x[220]), (4, x[220], x[-1])])
+    assert [name for name in pipeline.STAGES if graph.isDirty(name)] == ['spline', 'chi', 'fft']
+    graph.get('fft')
+    changed = [name for name in pipeline.STAGES if graph.getVersion(name) != versions[name]]
+    assert changed == ['spline', 'chi', 'fft']
+
+def test_cache_entries():
+    calls = []
+    cache = pipeline.StageCache(lambda order, data: calls.append(order) or order * 2, maxEntries=2)
+    data = [1.0, 2.0]
+    assert cache(1, data) == 2 and cache(2, data) == 4
+    assert cache(1, data) == 2 #a hit, and now the most recent
+    assert cache.stats() == {'hits': 1, 'misses': 2, 'entries': 2, 'bytes': cache.nbytes}
+
+    #a third entry drops the least recently used one, 2
+    cache(3, data)
+    assert cache(1, data) == 2
+    assert calls == [1, 2, 3]
+    cache(2, data)
+    assert calls == [1, 2, 3, 2]
+    assert cache.stats()['entries'] == 2 and cache.stats()['misses'] == 4
+
+    #data arguments count by identity, not by value
+    cache(2, list(data))
+    assert calls == [1, 2, 3, 2, 2]
+
+def test_cache_bytes():
+    cache = pipeline.StageCache(lambda size: zeros(size), maxEntries=10, maxBytes=10000)
+    for size in (400, 300, 200):
+        cache(size)
+    assert cache.stats()['entries'] == 3 and cache.nbytes == 7200
+
+    #over the limit the oldest results go until the rest fit
+    cache(500)
+    assert list(cache.entries) == [(300,), (200,), (500,)]
+    assert cache.nbytes == 8000
+    cache.setLimits(maxBytes=4000)
+    assert list(cache.entries) == [(500,)]
+    cache.clear()
+    assert cache.stats() == {'hits': 0, 'misses': 4, 'entries': 0, 'bytes': 0}
+
+def test_xafs_cache_hits():
+    #going back to earlier parameters is served from the caches
+    graph = xafsPipeline()
+    first = graph.get('fft')
+    graph.setParam('bgparams', (0, 60, 3))
+    graph.get('fft')
+    misses = dict([(name, stats['misses']) for name, stats in graph.cacheStats().items()])
+    graph.setParam('bgparams', (0, 60, 2))
+    assert graph.get('fft') is first
+    stats = graph.cacheStats()
+    assert all([stats[name]['misses'] == misses[name] for name in stats])
+    assert stats['background']['hits'] == 1 and stats['fft']['hits'] == 1
+
+def test_snapshot_adopt():
+    #a snapshot evaluated elsewhere is taken over while nothing has changed
+    graph, calls = countingPipeline()
+    graph.setParams(a=1, y=10)
+    snapshot = graph.snapshot()
+    assert snapshot.get('c') == 22
+    assert graph.isDirty('c')
+    assert graph.adopt(snapshot)
+    assert not graph.isDirty('c') and graph.get('c') == 22
+    assert calls == {'b': 1, 'c': 1}
+
+def test_adopt_stale():
+    #a parameter set while the snapshot was evaluated makes it stale
+    graph, calls = countingPipeline()
+    graph.setParams(a=1, y=10)
+    snapshot = graph.snapshot()
+    graph.setParam('a', 2)
+    snapshot.get('c')
+    assert not graph.adopt(snapshot)
+    assert graph.isDirty('c') and graph.get('c') == 24
+
+    #so does a stage given its own value, but not an unchanged parameter
+    snapshot = graph.snapshot()
+    graph.setValue('b', 100)
+    snapshot.get('c')
+    assert not graph.adopt(snapshot)
+    snapshot = graph.snapshot()
+    graph.setParam('a', 2)
+    snapshot.get('c')
+    assert graph.adopt(snapshot) and graph.get('c') == 200
+
+    #parameters changed on the snapshot don't leak back into the graph
+    snapshot = graph.snapshot()
+    snapshot.setParam('y', 5)
+    snapshot.get('c')
+    assert not graph.adopt(snapshot)
+    assert graph.get('y') == 10 and graph.get('c') == 200
+
+if(__name__=='__main__'):
+    test_dirty_propagation()
+    test_unchanged_param_is_free()
+    test_xafs_stages()
+    test_cache_entries()
+    test_cache_bytes()
+    test_xafs_cache_hits()
+    test_snapshot_adopt()
+    test_adopt_stale()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+
+# Pre-edge peak fits of preedge.py on synthetic spectra: two gaussians on
+# an arctan step, moving a little from spectrum to spectrum, have to come
+# back with their centroids and areas, whether the stack is fitted here or
+# spread over worker processes. Runs under pytest or on its own.
+
+import os
+import sys
+
+from numpy import arange, linspace, array, column_stack, allclose
+from numpy.random import default_rng
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+from src import preedge
+
+SPECTRA = 80 #more than one CHUNK
+SEED = 5
+NOISE = 2e-3
+PEAKS = ((0.3, 7111.2, 0.8), (0.5, 7113.8, 1.0)) #area, centroid, width
+EDGE = (1.0, 7120.0, 2.0, 0.0) #height, position, width, offset
+DRIFT = 0.4 #eV the peaks move over the stack
+WINDOW = (7100.0, 7125.0)
+
+def makeStack():
+    #spectra whose peaks drift by up to DRIFT, with gaussian noise
+    x = arange(7090.0, 7130.0, 0.25)
+    shifts = linspace(0.0, DRIFT, SPECTRA)
+    params = array([[value for area, centroid, width in PEAKS for value in (area, centroid + shift, width)]
+                    + list(EDGE) for shift in shifts])
+    ystack = preedge.model(x, params, len(PEAKS))
+    ystack += default_rng(SEED).normal(0.0, NOISE, ystack.shape)
+    centroids = column_stack([centroid + shifts for area, centroid, width in PEAKS])
+    return x, ystack, centroids
+
+def test_recovers_centroids():
+    x, ystack, expected = makeStack()
+    centers = [7111.0, 7114.0]
+    centroids, areas, params, chisq = preedge.fitPreEdge(x, ystack, centers, WINDOW, EDGE[1],
+                                                         workers=1)
+    assert centroids.shape == (SPECTRA, len(PEAKS))
+    assert abs(centroids - expected).max() < 0.05
+    assert allclose(areas, [[area for area, centroid, width in PEAKS]] * SPECTRA, rtol=0.05)
+    assert (chisq < 2 * NOISE ** 2 * len(x)).all()
+
+def test_workers_match():
+    x, ystack, expected = makeStack()
+    centers = [7111.0, 7114.0]
+    here = preedge.fitPreEdge(x, ystack, centers, WINDOW, EDGE[1], workers=1)
+    pooled = preedge.fitPreEdge(x, ystack, centers, WINDOW, EDGE[1], workers=2)
+    assert allclose(here[0], pooled[0]) and allclose(here[2], pooled[2])
+
+if(__name__=='__main__'):
+    test_recovers_centroids()
+    test_workers_match()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+
+# Saving a Spectrum: a .d file written by Spectrum.save has to load back
+# with the settings and columns it was saved with, so a saved scan opens
+# the way it was left. Runs under pytest or on its own.
+
+import os
+import sys
+import tempfile
+
+from numpy import arange, exp, sqrt, sin, where, clip, maximum, allclose
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+from src import calc, loader, scanlist
+
+E0 = 7112.0
+
+def writeScan(path):
+    #a .d file of an edge step with a damped sine, knots on grid points
+    x = arange(6912.0, 8012.5, 2.5)
+    k = calc.KEV * sqrt(clip(x - E0, 0.0, None))
+    osc = where(x > E0, 0.1 * sin(4.4 * k) * exp(-0.01 * k * k) / maximum(k, 1.0), 0.0)
+    y = 0.2 - 1e-5 * (x - E0) + (1.0 + osc) / (1.0 + exp(-(x - E0) / 2.0))
+    with open(path, 'w') as file:
+        file.write("TITLE round trip\n# first comment\n# second comment\n")
+        file.write("E0 %.3f\n" % E0)
+        file.write("BACKGROUND 6912.00000 (1) 7062.00000 eV\n")
+        file.write("SPLINE 7112.00000 (2) 7402.00000 (3) 8012.00000 eV\n")
+        file.write("KWIN 2.00000 14.00000 \n")
+        file.write("EV K IO RAW BACKGROND NORMAL SPLINE XAFS\n")
+        for i in range(len(x)):
+            file.write("%.6f,0.0,%.6f,%.6f,0.0,0.0,0.0,0.0\n" % (x[i], 1.0 + 0.001 * i, y[i]))
+
+def test_save_load_round_trip():
+    with tempfile.TemporaryDirectory() as folder:
+        original = os.path.join(folder, 'scan.d')
+        writeScan(original)
+        scan = loader.loadFile(original)
+        spectrum = scanlist.processScan(scan)
+        spectrum.title = scan.title
+        spectrum.comments = scan.comments
+
+        saved = os.path.join(folder, 'saved.d')
+        spectrum.save(saved)
+        again = loader.loadFile(saved)
+
+    assert again.getSettings() == scan.getSettings()
+    assert again.title == scan.title and again.comments == scan.comments
+    for column in ('xdata', 'ydata', 'i0data'):
+        assert allclose(getattr(again, column), getattr(scan, column), rtol=0.0, atol=1e-6)
+
+    #and processed again from the saved file it gives the same results
+    columns = spectrum.getColumns()
+    assert allclose(scanlist.processScan(again).getColumns(), columns, rtol=0.0, atol=1e-5)
+    assert allclose(columns[:, 5], spectrum.normdata) and allclose(columns[:, 6], spectrum.splinedata)
+
+if(__name__=='__main__'):
+    test_save_load_round_trip()
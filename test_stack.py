@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+
+# The images of a time series in stack.py: each coarser level merges pairs
+# of rows of the one before, ignoring rows not computed yet and pairing an
+# odd last row with itself; setRows() keeps the levels the same as
+# building them from scratch, color indices follow the rows and the color
+# range, and outdated rows come nearest to the cursor first. Runs under
+# pytest or on its own.
+
+import os
+import sys
+
+from numpy import full, nan, isnan, arange, array_equal, allclose, float32, where
+from numpy.random import default_rng
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+from src import stack
+
+SEED = 5
+GRID = arange(6, dtype=float)
+
+def mergeLevels(rows):
+    #every level built from scratch, rows not computed yet being NaN
+    levels = [rows]
+    while len(levels[-1]) > 1:
+        finer = levels[-1]
+        pairs = [(finer[2 * i], finer[min(2 * i + 1, len(finer) - 1)])
+                 for i in range((len(finer) + 1) // 2)]
+        levels.append(full((len(pairs), finer.shape[1]), nan, float32))
+        for i, (a, b) in enumerate(pairs):
+            levels[-1][i] = where(isnan(a), b, where(isnan(b), a, (a + b) * 0.5))
+    return levels
+
+def sameLevels(image, levels):
+    assert len(image.levels) == len(levels)
+    for mine, theirs in zip(image.levels, levels):
+        assert array_equal(isnan(mine), isnan(theirs))
+        assert allclose(mine[~isnan(mine)], theirs[~isnan(theirs)])
+
+def test_levels():
+    #odd row counts, rows set in batches in any order, some left out
+    rng = default_rng(SEED)
+    for count in (1, 2, 7, 13, 32):
+        image = stack.StackImage(GRID, count)
+        rows = full((count, len(GRID)), nan, float32)
+        order = rng.permutation(count)
+        for batch in (order[:count // 3], order[count // 3:2 * count // 3]):
+            values = rng.normal(size=(len(batch), len(GRID))).astype(float32)
+            image.setRows(batch, values)
+            rows[batch] = values
+            sameLevels(image, mergeLevels(rows.copy()))
+        assert len(image.levels[-1]) == 1
+
+def test_missing_rows():
+    #a pair with one row computed takes that row, not half of it
+    image = stack.StackImage(GRID, 3)
+    image.setRows([2], full((1, len(GRID)), 4.0, float32))
+    assert isnan(image.levels[1][0]).all()
+    assert (image.levels[1][1] == 4.0).all()
+    assert (image.levels[2][0] == 4.0).all()
+
+def test_indices():
+    image = stack.StackImage(GRID, 4)
+    assert (image.getIndices(0) == stack.COLORS).all()
+    image.setRows([0], full((1, len(GRID)), 1.0, float32))
+    image.setRows([1], full((1, len(GRID)), 3.0, float32))
+    indices = image.getIndices(0)
+    assert image.range == (1.0, 3.0)
+    assert (indices[0] == 0).all() and (indices[1] == stack.COLORS - 1).all()
+    assert (indices[2:] == stack.COLORS).all()
+
+    #rows inside the range are recolored in place, a wider range redoes all
+    image.setRows([2], full((1, len(GRID)), 2.0, float32))
+    assert image.getIndices(0) is indices
+    assert (indices[2] == (stack.COLORS - 1) // 2).all()
+    image.setRows([3], full((1, len(GRID)), 5.0, float32))
+    indices = image.getIndices(0)
+    assert image.range == (1.0, 5.0)
+    assert (indices[1] == (stack.COLORS - 1) // 2).all()
+    assert (indices[3] == stack.COLORS - 1).all()
+
+def test_choose_level():
+    #the coarsest level that still has at least a row per pixel
+    image = stack.StackImage(GRID, 1000)
+    assert image.chooseLevel(1000, 1000) == 0
+    assert image.chooseLevel(1000, 400) == 1
+    assert image.chooseLevel(1000, 100) == 3
+    assert image.chooseLevel(1000, 1) == 9
+    assert image.chooseLevel(10, 100) == 0
+
+def test_outdated():
+    grids = dict([(axis, GRID) for axis in stack.AXES])
+    spectra = stack.SpectrumStack(['s%i' % i for i in range(8)], grids)
+    spectra.setSettings('a')
+    assert spectra.getOutdated(5) == [5, 4, 6, 3, 7, 2, 1, 0]
+    images = dict([(axis, full((2, len(GRID)), 1.0, float32)) for axis in stack.AXES])
+    spectra.setRows([4, 6], images, 'a')
+    assert spectra.getOutdated(5) == [5, 3, 7, 2, 1, 0]
+    #rows keep their results but count as outdated once the settings change
+    spectra.setSettings('b')
+    assert spectra.getOutdated(0) == list(range(8))
+    assert (spectra.images['k'].levels[0][4] == 1.0).all()
+
+if(__name__=='__main__'):
+    test_levels()
+    test_missing_rows()
+    test_indices()
+    test_choose_level()
+    test_outdated()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+
+# The links of workspace.py: linking a kind of settings gives every
+# document of the group the one of the first, setting a document's
+# settings passes on only the kinds it is linked for, and a removed
+# document leaves its groups. Runs under pytest or on its own.
+
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+from src import loader
+from src.workspace import Workspace, KINDS, getPart, setPart
+
+def makeScan(shift):
+    #a scan whose settings all differ from those of other shifts
+    scan = loader.ScanFile('s%i.d' % shift, 'spline')
+    scan.setSettings((7112.0 + shift, (6900.0 + shift, 7050.0, 1),
+                      (7112.0 + shift, 7500.0, 8000.0), (3, 3), (2.0 + shift, 14.0)))
+    return scan
+
+def makeWorkspace(count):
+    workspace = Workspace()
+    documents = [workspace.add(makeScan(i)) for i in range(count)]
+    for document in documents:
+        document.results = 'results'
+    return workspace, documents
+
+def test_parts():
+    settings = makeScan(0).getSettings()
+    for kind in KINDS:
+        value = getPart(makeScan(1).getSettings(), kind)
+        changed = setPart(settings, kind, value)
+        assert getPart(changed, kind) == value
+        assert [getPart(changed, other) == getPart(settings, other)
+                for other in KINDS if other != kind] == [True, True]
+        assert changed[0] == settings[0]
+
+def test_link_takes_the_first():
+    workspace, (a, b, c) = makeWorkspace(3)
+    before = [document.getSettings() for document in (a, b, c)]
+    changed = workspace.link([b, c], 'knots')
+    assert changed == [c]
+    assert getPart(c.getSettings(), 'knots') == getPart(before[1], 'knots')
+    #the other kinds and E0 are left alone, and c has to be recomputed
+    assert getPart(c.getSettings(), 'background') == getPart(before[2], 'background')
+    assert c.getSettings()[0] == before[2][0]
+    assert c.results is None and b.results == 'results'
+    assert a.getSettings() == before[0] and workspace.getLinked(a, 'knots') == []
+    assert workspace.getLinked(c, 'knots') == [b]
+    assert workspace.getOutdated() == [c]
+
+def test_set_settings_spreads_linked_kinds():
+    workspace, (a, b, c) = makeWorkspace(3)
+    workspace.link([a, b, c], 'kwindow')
+    workspace.link([a, b], 'background')
+    versions = [document.version for document in (a, b, c)]
+    settings = setPart(setPart(a.getSettings(), 'kwindow', (3.0, 12.0)), 'knots', ((7120.0, 8000.0), (4,)))
+    settings = setPart(settings, 'background', (6950.0, 7000.0, 2))
+    changed = workspace.setSettings(a, settings, 'new')
+    assert changed == [b, c]
+    assert a.getSettings() == settings and a.results == 'new'
+    for document in (b, c):
+        assert getPart(document.getSettings(), 'kwindow') == (3.0, 12.0)
+        assert getPart(document.getSettings(), 'knots') != ((7120.0, 8000.0), (4,))
+        assert document.results is None
+    assert getPart(b.getSettings(), 'background') == (6950.0, 7000.0, 2)
+    assert getPart(c.getSettings(), 'background') != (6950.0, 7000.0, 2)
+    #results computed for the old settings can be told apart
+    assert all([document.version > v for document, v in zip((a, b, c), versions)])
+
+    #settings that are already the group's change nothing
+    assert workspace.setSettings(b, b.getSettings()) == []
+
+def test_relink_and_remove():
+    workspace, (a, b, c, d) = makeWorkspace(4)
+    workspace.link([a, b], 'knots')
+    workspace.link([c, d], 'knots')
+    #a document is in one group per kind; linking it again moves it
+    workspace.link([b, c], 'knots')
+    assert sorted([len(group) for group in workspace.groups['knots']]) == [2]
+    assert workspace.getLinked(b, 'knots') == [c]
+    assert workspace.getGroup(a, 'knots') is None and workspace.getGroup(d, 'knots') is None
+
+    workspace.link([a, b, c], 'background')
+    workspace.remove(b)
+    assert b not in workspace.documents
+    assert workspace.groups['knots'] == []
+    assert workspace.getLinked(a, 'background') == [c]
+    assert workspace.link([a], 'kwindow') == [] and workspace.groups['kwindow'] == []
+
+if(__name__=='__main__'):
+    test_parts()
+    test_link_takes_the_first()
+    test_set_settings_spreads_linked_kinds()
+    test_relink_and_remove()